@@ -0,0 +1,644 @@
+"""
+Benchmarks de la subida y descarga de archivos sobre un directorio temporal.
+
+Uso:
+    python benchmark.py uploads [--files 8] [--size-mb 16] [--probe-kb 64]
+    python benchmark.py resumable [--size-mb 256] [--chunk-mb 8] [--parallel 4]
+    python benchmark.py downloads [--size-mb 512] [--rounds 3] [--chunk-kb 64,1024,4096]
+    python benchmark.py dedup [--files 4] [--copies 4] [--size-mb 64]
+    python benchmark.py catalog [--files 100000] [--requests 50]
+    python benchmark.py compression [--files 4] [--size-mb 64]
+
+`uploads` levanta con uvicorn dos versiones de la aplicación y, mientras un
+cliente sube `--files` archivos de `--size-mb` MiB en una sola petición a
+/uploadfiles/, otro descarga en bucle un archivo pequeño y mide su latencia:
+la versión anterior (archivos uno detrás de otro, con open()/write() en el
+bucle de eventos) frente a la actual de file_manager (copia en hilos, varios
+archivos a la vez y renombrado atómico).
+
+`resumable` sube un archivo de `--size-mb` MiB con /uploadfile/ (multipart) y
+con el protocolo reanudable de resumable.py (bloques de `--chunk-mb` MiB,
+`--parallel` a la vez), y simula un corte a mitad de la subida que se reanuda
+consultando el offset con HEAD. Comprueba que el archivo final es idéntico.
+
+`downloads` descarga un archivo de `--size-mb` MiB con la respuesta anterior
+(FileResponse) y con la de downloads.py para cada DOWNLOAD_CHUNK_SIZE de
+`--chunk-kb`, y mide también la descarga en 4 rangos en paralelo, una
+descarga interrumpida que se reanuda con Range + If-Range y la revalidación
+con If-None-Match (304). uvicorn no ofrece "http.response.zerocopysend", así
+que se mide la lectura por bloques con os.pread.
+
+`dedup` sube `--files` archivos distintos de `--size-mb` MiB, cada uno
+`--copies` veces con nombres distintos, a la versión anterior (un archivo
+suelto por nombre) y al almacén de storage.py, con y sin X-Content-SHA256, y
+compara el tiempo y el espacio ocupado en disco.
+
+`catalog` mide la página de inicio con `--files` archivos: la versión
+anterior (os.listdir y todos los nombres en cada visita) frente al catálogo
+de catalog.py (una página por cursor), además de GET /files/ en una página
+profunda y el coste de una pasada del reconciliador sin cambios.
+
+`compression` genera `--files` registros de texto distintos de `--size-mb`
+MiB y los sube sin comprimir, con gzip y con zstd (STORAGE_COMPRESSION), y
+compara el espacio en disco, la velocidad de subida y la de descarga con
+Accept-Encoding (se envían los bytes guardados) y sin él (descompresión al
+vuelo), en MiB del archivo original por segundo.
+
+UPLOAD_DIR se apunta a un directorio temporal antes de importar los módulos
+de la aplicación, así que la carpeta uploads real no se modifica.
+"""
+import argparse
+import base64
+import hashlib
+import io
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Los servidores lanzados por el benchmark heredan BENCHMARK_UPLOAD_DIR
+if "BENCHMARK_UPLOAD_DIR" not in os.environ:
+    _tmpdir = tempfile.TemporaryDirectory()
+    os.environ["BENCHMARK_UPLOAD_DIR"] = _tmpdir.name
+os.environ["UPLOAD_DIR"] = os.environ["BENCHMARK_UPLOAD_DIR"]
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import httpx
+import jinja2
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import FileResponse, HTMLResponse
+
+import catalog
+import file_manager
+import storage
+
+
+# --- Versión anterior: escritura secuencial en el bucle de eventos ---
+
+def build_blocking_app() -> FastAPI:
+    """La subida y la descarga tal como eran antes de escribir en hilos y del almacén."""
+    blocking_app = FastAPI()
+
+    @blocking_app.post("/uploadfile/")
+    async def upload_single_file(file: UploadFile = File(...)):
+        safe_filename = os.path.basename(file.filename)
+        file_path = os.path.join(file_manager.UPLOAD_DIRECTORY, safe_filename)
+        with open(file_path, "wb") as buffer:
+            while contents := await file.read(1024 * 1024):
+                buffer.write(contents)
+        return {"filename": safe_filename, "message": "Archivo subido exitosamente."}
+
+    @blocking_app.post("/uploadfiles/")
+    async def upload_multiple_files(files: List[UploadFile] = File(...)):
+        uploaded_filenames = []
+        for file in files:
+            try:
+                safe_filename = os.path.basename(file.filename)
+                file_path = os.path.join(file_manager.UPLOAD_DIRECTORY, safe_filename)
+                with open(file_path, "wb") as buffer:
+                    while contents := await file.read(1024 * 1024):
+                        buffer.write(contents)
+                uploaded_filenames.append(safe_filename)
+            except Exception:
+                raise HTTPException(status_code=500, detail="Error al subir uno o más archivos.")
+        return {"filenames": uploaded_filenames, "message": "Archivos subidos exitosamente."}
+
+    @blocking_app.get("/download/{filename}")
+    async def download_file(filename: str):
+        safe_filename = os.path.basename(filename)
+        file_path = os.path.join(file_manager.UPLOAD_DIRECTORY, safe_filename)
+        if not os.path.isfile(file_path):
+            raise HTTPException(status_code=404, detail="Archivo no encontrado.")
+        return FileResponse(file_path, media_type="application/octet-stream", filename=safe_filename)
+
+    # La lista de la página de inicio: todos los archivos, con os.listdir, en cada visita
+    file_list = jinja2.Template(
+        "<ul>{% for filename in files_in_uploads %}"
+        '<li><a href="/download/{{ filename }}">{{ filename }}</a></li>'
+        "{% endfor %}</ul>"
+    )
+
+    @blocking_app.get("/", response_class=HTMLResponse)
+    async def home():
+        return file_list.render(files_in_uploads=os.listdir(file_manager.UPLOAD_DIRECTORY))
+
+    return blocking_app
+
+
+blocking_app = build_blocking_app()
+
+
+# --- Subida múltiple frente a descargas simultáneas ---
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(target: str, port: int, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, **(env or {})},
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/download/probe.bin", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"El servidor {target} no ha arrancado.")
+
+
+def _run_upload_with_probes(base_url: str, source: str, files: int):
+    """Sube `files` copias de `source` en una petición y descarga probe.bin en bucle mientras tanto."""
+    result = {}
+
+    def upload() -> None:
+        handles = [open(source, "rb") for _ in range(files)]
+        try:
+            start = time.perf_counter()
+            with httpx.Client(base_url=base_url, timeout=300) as client:
+                response = client.post(
+                    "/uploadfiles/",
+                    files=[("files", (f"upload-{i}.bin", handle)) for i, handle in enumerate(handles)],
+                )
+            result["elapsed"] = time.perf_counter() - start
+            result["status"] = response.status_code
+        finally:
+            for handle in handles:
+                handle.close()
+
+    uploader = threading.Thread(target=upload)
+    latencies: List[float] = []
+    with httpx.Client(base_url=base_url, timeout=300) as client:
+        uploader.start()
+        while uploader.is_alive():
+            start = time.perf_counter()
+            client.get("/download/probe.bin").raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    uploader.join()
+    return result, latencies
+
+
+def bench_uploads(args) -> None:
+    upload_dir = file_manager.UPLOAD_DIRECTORY
+    with open(os.path.join(upload_dir, "probe.bin"), "wb") as probe:
+        probe.write(os.urandom(args.probe_kb * 1024))
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.bin")
+        with open(source, "wb") as f:
+            f.write(os.urandom(args.size_mb * 1024 * 1024))
+        total_mb = args.files * args.size_mb
+        print(
+            f"Subida de {args.files} archivos de {args.size_mb} MiB ({total_mb} MiB) con descargas de "
+            f"{args.probe_kb} KiB en paralelo (UPLOAD_CONCURRENCY={file_manager.UPLOAD_CONCURRENCY})"
+        )
+        for label, target in (("anterior", "benchmark:blocking_app"), ("hilos", "main:app")):
+            port = _free_port()
+            server = _start_server(target, port)
+            try:
+                result, latencies = _run_upload_with_probes(f"http://127.0.0.1:{port}", source, args.files)
+            finally:
+                server.terminate()
+                server.wait()
+            if result.get("status") != 200:
+                print(f"  {label:8}: la subida ha fallado (HTTP {result.get('status')})")
+                continue
+            latencies.sort()
+            p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+            print(
+                f"  {label:8}: subida {result['elapsed']:6.2f} s ({total_mb / result['elapsed']:7.1f} MiB/s)  "
+                f"descargas {len(latencies):5}  p50 {statistics.median(latencies) * 1e3:7.2f} ms  "
+                f"p99 {p99 * 1e3:7.2f} ms  máx {latencies[-1] * 1e3:7.2f} ms"
+            )
+
+
+# --- Subidas reanudables ---
+
+def _upload_chunks(client: httpx.Client, upload_id: str, source: str, offsets: List[int], chunk_size: int, parallel: int) -> None:
+    """Envía los bloques que empiezan en `offsets`, `parallel` a la vez, con su SHA-256."""
+    def send(offset: int) -> None:
+        with open(source, "rb") as f:
+            chunk = os.pread(f.fileno(), chunk_size, offset)
+        checksum = base64.b64encode(hashlib.sha256(chunk).digest()).decode("ascii")
+        response = client.put(
+            f"/uploads/{upload_id}",
+            content=chunk,
+            headers={"Upload-Offset": str(offset), "Upload-Checksum": f"sha256 {checksum}"},
+        )
+        response.raise_for_status()
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        list(pool.map(send, offsets))
+
+
+def _resumable_upload(base_url: str, source: str, filename: str, chunk_size: int, parallel: int, interrupt: bool) -> float:
+    size = os.path.getsize(source)
+    offsets = list(range(0, size, chunk_size))
+    limits = httpx.Limits(max_connections=parallel)
+    with httpx.Client(base_url=base_url, timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        upload_id = client.post("/uploads/", json={"filename": filename, "size": size}).json()["upload_id"]
+        if interrupt:
+            # Corte a mitad: se envía la primera mitad y se "pierde" la conexión
+            _upload_chunks(client, upload_id, source, offsets[: len(offsets) // 2], chunk_size, parallel)
+            offset = int(client.head(f"/uploads/{upload_id}").headers["Upload-Offset"])
+            offsets = [o for o in offsets if o >= offset]
+        _upload_chunks(client, upload_id, source, offsets, chunk_size, parallel)
+        client.post(f"/uploads/{upload_id}/finalize").raise_for_status()
+        return time.perf_counter() - start
+
+
+def _file_digest(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1024 * 1024):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def bench_resumable(args) -> None:
+    upload_dir = file_manager.UPLOAD_DIRECTORY
+    chunk_size = args.chunk_mb * 1024 * 1024
+    with open(os.path.join(upload_dir, "probe.bin"), "wb") as probe:
+        probe.write(b"\0")
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.bin")
+        with open(source, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+        expected = _file_digest(source)
+        print(f"Archivo de {args.size_mb} MiB, bloques de {args.chunk_mb} MiB, {args.parallel} en paralelo")
+        port = _free_port()
+        server = _start_server("main:app", port)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            runs = []
+            with open(source, "rb") as f, httpx.Client(base_url=base_url, timeout=300) as client:
+                start = time.perf_counter()
+                client.post("/uploadfile/", files={"file": ("multipart.bin", f)}).raise_for_status()
+                runs.append(("multipart", "multipart.bin", time.perf_counter() - start))
+            for label, parallel, interrupt in (
+                ("reanudable, secuencial", 1, False),
+                (f"reanudable, {args.parallel} en paralelo", args.parallel, False),
+                ("reanudable, con corte", args.parallel, True),
+            ):
+                filename = f"resumable-{len(runs)}.bin"
+                runs.append((label, filename, _resumable_upload(base_url, source, filename, chunk_size, parallel, interrupt)))
+        finally:
+            server.terminate()
+            server.wait()
+        for label, filename, elapsed in runs:
+            identical = storage.resolve(filename)[0] == expected
+            print(f"  {label:26}: {elapsed:6.2f} s ({args.size_mb / elapsed:7.1f} MiB/s)  {'idéntico' if identical else 'DISTINTO'}")
+
+
+# --- Descargas de archivos grandes ---
+
+def _download(client: httpx.Client, url: str, headers: Optional[Dict[str, str]] = None, limit: Optional[int] = None):
+    """Descarga `url` calculando el SHA-256; con `limit` corta la conexión tras recibir esos bytes."""
+    hasher = hashlib.sha256()
+    received = 0
+    with client.stream("GET", url, headers=headers) as response:
+        for block in response.iter_bytes():
+            hasher.update(block)
+            received += len(block)
+            if limit is not None and received >= limit:
+                break
+    return response, hasher, received
+
+
+def _ranged_download(base_url: str, url: str, size: int, parallel: int) -> str:
+    """Descarga el archivo en `parallel` rangos a la vez y devuelve el SHA-256 del resultado."""
+    step = -(-size // parallel)
+    with httpx.Client(base_url=base_url, timeout=300, limits=httpx.Limits(max_connections=parallel)) as client:
+        def fetch(start: int) -> bytes:
+            response = client.get(url, headers={"Range": f"bytes={start}-{min(start + step, size) - 1}"})
+            assert response.status_code == 206, response.status_code
+            return response.content
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            blocks = list(pool.map(fetch, range(0, size, step)))
+    return hashlib.sha256(b"".join(blocks)).hexdigest()
+
+
+def bench_downloads(args) -> None:
+    upload_dir = file_manager.UPLOAD_DIRECTORY
+    path = os.path.join(upload_dir, "large.bin")
+    with open(path, "wb") as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+    with open(os.path.join(upload_dir, "probe.bin"), "wb") as probe:
+        probe.write(b"\0")
+    expected = _file_digest(path)
+    size = os.path.getsize(path)
+    print(f"Descarga de un archivo de {args.size_mb} MiB, mejor de {args.rounds} rondas")
+    servers = [("anterior (FileResponse)", "benchmark:blocking_app", {})]
+    for chunk_kb in args.chunk_kb.split(","):
+        env = {"DOWNLOAD_CHUNK_SIZE": str(int(chunk_kb) * 1024)}
+        servers.append((f"downloads.py, {chunk_kb} KiB", "main:app", env))
+    for label, target, env in servers:
+        port = _free_port()
+        server = _start_server(target, port, env)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            with httpx.Client(base_url=base_url, timeout=300) as client:
+                timings = []
+                for _ in range(args.rounds):
+                    start = time.perf_counter()
+                    response, hasher, _ = _download(client, "/download/large.bin")
+                    timings.append(time.perf_counter() - start)
+                    assert response.status_code == 200 and hasher.hexdigest() == expected
+            print(f"  {label:26}: {args.size_mb / min(timings):7.1f} MiB/s")
+        finally:
+            server.terminate()
+            server.wait()
+
+    # Rangos, reanudación y revalidación solo con la versión actual
+    port = _free_port()
+    server = _start_server("main:app", port)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        start = time.perf_counter()
+        identical = _ranged_download(base_url, "/download/large.bin", size, 4) == expected
+        elapsed = time.perf_counter() - start
+        print(f"  {'4 rangos en paralelo':26}: {args.size_mb / elapsed:7.1f} MiB/s  {'idéntico' if identical else 'DISTINTO'}")
+
+        with httpx.Client(base_url=base_url, timeout=300) as client:
+            # Corte a mitad de la descarga y reanudación desde el último byte recibido
+            response, _, received = _download(client, "/download/large.bin", limit=size // 2)
+            etag = response.headers["etag"]
+            start = time.perf_counter()
+            resumed, hasher_rest, rest = _download(
+                client, "/download/large.bin", headers={"Range": f"bytes={received}-", "If-Range": etag},
+            )
+            elapsed = time.perf_counter() - start
+            # Lo recibido al reanudar tiene que ser exactamente el resto del archivo
+            # Al arrancar, la aplicación ha pasado large.bin al almacén
+            with open(storage.blob_path(expected), "rb") as f:
+                identical = hashlib.sha256(os.pread(f.fileno(), rest, received)).digest() == hasher_rest.digest()
+            print(
+                f"  {'reanudación':26}: HTTP {resumed.status_code}, {rest / 1024 / 1024:.0f} MiB pendientes en "
+                f"{elapsed:.2f} s  {'idéntico' if identical and received + rest == size else 'DISTINTO'}"
+            )
+
+            latencies = []
+            for _ in range(200):
+                start = time.perf_counter()
+                response = client.get("/download/large.bin", headers={"If-None-Match": etag})
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 304
+            print(f"  {'revalidación (304)':26}: p50 {statistics.median(latencies) * 1e3:.2f} ms")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+# --- Subidas repetidas: almacén direccionado por contenido ---
+
+def _disk_usage(directory: str) -> int:
+    """Bytes ocupados en disco (bloques asignados) por los archivos de `directory`."""
+    total = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            total += os.lstat(os.path.join(root, name)).st_blocks * 512
+    return total
+
+
+def bench_dedup(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = []
+        for i in range(args.files):
+            source = os.path.join(tmp, f"source-{i}.bin")
+            with open(source, "wb") as f:
+                for _ in range(args.size_mb):
+                    f.write(os.urandom(1024 * 1024))
+            sources.append((source, _file_digest(source)))
+        total_mb = args.files * args.copies * args.size_mb
+        print(f"{args.files} archivos de {args.size_mb} MiB subidos {args.copies} veces cada uno ({total_mb} MiB)")
+        for label, target, send_digest in (
+            ("anterior", "benchmark:blocking_app", False),
+            ("almacén", "main:app", False),
+            ("almacén + X-Content-SHA256", "main:app", True),
+        ):
+            # Cada versión escribe en su propio directorio para medir lo que ocupa
+            upload_dir = tempfile.mkdtemp(dir=tmp)
+            with open(os.path.join(upload_dir, "probe.bin"), "wb") as probe:
+                probe.write(b"\0")
+            port = _free_port()
+            server = _start_server(target, port, {"UPLOAD_DIR": upload_dir, "BENCHMARK_UPLOAD_DIR": upload_dir})
+            try:
+                with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+                    start = time.perf_counter()
+                    for copy in range(args.copies):
+                        for i, (source, digest) in enumerate(sources):
+                            headers = {"X-Content-SHA256": digest} if send_digest else {}
+                            with open(source, "rb") as f:
+                                response = client.post(
+                                    "/uploadfile/", files={"file": (f"copia-{copy}-{i}.bin", f)}, headers=headers,
+                                )
+                            response.raise_for_status()
+                    elapsed = time.perf_counter() - start
+            finally:
+                server.terminate()
+                server.wait()
+            print(
+                f"  {label:27}: {elapsed:6.2f} s ({total_mb / elapsed:7.1f} MiB/s)  "
+                f"en disco {_disk_usage(upload_dir) / 1024 / 1024:7.1f} MiB"
+            )
+
+
+# --- Catálogo de la página de inicio ---
+
+def _latencies(client: httpx.Client, url: str, requests: int, params: Optional[dict] = None) -> List[float]:
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get(url, params=params).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def _report(label: str, latencies: List[float]) -> None:
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    print(f"  {label:34}: p50 {statistics.median(latencies) * 1e3:8.2f} ms  p99 {p99 * 1e3:8.2f} ms")
+
+
+def bench_catalog(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        # Versión anterior: un archivo suelto por nombre
+        old_dir = os.path.join(tmp, "anterior")
+        os.makedirs(old_dir)
+        for i in range(args.files):
+            open(os.path.join(old_dir, f"archivo-{i:07d}.bin"), "wb").close()
+        with open(os.path.join(old_dir, "probe.bin"), "wb") as probe:
+            probe.write(b"\0")
+
+        # Catálogo: args.files nombres repartidos entre 1000 blobs de tamaños distintos
+        blobs = []
+        for size in range(1, 1001):
+            digest, _, _ = storage.store_stream(io.BytesIO(os.urandom(size)))
+            blobs.append((digest, size))
+        now = time.time()
+        rows = [
+            (f"archivo-{i:07d}.bin", *random.choice(blobs), now - random.random() * 86400 * 365)
+            for i in range(args.files)
+        ]
+        conn = storage.index_connection()
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO files (name, digest, size, created) VALUES (?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+        storage.link_name("probe.bin", *blobs[0])
+
+        print(f"Página de inicio con {args.files} archivos, {args.requests} peticiones")
+        for label, target, upload_dir in (
+            ("anterior", "benchmark:blocking_app", old_dir),
+            ("catálogo", "main:app", file_manager.UPLOAD_DIRECTORY),
+        ):
+            port = _free_port()
+            server = _start_server(target, port, {"UPLOAD_DIR": upload_dir, "BENCHMARK_UPLOAD_DIR": upload_dir})
+            try:
+                with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+                    _report(f"{label}: GET /", _latencies(client, "/", args.requests))
+                    if target == "main:app":
+                        params = {"sort_by": "size", "order": "desc"}
+                        _report("catálogo: GET /files/ por tamaño", _latencies(client, "/files/", args.requests, params))
+                        # Página profunda: el cursor de la mitad del catálogo
+                        for _ in range(args.files // 2 // catalog.CATALOG_PAGE_SIZE):
+                            params["cursor"] = client.get("/files/", params=params).json()["next_cursor"]
+                        _report("catálogo: GET /files/ a mitad", _latencies(client, "/files/", args.requests, params))
+            finally:
+                server.terminate()
+                server.wait()
+
+        catalog.reconcile()
+        start = time.perf_counter()
+        catalog.reconcile()
+        print(f"  {'reconciliador sin cambios':34}: {(time.perf_counter() - start) * 1e3:8.2f} ms por pasada")
+
+
+# --- Compresión de los archivos guardados ---
+
+def _write_log(path: str, size_mb: int, seed: int) -> None:
+    """Registro de texto de unos `size_mb` MiB, parecido al de un servidor web."""
+    rng = random.Random(seed)
+    paths = ["/", "/files/", "/uploadfile/", "/download/informe.pdf", "/static/app.js", "/upload/session"]
+    with open(path, "w") as f:
+        while f.tell() < size_mb * 1024 * 1024:
+            f.writelines(
+                f"2024-05-{rng.randint(1, 31):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}Z "
+                f"10.0.{rng.randint(0, 255)}.{rng.randint(0, 255)} {rng.choice(('GET', 'POST', 'HEAD'))} "
+                f"{rng.choice(paths)} {rng.choice((200, 200, 200, 206, 304, 404))} {rng.randint(0, 10 ** 6)} "
+                f"{rng.random() * 100:.3f}ms\n"
+                for _ in range(1000)
+            )
+
+
+def bench_compression(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = []
+        for i in range(args.files):
+            source = os.path.join(tmp, f"registro-{i}.log")
+            _write_log(source, args.size_mb, seed=i)
+            sources.append((source, _file_digest(source), os.path.getsize(source)))
+        total_mb = sum(size for _, _, size in sources) / 1024 / 1024
+        print(f"{args.files} registros de texto de {args.size_mb} MiB ({total_mb:.0f} MiB)")
+        for label, encoding in (("sin comprimir", None), ("gzip", "gzip"), ("zstd", "zstd")):
+            upload_dir = tempfile.mkdtemp(dir=tmp)
+            with open(os.path.join(upload_dir, "probe.bin"), "wb") as probe:
+                probe.write(b"\0")
+            env = {
+                "UPLOAD_DIR": upload_dir,
+                "BENCHMARK_UPLOAD_DIR": upload_dir,
+                "STORAGE_COMPRESSION": f"text/*={encoding}" if encoding else "",
+            }
+            port = _free_port()
+            server = _start_server("main:app", port, env)
+            try:
+                with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+                    start = time.perf_counter()
+                    for source, _, _ in sources:
+                        with open(source, "rb") as f:
+                            response = client.post(
+                                "/uploadfile/", files={"file": (os.path.basename(source), f, "text/plain")},
+                            )
+                        response.raise_for_status()
+                    upload = total_mb / (time.perf_counter() - start)
+
+                    # Con Accept-Encoding: los bytes tal como están guardados
+                    start = time.perf_counter()
+                    for source, _, _ in sources:
+                        headers = {"Accept-Encoding": encoding or "identity"}
+                        with client.stream("GET", f"/download/{os.path.basename(source)}", headers=headers) as response:
+                            assert response.headers.get("content-encoding") == encoding
+                            for _ in response.iter_raw():
+                                pass
+                    stored = total_mb / (time.perf_counter() - start)
+
+                    # Sin Accept-Encoding: el servidor descomprime al vuelo
+                    start = time.perf_counter()
+                    for source, digest, _ in sources:
+                        response, hasher, _ = _download(
+                            client, f"/download/{os.path.basename(source)}", headers={"Accept-Encoding": "identity"},
+                        )
+                        assert hasher.hexdigest() == digest
+                    decoded = total_mb / (time.perf_counter() - start)
+            finally:
+                server.terminate()
+                server.wait()
+            print(
+                f"  {label:14}: en disco {_disk_usage(os.path.join(upload_dir, '.blobs')) / 1024 / 1024:7.1f} MiB  "
+                f"subida {upload:6.1f} MiB/s  descarga {stored:7.1f} MiB/s (guardado), {decoded:7.1f} MiB/s (sin Accept-Encoding)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    uploads = subparsers.add_parser("uploads", help="Subida múltiple frente a descargas simultáneas.")
+    uploads.add_argument("--files", type=int, default=8)
+    uploads.add_argument("--size-mb", type=int, default=16, help="Tamaño de cada archivo en MiB.")
+    uploads.add_argument("--probe-kb", type=int, default=64, help="Tamaño del archivo que se descarga.")
+    uploads.set_defaults(func=bench_uploads)
+
+    resumable = subparsers.add_parser("resumable", help="Subida multipart frente a subida reanudable por bloques.")
+    resumable.add_argument("--size-mb", type=int, default=256)
+    resumable.add_argument("--chunk-mb", type=int, default=8, help="Tamaño de cada bloque en MiB.")
+    resumable.add_argument("--parallel", type=int, default=4, help="Bloques enviados a la vez.")
+    resumable.set_defaults(func=bench_resumable)
+
+    downloads = subparsers.add_parser("downloads", help="Descarga de archivos grandes: completa, por rangos y reanudada.")
+    downloads.add_argument("--size-mb", type=int, default=512)
+    downloads.add_argument("--rounds", type=int, default=3)
+    downloads.add_argument("--chunk-kb", default="64,1024,4096", help="Valores de DOWNLOAD_CHUNK_SIZE en KiB, separados por comas.")
+    downloads.set_defaults(func=bench_downloads)
+
+    dedup = subparsers.add_parser("dedup", help="Subidas repetidas con y sin almacén direccionado por contenido.")
+    dedup.add_argument("--files", type=int, default=4)
+    dedup.add_argument("--copies", type=int, default=4, help="Veces que se sube cada archivo, con nombres distintos.")
+    dedup.add_argument("--size-mb", type=int, default=64)
+    dedup.set_defaults(func=bench_dedup)
+
+    catalog_parser = subparsers.add_parser("catalog", help="Página de inicio con os.listdir frente al catálogo paginado.")
+    catalog_parser.add_argument("--files", type=int, default=100000)
+    catalog_parser.add_argument("--requests", type=int, default=50)
+    catalog_parser.set_defaults(func=bench_catalog)
+
+    compression = subparsers.add_parser("compression", help="Archivos guardados sin comprimir, con gzip y con zstd.")
+    compression.add_argument("--files", type=int, default=4)
+    compression.add_argument("--size-mb", type=int, default=64)
+    compression.set_defaults(func=bench_compression)
+
+    args = parser.parse_args()
+    args.func(args)
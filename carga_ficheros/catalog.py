@@ -0,0 +1,186 @@
+import asyncio
+import base64
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import storage
+
+# --- Catálogo de archivos ---
+# La lista de archivos sale del índice de storage.py (nombre, tamaño, SHA-256
+# y fecha), no de os.listdir: con cientos de miles de archivos, recorrer el
+# directorio y pintar todos los nombres en cada visita a la página de inicio
+# era lo que más tardaba. Las subidas actualizan el índice al terminar; el
+# reconciliador lo pone al día con los cambios hechos a mano en el disco.
+
+# Segundos entre dos pasadas del reconciliador (0 lo desactiva)
+CATALOG_RECONCILE_INTERVAL = float(os.getenv("CATALOG_RECONCILE_INTERVAL", "60"))
+
+# Si el reconciliador incorpora al almacén los archivos sueltos de UPLOAD_DIR.
+# Desactivado por defecto: el archivo suelto se borra una vez enlazado en el
+# almacén, y en una copia de trabajo eso borraría archivos de ejemplo del
+# repositorio. Para incorporarlos una sola vez: python storage.py --import
+CATALOG_IMPORT_PLAIN_FILES = os.getenv("CATALOG_IMPORT_PLAIN_FILES", "false").lower() in ("1", "true", "yes")
+
+# Archivos por página de la página de inicio y de GET /files/
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "50"))
+
+# Columnas por las que se puede ordenar; el nombre (único) desempata
+SORT_COLUMNS = {"name": "name", "size": "size", "created": "created"}
+
+def encode_cursor(sort_by: str, order: str, key, name: str) -> str:
+    """Codifica la posición (clave de ordenación, nombre) del último archivo como un cursor opaco."""
+    payload = json.dumps({"s": sort_by, "o": order, "k": [key, name]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+class InvalidCursorError(ValueError):
+    """El cursor no se puede decodificar o no corresponde a la ordenación pedida."""
+
+def _int_key(key) -> int:
+    # SQLite solo admite enteros de 64 bits
+    value = int(key)
+    if not -2**63 <= value < 2**63:
+        raise OverflowError("Entero fuera de rango.")
+    return value
+
+def _str_key(key) -> str:
+    if not isinstance(key, str):
+        raise TypeError("La clave debe ser un texto.")
+    return key
+
+# Tipo de la clave de cada columna de ordenación: el cursor viene del cliente,
+# así que la clave se convierte antes de llegar a la consulta
+CURSOR_KEY_TYPES = {"name": _str_key, "size": _int_key, "created": float}
+
+def decode_cursor(cursor: str, sort_by: str, order: str):
+    """Decodifica un cursor y devuelve (clave, nombre). Lanza InvalidCursorError si no es válido para esa ordenación."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        key, name = payload["k"]
+        if payload["s"] != sort_by or payload["o"] != order:
+            raise InvalidCursorError("El cursor corresponde a otra ordenación.")
+        return CURSOR_KEY_TYPES[sort_by](key), _str_key(name)
+    except InvalidCursorError:
+        raise
+    except Exception:
+        # Incluye UnicodeDecodeError y binascii.Error: su mensaje no se devuelve al cliente
+        raise InvalidCursorError("Cursor no válido.")
+
+def _file_entry(name: str, digest: str, size: int, created: float) -> dict:
+    return {
+        "name": name,
+        "size": size,
+        "sha256": digest,
+        "created": datetime.fromtimestamp(created, timezone.utc).isoformat(),
+    }
+
+def list_files(
+    limit: int = CATALOG_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    sort_by: str = "name",
+    order: str = "asc",
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Paginación por cursor (keyset) sobre (sort_by, name): en lugar de OFFSET se
+    filtran las filas posteriores a la última recibida, así que SQLite salta
+    directamente a esa posición por el índice y cualquier página cuesta lo
+    mismo. Devuelve (archivos, next_cursor). Lanza InvalidCursorError si el
+    cursor no es válido.
+    """
+    column = SORT_COLUMNS[sort_by]
+    comparison, direction = (">", "ASC") if order == "asc" else ("<", "DESC")
+    columns = ["name"] if column == "name" else [column, "name"]
+    where, params = "", []
+    if cursor:
+        key, name = decode_cursor(cursor, sort_by, order)
+        if column == "name":
+            where, params = f"WHERE name {comparison} ?", [name]
+        else:
+            # Comparación de filas: usa el índice (columna, name)
+            where, params = f"WHERE ({column}, name) {comparison} (?, ?)", [key, name]
+    ordering = ", ".join(f"{c} {direction}" for c in columns)
+    # Pedimos una fila de más para saber si existe una página siguiente
+    rows = storage.index_connection().execute(
+        f"SELECT name, digest, size, created FROM files {where} ORDER BY {ordering} LIMIT ?",
+        (*params, limit + 1),
+    ).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        name, _, size, created = rows[-1]
+        key = {"name": name, "size": size, "created": created}[column]
+        next_cursor = encode_cursor(sort_by, order, key, name)
+    return [_file_entry(*row) for row in rows], next_cursor
+
+# --- Reconciliador ---
+# Sondea el disco cada CATALOG_RECONCILE_INTERVAL segundos (inotify no está en
+# la biblioteca estándar y no sirve en discos de red). Para no recorrer cientos
+# de miles de blobs en cada pasada, solo se revisan los subdirectorios de
+# .blobs/ cuya fecha de modificación ha cambiado (cambia al crear o borrar un
+# archivo dentro), y lo mismo con UPLOAD_DIR para los archivos sueltos.
+
+_seen_mtimes: Dict[str, Optional[int]] = {}
+
+def _changed(path: str) -> bool:
+    """True si el directorio ha cambiado (o aparecido/desaparecido) desde la última pasada."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    changed = path not in _seen_mtimes or _seen_mtimes[path] != mtime
+    _seen_mtimes[path] = mtime
+    return changed
+
+def _remove_missing_blobs(prefix: str) -> List[str]:
+    """Quita del índice los nombres cuyo blob (con este prefijo) ya no existe. Devuelve los nombres."""
+    conn = storage.index_connection()
+    # Primero el índice y después el disco: una subida enlaza el blob antes de
+    # registrar el nombre, así que un nombre del índice nunca es más nuevo que su blob
+    digests = {row[0] for row in conn.execute(
+        "SELECT DISTINCT digest FROM files WHERE digest >= ? AND digest < ?", (prefix, f"{prefix}g"),
+    )}
+    if not digests:
+        return []
+    directory = os.path.join(storage.BLOBS_DIRECTORY, prefix)
+    try:
+        # Sin el sufijo de los blobs comprimidos (<sha256>.zst, <sha256>.gz)
+        on_disk = {name.split(".", 1)[0] for name in os.listdir(directory)}
+    except FileNotFoundError:
+        on_disk = set()
+    missing = [d for d in digests - on_disk if storage.find_blob(d) is None]
+    removed = []
+    for digest in missing:
+        removed += [row[0] for row in conn.execute("SELECT name FROM files WHERE digest = ?", (digest,))]
+        conn.execute("DELETE FROM files WHERE digest = ?", (digest,))
+    return removed
+
+def reconcile() -> dict:
+    """
+    Una pasada del reconciliador: incorpora los archivos sueltos de
+    UPLOAD_DIRECTORY (si CATALOG_IMPORT_PLAIN_FILES lo permite) y quita del
+    catálogo los archivos cuyo contenido se ha borrado del disco. Bloqueante.
+    """
+    imported = []
+    if CATALOG_IMPORT_PLAIN_FILES and _changed(storage.UPLOAD_DIRECTORY):
+        imported = storage.import_plain_files()
+    removed = []
+    for prefix in (f"{i:02x}" for i in range(256)):
+        if _changed(os.path.join(storage.BLOBS_DIRECTORY, prefix)):
+            removed += _remove_missing_blobs(prefix)
+    return {"imported": imported, "removed": removed}
+
+async def run_reconciler(interval: float = CATALOG_RECONCILE_INTERVAL) -> None:
+    """Ejecuta reconcile() cada `interval` segundos en un hilo, hasta que se cancela la tarea."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await asyncio.to_thread(reconcile)
+        except Exception as e:
+            print(f"Error al reconciliar el catálogo: {e}")
+            continue
+        for name in result["imported"]:
+            print(f"Archivo incorporado al catálogo: {name}")
+        for name in result["removed"]:
+            print(f"Archivo sin contenido quitado del catálogo: {name}")
@@ -0,0 +1,105 @@
+import gzip
+import mimetypes
+import os
+import zlib
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+# --- Compresión de los archivos guardados ---
+# Opcional y por tipo de contenido: STORAGE_COMPRESSION es una lista de reglas
+# "tipo=códec" separadas por comas, por ejemplo
+#   STORAGE_COMPRESSION=text/html=gzip,text/css=gzip,application/javascript=gzip,text/*=zstd,application/json=zstd
+# gzip lo aceptan todos los navegadores, así que el archivo se sirve tal cual
+# está guardado; zstd comprime más y más rápido (registros, CSV, JSON) y los
+# clientes que no lo aceptan reciben el archivo descomprimido al vuelo. Vacío
+# (por defecto): los archivos se guardan sin comprimir.
+STORAGE_COMPRESSION = os.getenv("STORAGE_COMPRESSION", "")
+
+# Niveles de compresión
+STORAGE_ZSTD_LEVEL = int(os.getenv("STORAGE_ZSTD_LEVEL", "3"))
+STORAGE_GZIP_LEVEL = int(os.getenv("STORAGE_GZIP_LEVEL", "6"))
+
+# Si el archivo comprimido ocupa más de esta fracción del original, se guarda sin comprimir
+STORAGE_COMPRESSION_MAX_RATIO = float(os.getenv("STORAGE_COMPRESSION_MAX_RATIO", "0.9"))
+
+# Sufijo del blob de cada codificación (el blob sin comprimir no lleva sufijo)
+SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+try:
+    import zstandard
+except ImportError: # Dependencia opcional
+    zstandard = None
+
+def parse_rules(value: str) -> List[Tuple[str, str]]:
+    """Reglas [(tipo, códec)] de STORAGE_COMPRESSION. Lanza ValueError si alguna no es válida."""
+    rules = []
+    for rule in filter(None, (part.strip() for part in value.split(","))):
+        content_type, _, encoding = rule.partition("=")
+        content_type, encoding = content_type.strip().lower(), encoding.strip().lower()
+        if encoding not in SUFFIXES or "/" not in content_type:
+            raise ValueError(f"Regla de compresión no válida: {rule!r} (formato tipo/subtipo=zstd|gzip)")
+        if encoding == "zstd" and zstandard is None:
+            print(f"El paquete 'zstandard' no está instalado; {content_type} se comprime con gzip.")
+            encoding = "gzip"
+        rules.append((content_type, encoding))
+    return rules
+
+_rules = parse_rules(STORAGE_COMPRESSION)
+
+def encoding_for(content_type: Optional[str], filename: str) -> Optional[str]:
+    """
+    Códec con el que se guarda un archivo, o None para guardarlo sin comprimir.
+    El tipo es el de la subida o, si no lo indica (o es genérico), el que
+    corresponde a la extensión del nombre.
+    """
+    if not _rules:
+        return None
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if not content_type or content_type == "application/octet-stream":
+        content_type = (mimetypes.guess_type(filename)[0] or "").lower()
+    for pattern, encoding in _rules:
+        if pattern == content_type or (pattern.endswith("/*") and content_type.startswith(pattern[:-1])):
+            return encoding
+    return None
+
+def compressor(encoding: str):
+    """Compresor por bloques: compress(bytes) -> bytes y flush() -> bytes al terminar."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=STORAGE_ZSTD_LEVEL).compressobj()
+    # wbits=31: formato gzip (cabecera y CRC), sin nombre ni fecha, así que es reproducible
+    return zlib.compressobj(STORAGE_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+def decoded_reader(file: BinaryIO, encoding: str) -> BinaryIO:
+    """
+    Lector que descomprime `file` al vuelo. read(n) devuelve como mucho n
+    bytes, por muy comprimidos que estén los datos.
+    """
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Hace falta el paquete 'zstandard' para leer archivos guardados con zstd.")
+        return zstandard.ZstdDecompressor().stream_reader(file)
+    return gzip.GzipFile(fileobj=file, mode="rb")
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Codificaciones de Accept-Encoding con su peso q: {"gzip": 1.0, "*": 0.5}."""
+    accepted = {}
+    for part in (header or "").split(","):
+        name, *params = (p.strip() for p in part.split(";"))
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.lower()] = q
+    return accepted
+
+def accepts(header: Optional[str], encoding: str) -> bool:
+    """True si Accept-Encoding admite `encoding` (con q > 0, directamente o con "*")."""
+    accepted = parse_accept_encoding(header)
+    if encoding == "gzip" and "x-gzip" in accepted and "gzip" not in accepted:
+        accepted["gzip"] = accepted["x-gzip"]
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
@@ -0,0 +1,312 @@
+import asyncio
+import contextlib
+import os
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+from starlette.responses import Response
+
+import compressors
+
+# --- Descargas con rangos, ETag y envío sin copias ---
+# Respuesta ASGI para /download/{filename}:
+#   * Range: "bytes=0-99", "bytes=1000-", "bytes=-500" y varios rangos a la vez
+#     (206 con multipart/byteranges); If-Range para reanudar solo si el archivo
+#     no ha cambiado. Un cliente interrumpido pide solo lo que le falta.
+#   * ETag fuerte a partir de inodo, mtime (ns) y tamaño, Last-Modified y 304
+#     con If-None-Match / If-Modified-Since: una comprobación de caché no
+#     vuelve a descargar el archivo.
+#   * Si el servidor ASGI ofrece la extensión "http.response.zerocopysend"
+#     (o "http.response.pathsend" para el archivo completo), el servidor envía
+#     el archivo con sendfile() sin pasar los datos por Python. Si no (uvicorn),
+#     se leen bloques de DOWNLOAD_CHUNK_SIZE con os.pread en un hilo.
+#   * Archivos guardados comprimidos (compressors.py): si Accept-Encoding admite
+#     su códec se envían los bytes guardados tal cual, con Content-Encoding (y
+#     con rangos y envío sin copias); si no, se descomprimen al vuelo, sin rangos.
+
+# Tamaño de los bloques que se leen y envían cuando no hay envío sin copias
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Rangos admitidos en una petición; con más se envía el archivo completo
+DOWNLOAD_MAX_RANGES = int(os.getenv("DOWNLOAD_MAX_RANGES", "16"))
+
+class RangeNotSatisfiable(Exception):
+    """Ninguno de los rangos pedidos está dentro del archivo (416)."""
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """ETag fuerte: cambia si el archivo se reemplaza (inodo), se modifica (mtime) o cambia de tamaño."""
+    return f'"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Rangos [inicio, fin) de una cabecera Range, ordenados y fusionados si se
+    solapan o son contiguos. Devuelve None si la cabecera no es válida o pide
+    demasiados rangos (se ignora y se envía el archivo completo). Lanza
+    RangeNotSatisfiable si ningún rango está dentro del archivo.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+    specs = specs.split(",")
+    if len(specs) > DOWNLOAD_MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs:
+        first, dash, last = (part.strip() for part in spec.partition("-"))
+        if not dash or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # Sufijo: los últimos N bytes
+            length = int(last)
+            if length > 0 and size > 0:
+                ranges.append((max(0, size - length), size))
+            continue
+        start = int(first)
+        end = size if not last else int(last) + 1
+        if last and end <= start:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size)))
+    if not ranges:
+        raise RangeNotSatisfiable()
+    ranges.sort()
+    merged = [list(ranges[0])]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+def _etag_matches(header: str, etag: str, weak: bool) -> bool:
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if weak and tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+class DownloadResponse(Response):
+    """
+    Respuesta que sirve un archivo con rangos, ETag y 304. Hereda de Response
+    para que FastAPI la devuelva tal cual; el estado y las cabeceras de cada
+    envío se deciden en __call__ a partir de la petición.
+    """
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        filename: Optional[str] = None,
+        media_type: str = "application/octet-stream",
+        etag: Optional[str] = None,
+        content_encoding: Optional[str] = None,
+        decoded_size: Optional[int] = None,
+    ):
+        """
+        `content_encoding` es el códec con el que está guardado el archivo
+        (None si no está comprimido) y `decoded_size`, su tamaño descomprimido.
+        """
+        self.path = path
+        self.status_code = 200
+        self.background = None
+        self.stat_result = stat_result
+        self.media_type = media_type
+        # Quien conoce un validador mejor (p.ej. el digest del contenido) lo pasa en `etag`
+        self.etag = etag or file_etag(stat_result)
+        self.last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+        self.content_encoding = content_encoding
+        self.decoded_size = decoded_size
+        self.disposition = None
+        if filename is not None:
+            quoted = quote(filename)
+            self.disposition = f'attachment; filename="{filename}"' if quoted == filename else f"attachment; filename*=utf-8''{quoted}"
+        self.raw_headers = self._headers(self.etag, ranges=True)
+
+    def _headers(self, etag: str, ranges: bool) -> List[Tuple[bytes, bytes]]:
+        headers = [
+            (b"accept-ranges", b"bytes" if ranges else b"none"),
+            (b"etag", etag.encode("latin-1")),
+            (b"last-modified", self.last_modified.encode("latin-1")),
+        ]
+        if self.disposition is not None:
+            headers.append((b"content-disposition", self.disposition.encode("latin-1")))
+        return headers
+
+    def _representation(self, scope) -> Tuple[str, List[Tuple[bytes, bytes]], bool]:
+        """
+        (ETag, cabeceras, descomprimir) de lo que se envía: el archivo tal cual
+        está guardado o, si el cliente no admite su códec, descomprimido. Cada
+        representación tiene su propio ETag fuerte.
+        """
+        if self.content_encoding is None:
+            return self.etag, self.raw_headers, False
+        vary = (b"vary", b"accept-encoding")
+        if compressors.accepts(self._request_header(scope, b"accept-encoding"), self.content_encoding):
+            etag = f'{self.etag[:-1]}-{self.content_encoding}"'
+            headers = self._headers(etag, ranges=True) + [(b"content-encoding", self.content_encoding.encode("latin-1")), vary]
+            return etag, headers, False
+        return self.etag, self._headers(self.etag, ranges=False) + [vary], True
+
+    def _request_header(self, scope, name: bytes) -> Optional[str]:
+        for key, value in scope["headers"]:
+            if key.lower() == name:
+                return value.decode("latin-1")
+        return None
+
+    def _select_ranges(self, scope, etag: str) -> Optional[List[Tuple[int, int]]]:
+        """Rangos que hay que enviar, o None para el archivo completo."""
+        header = self._request_header(scope, b"range")
+        if header is None or scope["method"] not in ("GET", "HEAD"):
+            return None
+        if_range = self._request_header(scope, b"if-range")
+        if if_range is not None:
+            # Solo con un validador fuerte: el ETag exacto o la fecha exacta
+            if if_range.strip() not in (etag, self.last_modified):
+                return None
+        return parse_range_header(header, self.stat_result.st_size)
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self._respond(scope, receive, send)
+        if self.background is not None:
+            await self.background()
+
+    async def _respond(self, scope, receive, send) -> None:
+        etag, base_headers, decode = self._representation(scope)
+        size = self.decoded_size if decode else self.stat_result.st_size
+        head_only = scope["method"] == "HEAD"
+        if_none_match = self._request_header(scope, b"if-none-match")
+        if_modified_since = self._request_header(scope, b"if-modified-since")
+        if (if_none_match is not None and _etag_matches(if_none_match, etag, weak=True)) or (
+            if_none_match is None and if_modified_since is not None
+            and _not_modified_since(if_modified_since, self.stat_result.st_mtime)
+        ):
+            await send({"type": "http.response.start", "status": 304, "headers": base_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        try:
+            # Al descomprimir al vuelo no se puede saltar a una posición: se ignora Range
+            ranges = None if decode else self._select_ranges(scope, etag)
+        except RangeNotSatisfiable:
+            headers = base_headers + [(b"content-range", f"bytes */{size}".encode()), (b"content-length", b"0")]
+            await send({"type": "http.response.start", "status": 416, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if ranges is None:
+            status, parts = 200, [(0, size, b"")]
+            headers = base_headers + [(b"content-type", self.media_type.encode("latin-1"))]
+            trailer = b""
+        elif len(ranges) == 1:
+            (start, end), = ranges
+            status, parts = 206, [(start, end, b"")]
+            headers = base_headers + [
+                (b"content-type", self.media_type.encode("latin-1")),
+                (b"content-range", f"bytes {start}-{end - 1}/{size}".encode()),
+            ]
+            trailer = b""
+        else:
+            boundary = uuid.uuid4().hex
+            status, parts = 206, [
+                (
+                    start, end,
+                    (b"\r\n" if i else b"") + (
+                        f"--{boundary}\r\nContent-Type: {self.media_type}\r\n"
+                        f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+                    ).encode("latin-1"),
+                )
+                for i, (start, end) in enumerate(ranges)
+            ]
+            headers = base_headers + [(b"content-type", f"multipart/byteranges; boundary={boundary}".encode())]
+            trailer = f"\r\n--{boundary}--\r\n".encode()
+        content_length = sum(end - start + len(prefix) for start, end, prefix in parts) + len(trailer)
+        headers.append((b"content-length", str(content_length).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        if head_only:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if decode:
+            await self._send_decoded(receive, send)
+            return
+        extensions = scope.get("extensions") or {}
+        if status == 200 and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+            return
+        await self._send_parts(receive, send, parts, trailer, "http.response.zerocopysend" in extensions)
+
+    def _watch_disconnect(self, receive, disconnected: asyncio.Event) -> asyncio.Task:
+        async def watch_disconnect() -> None:
+            # uvicorn descarta en silencio lo que se envía tras una desconexión:
+            # sin esto se seguiría leyendo el archivo hasta el final
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+        return asyncio.create_task(watch_disconnect())
+
+    async def _send_decoded(self, receive, send) -> None:
+        """Envía el archivo descomprimido, leyendo y descomprimiendo cada bloque en un hilo."""
+        disconnected = asyncio.Event()
+        watcher = self._watch_disconnect(receive, disconnected)
+        file = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            reader = compressors.decoded_reader(file, self.content_encoding)
+            while not disconnected.is_set():
+                data = await asyncio.to_thread(reader.read, DOWNLOAD_CHUNK_SIZE)
+                if not data:
+                    break
+                await send({"type": "http.response.body", "body": data, "more_body": True})
+            if not disconnected.is_set():
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            watcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await watcher
+            await asyncio.to_thread(file.close)
+
+    async def _send_parts(self, receive, send, parts, trailer: bytes, zero_copy: bool) -> None:
+        disconnected = asyncio.Event()
+        watcher = self._watch_disconnect(receive, disconnected)
+        file = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            for index, (start, end, prefix) in enumerate(parts):
+                last_part = index == len(parts) - 1 and not trailer
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                if zero_copy:
+                    # El servidor hace sendfile() del descriptor: los datos no pasan por Python
+                    await send({
+                        "type": "http.response.zerocopysend", "file": file,
+                        "offset": start, "count": end - start, "more_body": not last_part,
+                    })
+                    continue
+                position = start
+                while position < end and not disconnected.is_set():
+                    count = min(DOWNLOAD_CHUNK_SIZE, end - position)
+                    data = await asyncio.to_thread(os.pread, file.fileno(), count, position)
+                    if not data: # El archivo ha encogido mientras se enviaba
+                        raise RuntimeError(f"{self.path} ha cambiado durante la descarga.")
+                    position += len(data)
+                    await send({"type": "http.response.body", "body": data, "more_body": not (last_part and position >= end)})
+                if disconnected.is_set():
+                    return
+            if trailer:
+                await send({"type": "http.response.body", "body": trailer, "more_body": False})
+            elif not parts or parts[-1][0] == parts[-1][1]:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            watcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await watcher
+            await asyncio.to_thread(file.close)
@@ -1,74 +1,151 @@
+import asyncio
 import os
+import re
 from fastapi import UploadFile, HTTPException
-from fastapi.responses import FileResponse
-from typing import List
-from dotenv import load_dotenv # Importa load_dotenv
+from typing import List, Optional
 
-# Carga las variables de entorno desde el archivo .env
-load_dotenv()
+import catalog
+import compressors
+import storage
+from downloads import DownloadResponse
+# El directorio de carga y el tamaño de bloque se configuran en storage.py
+from storage import UPLOAD_CHUNK_SIZE, UPLOAD_DIRECTORY
 
-# Obtiene la ruta del directorio de carga desde las variables de entorno
-# Si no está definida en .env, usa 'uploads' como valor por defecto
-UPLOAD_DIRECTORY = os.getenv("UPLOAD_DIR", "./uploads")
+# Archivos que se escriben a la vez como máximo (en todo el proceso)
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
 
-# Asegúrate de que el directorio de subida exista al importar el módulo
-os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+# Limita las escrituras simultáneas para no saturar el disco ni el threadpool
+_upload_slots = asyncio.Semaphore(max(1, UPLOAD_CONCURRENCY))
 
-async def save_single_file(file: UploadFile) -> dict:
+_SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+
+# --- Escritura de archivos ---
+# La copia al disco se hace en un hilo (asyncio.to_thread): open() y write()
+# son bloqueantes y, en el bucle de eventos, una subida grande detendría todas
+# las demás peticiones del worker. El contenido se guarda en el almacén de
+# storage.py con su SHA-256 como nombre, calculado mientras se copia: un
+# archivo que ya estaba subido (con este u otro nombre) no ocupa más disco. Si
+# STORAGE_COMPRESSION lo indica para su tipo, se comprime en el mismo bucle.
+
+class InvalidFileName(ValueError):
+    """El nombre de un archivo subido no es válido: el cliente recibe un 400."""
+
+def safe_upload_name(filename: str) -> str:
+    """
+    Nombre con el que se guarda un archivo subido. Lanza InvalidFileName si no
+    es válido: vacío u oculto (los nombres con punto inicial se reservan para
+    los temporales y las sesiones de subida).
+    """
+    # Usamos os.path.basename para evitar path traversal si el nombre de archivo contiene rutas
+    safe_filename = os.path.basename(filename or "")
+    if not safe_filename or safe_filename.startswith("."):
+        raise InvalidFileName(f"Nombre de archivo no válido: {filename!r}")
+    return safe_filename
+
+def parse_content_digest(header: Optional[str]) -> Optional[str]:
+    """SHA-256 en hexadecimal de la cabecera X-Content-SHA256, o None si no se envía."""
+    if header is None:
+        return None
+    digest = header.strip().lower()
+    if not _SHA256_HEX.fullmatch(digest):
+        raise HTTPException(status_code=400, detail="X-Content-SHA256 debe ser un SHA-256 en hexadecimal.")
+    return digest
+
+async def _store_file(file: UploadFile, expected_digest: Optional[str] = None) -> dict:
     """
-    Guarda un solo archivo en el directorio de subida.
+    Guarda un UploadFile en el almacén sin bloquear el bucle de eventos y
+    registra su nombre. Si el nombre ya existe con otro contenido se guarda
+    como "nombre (1).ext"; el nombre final se devuelve en "filename".
+    """
+    safe_filename = safe_upload_name(file.filename)
+    encoding = compressors.encoding_for(file.content_type, safe_filename)
+    async with _upload_slots:
+        digest, size, written = await asyncio.to_thread(storage.store_stream, file.file, expected_digest, encoding)
+    filename = await asyncio.to_thread(storage.link_name, safe_filename, digest, size)
+    return {"filename": filename, "size": size, "sha256": digest, "deduplicated": not written}
+
+async def save_single_file(file: UploadFile, expected_digest: Optional[str] = None) -> dict:
+    """
+    Guarda un solo archivo en el directorio de subida. Con `expected_digest`
+    (cabecera X-Content-SHA256) se rechaza el archivo si su contenido no
+    coincide, y si ese contenido ya estaba subido no se vuelve a escribir.
     """
     try:
-        # Usamos os.path.basename para evitar path traversal si el nombre de archivo contiene rutas
-        safe_filename = os.path.basename(file.filename)
-        file_path = os.path.join(UPLOAD_DIRECTORY, safe_filename)
-        
-        # Escribir el archivo en bloques para manejar archivos grandes eficientemente
-        with open(file_path, "wb") as buffer:
-            while contents := await file.read(1024 * 1024): # Lee en bloques de 1MB
-                buffer.write(contents)
-        return {"filename": safe_filename, "message": "Archivo subido exitosamente."}
+        stored = await _store_file(file, expected_digest)
+        return {**stored, "message": "Archivo subido exitosamente."}
+    except (storage.DigestMismatch, InvalidFileName) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al subir el archivo: {e}")
 
 async def save_multiple_files(files: List[UploadFile]) -> dict:
     """
-    Guarda múltiples archivos en el directorio de subida.
+    Guarda múltiples archivos en el directorio de subida, hasta
+    UPLOAD_CONCURRENCY a la vez. Los archivos que se guardan correctamente se
+    conservan aunque falle otro; si falla alguno, el detalle del error indica
+    cuáles se guardaron y por qué fallaron los demás. El error es 400 si todos
+    los fallos son nombres no válidos y 500 en otro caso.
     """
-    uploaded_filenames = []
-    for file in files:
-        try:
-            # Usamos os.path.basename para evitar path traversal si el nombre de archivo contiene rutas
-            safe_filename = os.path.basename(file.filename)
-            file_path = os.path.join(UPLOAD_DIRECTORY, safe_filename)
-            
-            with open(file_path, "wb") as buffer:
-                while contents := await file.read(1024 * 1024):
-                    buffer.write(contents)
-            uploaded_filenames.append(safe_filename)
-        except Exception as e:
-            print(f"Error al subir {file.filename}: {e}")
-            raise HTTPException(status_code=500, detail=f"Error al subir uno o más archivos.")
-    return {"filenames": uploaded_filenames, "message": "Archivos subidos exitosamente."}
+    results = await asyncio.gather(*(_store_file(file) for file in files), return_exceptions=True)
+    uploaded, errors = [], []
+    for file, result in zip(files, results):
+        if isinstance(result, InvalidFileName):
+            errors.append({"filename": file.filename, "error": str(result)})
+        elif isinstance(result, BaseException):
+            print(f"Error al subir {file.filename}: {result}")
+            errors.append({"filename": file.filename, "error": "Error al subir el archivo."})
+        else:
+            uploaded.append(result)
+    if errors:
+        invalid_names = sum(isinstance(result, InvalidFileName) for result in results)
+        raise HTTPException(
+            status_code=400 if invalid_names == len(errors) else 500,
+            detail={"message": "Error al subir uno o más archivos.", "files": uploaded, "errors": errors},
+        )
+    return {
+        "filenames": [stored["filename"] for stored in uploaded],
+        "files": uploaded,
+        "message": "Archivos subidos exitosamente.",
+    }
 
-def get_file_for_download(filename: str) -> FileResponse:
+def get_file_for_download(filename: str) -> DownloadResponse:
     """
-    Prepara un archivo para su descarga, verificando su existencia.
+    Prepara un archivo para su descarga, buscando su contenido por nombre en
+    el índice del almacén. La respuesta admite rangos (Range/If-Range) y
+    peticiones condicionales (If-None-Match/If-Modified-Since); ver downloads.py.
     """
     # Usamos os.path.basename para evitar path traversal
     safe_filename = os.path.basename(filename)
-    file_path = os.path.join(UPLOAD_DIRECTORY, safe_filename)
-    
-    if not os.path.exists(file_path):
+    entry = storage.resolve(safe_filename)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Archivo no encontrado.")
-    
-    return FileResponse(file_path, media_type="application/octet-stream", filename=safe_filename)
+    digest, size = entry
+    blob = storage.find_blob(digest)
+    try:
+        stat_result = os.stat(blob[0]) if blob else None
+    except FileNotFoundError:
+        stat_result = None
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado.")
+    file_path, encoding = blob
+    # El contenido no cambia nunca para un mismo digest: es el ETag perfecto
+    return DownloadResponse(
+        file_path, stat_result, filename=safe_filename, etag=f'"{digest}"',
+        content_encoding=encoding, decoded_size=size,
+    )
 
-def get_available_files() -> List[str]:
+def get_available_files(
+    limit: int = catalog.CATALOG_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    sort_by: str = "name",
+    order: str = "asc",
+) -> dict:
     """
-    Obtiene una lista de los nombres de los archivos disponibles en el directorio de subida.
+    Obtiene una página de los archivos disponibles (nombre, tamaño, SHA-256 y
+    fecha) del catálogo, con el cursor de la página siguiente.
     """
-    # También es buena práctica verificar si el directorio existe antes de listarlo
-    if not os.path.exists(UPLOAD_DIRECTORY):
-        return []
-    return os.listdir(UPLOAD_DIRECTORY)
\ No newline at end of file
+    try:
+        files, next_cursor = catalog.list_files(limit, cursor, sort_by, order)
+    except catalog.InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"files": files, "next_cursor": next_cursor}
\ No newline at end of file
@@ -1,31 +1,79 @@
-from fastapi import FastAPI, UploadFile, File, Request, HTTPException
+import asyncio
+from fastapi import FastAPI, UploadFile, File, Request, HTTPException, Header, Query, Response, status
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from typing import List
+from typing import List, Optional
 
 # Importamos las funciones de nuestro módulo de lógica
+import catalog
 import file_manager
+import resumable
 
 app = FastAPI()
 
+_reconciler_task = None
+
+@app.on_event("startup")
+def startup_event():
+    global _reconciler_task
+    # Primera pasada antes de atender peticiones: con CATALOG_IMPORT_PLAIN_FILES,
+    # los archivos sueltos de UPLOAD_DIR (de antes del almacén) pasan al almacén y al catálogo
+    for filename in catalog.reconcile()["imported"]:
+        print(f"Archivo incorporado al almacén: {filename}")
+    if catalog.CATALOG_RECONCILE_INTERVAL > 0:
+        _reconciler_task = asyncio.get_running_loop().create_task(catalog.run_reconciler())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _reconciler_task is not None:
+        _reconciler_task.cancel()
+
 # Configuramos el directorio de plantillas
 templates = Jinja2Templates(directory="templates")
 
 @app.get("/", response_class=HTMLResponse)
-async def home(request: Request):
+def home(
+    request: Request,
+    cursor: Optional[str] = None,
+    sort_by: str = Query("name", pattern="^(name|size|created)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+):
     """
-    Muestra la página de inicio con formularios y enlaces a archivos.
+    Muestra la página de inicio con formularios y una página de enlaces a archivos.
+    Es una función síncrona, como /files/: la consulta al índice SQLite se
+    ejecuta en el threadpool y no bloquea el bucle de eventos.
     """
-    files_in_uploads = file_manager.get_available_files()
-    return templates.TemplateResponse("index.html", {"request": request, "files_in_uploads": files_in_uploads})
+    page = file_manager.get_available_files(cursor=cursor, sort_by=sort_by, order=order)
+    return templates.TemplateResponse(
+        request,
+        "index.html",
+        {"files_in_uploads": page["files"], "next_cursor": page["next_cursor"], "sort_by": sort_by, "order": order},
+    )
+
+@app.get("/files/")
+def list_files(
+    limit: int = Query(catalog.CATALOG_PAGE_SIZE, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort_by: str = Query("name", pattern="^(name|size|created)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+):
+    """
+    Catálogo de archivos en JSON (nombre, tamaño, SHA-256 y fecha), paginado
+    por cursor: `next_cursor` pide la página siguiente con la misma ordenación.
+    """
+    return file_manager.get_available_files(limit, cursor, sort_by, order)
 
 @app.post("/uploadfile/")
-async def upload_single_file(file: UploadFile = File(...)):
+async def upload_single_file(
+    file: UploadFile = File(...),
+    content_sha256: Optional[str] = Header(None, alias="X-Content-SHA256"),
+):
     """
     Endpoint para subir un solo archivo, usando la lógica de file_manager.
+    Con X-Content-SHA256 se verifica el contenido y, si ya estaba subido, no se vuelve a escribir.
     """
     # La lógica de guardar el archivo está en file_manager
-    response_data = await file_manager.save_single_file(file)
+    response_data = await file_manager.save_single_file(file, file_manager.parse_content_digest(content_sha256))
     return response_data
 
 @app.post("/uploadfiles/")
@@ -37,10 +85,68 @@ async def upload_multiple_files(files: List[UploadFile] = File(...)):
     response_data = await file_manager.save_multiple_files(files)
     return response_data
 
-@app.get("/download/{filename}")
-async def download_file(filename: str):
+@app.api_route("/download/{filename}", methods=["GET", "HEAD"])
+def download_file(filename: str):
     """
     Endpoint para descargar un archivo específico, usando la lógica de file_manager.
+    Es una función síncrona: la búsqueda en el índice SQLite y el stat del blob
+    se hacen en el threadpool; el envío del archivo ya lee el disco en hilos.
     """
     # La lógica de servir el archivo está en file_manager
-    return file_manager.get_file_for_download(filename)
\ No newline at end of file
+    return file_manager.get_file_for_download(filename)
+
+# --- Subidas reanudables (ver resumable.py) ---
+
+@app.post("/uploads/", status_code=status.HTTP_201_CREATED)
+async def create_upload_session(upload: resumable.UploadSessionCreate, response: Response):
+    """
+    Crea una sesión de subida reanudable para un archivo de `size` bytes.
+    """
+    session = await resumable.create_session(upload)
+    response.headers["Location"] = f"/uploads/{session['upload_id']}"
+    return session
+
+@app.head("/uploads/{upload_id}")
+def upload_offset(upload_id: str):
+    """
+    Devuelve en Upload-Offset los bytes recibidos sin huecos desde el principio.
+    """
+    session = resumable.session_status(upload_id)
+    return Response(headers={
+        "Upload-Offset": str(session["offset"]),
+        "Upload-Length": str(session["size"]),
+        "Cache-Control": "no-store",
+    })
+
+@app.get("/uploads/{upload_id}")
+def upload_status(upload_id: str):
+    """
+    Estado de la sesión, con los rangos de bytes recibidos (útil con bloques en paralelo).
+    """
+    return resumable.session_status(upload_id)
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+):
+    """
+    Escribe el cuerpo de la petición (bytes sin codificar) en la posición Upload-Offset.
+    """
+    return await resumable.write_chunk(upload_id, upload_offset, request, upload_checksum)
+
+@app.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str):
+    """
+    Verifica los bloques recibidos y mueve el archivo al directorio de subida.
+    """
+    return await resumable.finalize(upload_id)
+
+@app.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload(upload_id: str):
+    """
+    Cancela la sesión de subida y borra los datos recibidos.
+    """
+    await resumable.abort(upload_id)
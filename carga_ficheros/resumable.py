@@ -0,0 +1,336 @@
+import asyncio
+import base64
+import binascii
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, Field
+
+try:
+    import fcntl
+except ImportError: # Windows: sin flock, finalize copia los datos en lugar de enlazarlos
+    fcntl = None
+
+import storage
+from file_manager import UPLOAD_CHUNK_SIZE, UPLOAD_DIRECTORY, safe_upload_name
+
+# --- Subidas reanudables por bloques ---
+# Protocolo al estilo tus (https://tus.io):
+#   POST   /uploads/                    crea una sesión con el nombre y el tamaño total
+#   PUT    /uploads/{id}                escribe un bloque en la posición Upload-Offset
+#   HEAD   /uploads/{id}                devuelve en Upload-Offset los bytes recibidos sin huecos
+#   GET    /uploads/{id}                estado con todos los rangos recibidos
+#   POST   /uploads/{id}/finalize       verifica los bloques y pasa el archivo al almacén
+#   DELETE /uploads/{id}                cancela la sesión
+# Los bloques pueden llegar en cualquier orden y en paralelo: cada uno se
+# escribe en su posición del archivo de la sesión (os.pwrite), que tiene desde
+# el principio el tamaño final. Al terminar, el archivo se enlaza en el almacén
+# (storage.py) sin volver a copiar los datos (está en el mismo sistema de archivos).
+#
+# Como el blob publicado es el mismo inodo que el archivo de la sesión, ningún
+# PUT puede seguir escribiendo en él después de verificarlo: cada PUT mantiene
+# un bloqueo compartido (flock) sobre el archivo de datos mientras escribe y
+# registra su bloque, y finalize toma uno exclusivo desde la verificación hasta
+# borrar la sesión. Ninguno de los dos espera: un PUT durante la finalización,
+# o una finalización con PUT en curso, recibe un 409. flock funciona entre
+# hilos y entre workers de uvicorn de la misma máquina.
+
+# Sesiones en curso: un directorio oculto por sesión dentro de UPLOAD_DIRECTORY
+SESSIONS_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".sessions")
+
+# Segundos sin actividad tras los que una sesión se descarta
+UPLOAD_SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+
+# Tamaño máximo de un archivo subido por sesión (50 GiB por defecto)
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(50 * 1024 ** 3)))
+
+# Código de tus para un bloque cuya suma de verificación no coincide
+CHECKSUM_MISMATCH = 460
+
+_SESSION_ID = re.compile(r"[0-9a-f]{32}")
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    size: int = Field(..., ge=0)
+
+def _session_path(upload_id: str, *parts: str) -> str:
+    # El ID se valida antes de usarlo en una ruta (evita path traversal)
+    if not _SESSION_ID.fullmatch(upload_id) or not os.path.isdir(os.path.join(SESSIONS_DIRECTORY, upload_id)):
+        raise HTTPException(status_code=404, detail="Sesión de subida no encontrada.")
+    return os.path.join(SESSIONS_DIRECTORY, upload_id, *parts)
+
+def _load_meta(upload_id: str) -> dict:
+    with open(_session_path(upload_id, "meta.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_atomic(path: str, content: str) -> None:
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+def _load_chunks(upload_id: str) -> List[dict]:
+    """Bloques recibidos, ordenados por posición: [{"offset", "length", "sha256"}]."""
+    chunks_dir = _session_path(upload_id, "chunks")
+    chunks = []
+    for name in os.listdir(chunks_dir):
+        if name.isdigit():
+            with open(os.path.join(chunks_dir, name), encoding="utf-8") as f:
+                chunks.append(json.load(f))
+    return sorted(chunks, key=lambda chunk: chunk["offset"])
+
+def _received_ranges(chunks: List[dict]) -> List[Tuple[int, int]]:
+    """Rangos [inicio, fin) cubiertos por los bloques, fusionados."""
+    ranges: List[List[int]] = []
+    for chunk in chunks:
+        start, end = chunk["offset"], chunk["offset"] + chunk["length"]
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    return [(start, end) for start, end in ranges]
+
+def _contiguous_offset(ranges: List[Tuple[int, int]]) -> int:
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+def _try_lock(fd: int, exclusive: bool) -> bool:
+    """Toma sin esperar un bloqueo flock sobre el archivo de datos. Sin fcntl siempre devuelve True."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+def _touch(upload_id: str) -> None:
+    os.utime(_session_path(upload_id, "meta.json"))
+
+def cleanup_expired_sessions(now: Optional[float] = None) -> int:
+    """Elimina las sesiones sin actividad en UPLOAD_SESSION_TTL segundos. Devuelve cuántas."""
+    now = time.time() if now is None else now
+    removed = 0
+    if not os.path.isdir(SESSIONS_DIRECTORY):
+        return 0
+    for upload_id in os.listdir(SESSIONS_DIRECTORY):
+        meta_path = os.path.join(SESSIONS_DIRECTORY, upload_id, "meta.json")
+        try:
+            expired = now - os.path.getmtime(meta_path) > UPLOAD_SESSION_TTL
+        except FileNotFoundError:
+            expired = True # Sesión a medio crear o a medio borrar
+        if expired:
+            shutil.rmtree(os.path.join(SESSIONS_DIRECTORY, upload_id), ignore_errors=True)
+            removed += 1
+    return removed
+
+def _create_session(filename: str, size: int) -> dict:
+    cleanup_expired_sessions()
+    upload_id = uuid.uuid4().hex
+    session_dir = os.path.join(SESSIONS_DIRECTORY, upload_id)
+    os.makedirs(os.path.join(session_dir, "chunks"))
+    # El archivo de datos tiene desde el principio su tamaño final (disperso),
+    # así que cada bloque se escribe directamente en su posición
+    with open(os.path.join(session_dir, "data"), "wb") as f:
+        f.truncate(size)
+    meta = {"upload_id": upload_id, "filename": filename, "size": size, "created": time.time()}
+    _write_atomic(os.path.join(session_dir, "meta.json"), json.dumps(meta))
+    return meta
+
+async def create_session(upload: UploadSessionCreate) -> dict:
+    """Crea una sesión de subida. Devuelve su ID, el tamaño y el tamaño de bloque recomendado."""
+    try:
+        filename = safe_upload_name(upload.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if upload.size > UPLOAD_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"El archivo supera el tamaño máximo ({UPLOAD_MAX_SIZE} bytes).")
+    meta = await asyncio.to_thread(_create_session, filename, upload.size)
+    return {"upload_id": meta["upload_id"], "filename": filename, "size": upload.size, "offset": 0, "chunk_size": UPLOAD_CHUNK_SIZE}
+
+def session_status(upload_id: str) -> dict:
+    """Estado de la sesión: bytes recibidos sin huecos desde el principio y rangos recibidos."""
+    meta = _load_meta(upload_id)
+    ranges = _received_ranges(_load_chunks(upload_id))
+    return {
+        "upload_id": upload_id,
+        "filename": meta["filename"],
+        "size": meta["size"],
+        "offset": _contiguous_offset(ranges),
+        "received": [list(r) for r in ranges],
+        "complete": ranges == [(0, meta["size"])] or meta["size"] == 0,
+    }
+
+def _parse_checksum(header: Optional[str]) -> Optional[bytes]:
+    """Upload-Checksum al estilo tus: "sha256 <digest en base64>" (también se admite hexadecimal)."""
+    if not header:
+        return None
+    algorithm, _, value = header.strip().partition(" ")
+    if algorithm.lower() != "sha256" or not value:
+        raise HTTPException(status_code=400, detail="Upload-Checksum debe ser 'sha256 <digest>'.")
+    value = value.strip()
+    try:
+        digest = bytes.fromhex(value) if len(value) == 64 else base64.b64decode(value, validate=True)
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Upload-Checksum no es un digest válido.")
+    if len(digest) != 32:
+        raise HTTPException(status_code=400, detail="Upload-Checksum no es un digest SHA-256.")
+    return digest
+
+def _write_block(fd: int, hasher, data: bytes, position: int) -> None:
+    """Calcula el hash del bloque y lo escribe en su posición. Bloqueante."""
+    hasher.update(data)
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, position)
+        view = view[written:]
+        position += written
+
+async def write_chunk(upload_id: str, offset: int, request: Request, checksum_header: Optional[str] = None) -> dict:
+    """
+    Escribe el cuerpo de la petición en la posición `offset` a medida que llega.
+    El bloque solo se da por recibido si llega completo y, si se indica
+    Upload-Checksum, su SHA-256 coincide; si no, el cliente lo reenvía. Si la
+    sesión se está finalizando se rechaza con un 409 sin escribir nada.
+    """
+    expected = _parse_checksum(checksum_header)
+    meta = await asyncio.to_thread(_load_meta, upload_id)
+    if offset < 0 or offset > meta["size"]:
+        raise HTTPException(status_code=400, detail="Upload-Offset fuera del archivo.")
+    hasher = hashlib.sha256()
+    position = offset
+    pending: List[bytes] = []
+    pending_size = 0
+    fd = await asyncio.to_thread(os.open, _session_path(upload_id, "data"), os.O_WRONLY)
+    try:
+        if not _try_lock(fd, exclusive=False):
+            raise HTTPException(status_code=409, detail="La sesión se está finalizando.")
+        # Si finalize terminó entre os.open y el bloqueo, la sesión ya no existe (404)
+        await asyncio.to_thread(_session_path, upload_id)
+        async for piece in request.stream():
+            if position + pending_size + len(piece) > meta["size"]:
+                raise HTTPException(status_code=400, detail="El bloque sobrepasa el tamaño declarado del archivo.")
+            pending.append(piece)
+            pending_size += len(piece)
+            # Se escribe en bloques de UPLOAD_CHUNK_SIZE para no saltar a un hilo por cada trozo recibido
+            if pending_size >= UPLOAD_CHUNK_SIZE:
+                await asyncio.to_thread(_write_block, fd, hasher, b"".join(pending), position)
+                position += pending_size
+                pending, pending_size = [], 0
+        if pending_size:
+            await asyncio.to_thread(_write_block, fd, hasher, b"".join(pending), position)
+            position += pending_size
+        length = position - offset
+        digest = hasher.digest()
+        if expected is not None and digest != expected:
+            raise HTTPException(status_code=CHECKSUM_MISMATCH, detail="La suma de verificación del bloque no coincide.")
+        # El bloque se registra antes de soltar el bloqueo: finalize ve los datos y su registro a la vez
+        if length:
+            chunk = {"offset": offset, "length": length, "sha256": digest.hex()}
+            await asyncio.to_thread(_write_atomic, _session_path(upload_id, "chunks", str(offset)), json.dumps(chunk))
+        await asyncio.to_thread(_touch, upload_id)
+    finally:
+        # Al cerrar el descriptor se suelta el bloqueo
+        await asyncio.to_thread(os.close, fd)
+    status = await asyncio.to_thread(session_status, upload_id)
+    return {"offset": status["offset"], "chunk": {"offset": offset, "length": length, "sha256": digest.hex()}}
+
+def _verify_chunks(data_path: str, chunks: List[dict], size: int) -> Tuple[List[dict], Optional[str]]:
+    """
+    Vuelve a leer cada bloque del disco y devuelve los que no coinciden con su
+    SHA-256 y, en la misma lectura, el SHA-256 del archivo completo (None si
+    los bloques se solapan de forma que no lo cubren en orden). Bloqueante.
+    """
+    corrupted = []
+    file_hasher = hashlib.sha256()
+    position = 0 # Hasta dónde se ha incluido el archivo en file_hasher
+    with open(data_path, "rb") as f:
+        for chunk in chunks:
+            in_order = chunk["offset"] == position
+            hasher = hashlib.sha256()
+            f.seek(chunk["offset"])
+            remaining = chunk["length"]
+            while remaining:
+                data = f.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                hasher.update(data)
+                if in_order:
+                    file_hasher.update(data)
+                remaining -= len(data)
+            if remaining or hasher.hexdigest() != chunk["sha256"]:
+                corrupted.append(chunk)
+            if in_order:
+                position += chunk["length"]
+    return corrupted, (file_hasher.hexdigest() if position == size else None)
+
+def _finalize(upload_id: str) -> dict:
+    data_path = _session_path(upload_id, "data")
+    fd = os.open(data_path, os.O_RDONLY)
+    try:
+        if not _try_lock(fd, exclusive=True):
+            raise HTTPException(status_code=409, detail="Hay bloques subiéndose; finaliza cuando terminen.")
+        # Otra finalización pudo terminar entre os.open y el bloqueo
+        _session_path(upload_id)
+        return _finalize_locked(upload_id, data_path)
+    finally:
+        os.close(fd)
+
+def _finalize_locked(upload_id: str, data_path: str) -> dict:
+    """Verifica y publica la sesión con el bloqueo exclusivo del archivo de datos tomado."""
+    meta = _load_meta(upload_id)
+    chunks = _load_chunks(upload_id)
+    ranges = _received_ranges(chunks)
+    if meta["size"] and ranges != [(0, meta["size"])]:
+        raise HTTPException(status_code=409, detail={"message": "Faltan bloques por subir.", "received": [list(r) for r in ranges]})
+    corrupted, digest = _verify_chunks(data_path, chunks, meta["size"])
+    if corrupted:
+        # Se descartan para que el cliente los vuelva a enviar
+        for chunk in corrupted:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(_session_path(upload_id, "chunks", str(chunk["offset"])))
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Hay bloques dañados; vuelve a enviarlos.", "offsets": [c["offset"] for c in corrupted]},
+        )
+    if digest is None:
+        digest, _ = storage.hash_file(data_path)
+    if fcntl is not None:
+        # Enlace duro en el mismo sistema de archivos: no se copian los datos
+        written = storage.add_file(data_path, digest)
+    else:
+        # Sin flock un PUT tardío podría cambiar el inodo enlazado: se copia
+        # y store_stream comprueba que el contenido sigue siendo el verificado
+        try:
+            with open(data_path, "rb") as f:
+                _, _, written = storage.store_stream(f, digest)
+        except storage.DigestMismatch:
+            raise HTTPException(status_code=409, detail="El archivo ha cambiado durante la finalización; vuelve a finalizar.")
+    filename = storage.link_name(meta["filename"], digest, meta["size"])
+    shutil.rmtree(os.path.join(SESSIONS_DIRECTORY, upload_id), ignore_errors=True)
+    return {
+        "filename": filename,
+        "size": meta["size"],
+        "sha256": digest,
+        "deduplicated": not written,
+        "message": "Archivo subido exitosamente.",
+    }
+
+async def finalize(upload_id: str) -> dict:
+    """Comprueba que se han recibido todos los bytes, verifica los bloques y publica el archivo."""
+    try:
+        return await asyncio.to_thread(_finalize, upload_id)
+    except FileNotFoundError:
+        # Otra petición ha finalizado o cancelado la sesión a la vez
+        raise HTTPException(status_code=404, detail="Sesión de subida no encontrada.")
+
+async def abort(upload_id: str) -> None:
+    """Cancela la sesión y borra los datos recibidos."""
+    session_dir = os.path.dirname(_session_path(upload_id, "meta.json"))
+    await asyncio.to_thread(shutil.rmtree, session_dir, True)
@@ -0,0 +1,242 @@
+"""
+Almacenamiento de los archivos subidos, direccionado por contenido.
+
+Cada archivo se guarda una sola vez, con su SHA-256 como nombre, en
+`UPLOAD_DIR/.blobs/<2 primeros caracteres>/<sha256>`. Los nombres con los que
+se suben los archivos se guardan en un índice SQLite (`UPLOAD_DIR/.index.sqlite3`)
+que relaciona cada nombre con su digest, así que varios nombres pueden apuntar
+al mismo contenido sin ocupar más disco. Si STORAGE_COMPRESSION lo indica
+para su tipo, el contenido se guarda comprimido (`<sha256>.zst` o
+`<sha256>.gz`, ver compressors.py); el digest es siempre el del archivo sin
+comprimir. Los archivos sueltos que ya hubiera en UPLOAD_DIR (de antes del
+almacén) se incorporan con el siguiente comando, o al arrancar la aplicación
+si CATALOG_IMPORT_PLAIN_FILES está activado:
+
+    python storage.py --import
+"""
+import argparse
+import contextlib
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import BinaryIO, List, Optional, Tuple
+from dotenv import load_dotenv # Importa load_dotenv
+
+import compressors
+
+# Carga las variables de entorno desde el archivo .env
+load_dotenv()
+
+# Obtiene la ruta del directorio de carga desde las variables de entorno
+# Si no está definida en .env, usa 'uploads' como valor por defecto
+UPLOAD_DIRECTORY = os.getenv("UPLOAD_DIR", "./uploads")
+
+# Tamaño de los bloques con los que se copia cada archivo al disco (1 MiB por defecto)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Contenido de los archivos, un archivo por digest
+BLOBS_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".blobs")
+
+# Índice nombre -> digest
+INDEX_PATH = os.path.join(UPLOAD_DIRECTORY, ".index.sqlite3")
+
+# Asegúrate de que el directorio de subida exista al importar el módulo
+os.makedirs(BLOBS_DIRECTORY, exist_ok=True)
+
+class DigestMismatch(ValueError):
+    """El SHA-256 del contenido no coincide con el que ha indicado el cliente."""
+
+def blob_path(digest: str, encoding: Optional[str] = None) -> str:
+    """Ruta del contenido con este SHA-256 (en hexadecimal), sin comprimir o comprimido con `encoding`."""
+    suffix = compressors.SUFFIXES[encoding] if encoding else ""
+    return os.path.join(BLOBS_DIRECTORY, digest[:2], digest + suffix)
+
+def find_blob(digest: str) -> Optional[Tuple[str, Optional[str]]]:
+    """(ruta, códec o None si no está comprimido) del blob de este contenido, o None si no existe."""
+    for encoding in (None, *compressors.SUFFIXES):
+        path = blob_path(digest, encoding)
+        if os.path.exists(path):
+            return path, encoding
+    return None
+
+# --- Índice de nombres ---
+# Una conexión por hilo: las funciones de este módulo se llaman desde los
+# hilos de asyncio.to_thread. En modo WAL las lecturas no esperan a las
+# escrituras, y las escrituras son una fila por archivo subido.
+
+_local = threading.local()
+
+def index_connection() -> sqlite3.Connection:
+    """Conexión al índice del hilo actual (se crea la primera vez)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(INDEX_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " name TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_files_digest ON files (digest)")
+        # Ordenaciones del catálogo (catalog.py); name ya tiene el índice de la clave primaria
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_files_size_name ON files (size, name)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_files_created_name ON files (created, name)")
+        _local.conn = conn
+    return conn
+
+def resolve(name: str) -> Optional[Tuple[str, int]]:
+    """(digest, tamaño) del archivo con este nombre, o None si no existe."""
+    row = index_connection().execute("SELECT digest, size FROM files WHERE name = ?", (name,)).fetchone()
+    return (row[0], row[1]) if row else None
+
+def _candidate_names(name: str):
+    """name, "name (1).ext", "name (2).ext"..."""
+    yield name
+    stem, extension = os.path.splitext(name)
+    counter = 1
+    while True:
+        yield f"{stem} ({counter}){extension}"
+        counter += 1
+
+def link_name(name: str, digest: str, size: int, created: Optional[float] = None) -> str:
+    """
+    Registra `name` para el contenido `digest` y devuelve el nombre registrado.
+    Si el nombre ya apunta a otro contenido no se sobrescribe: se usa
+    "name (1).ext", "name (2).ext"... Si ya apunta a este mismo contenido no
+    cambia nada. `created` es la fecha del archivo (por defecto, ahora).
+    """
+    conn = index_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for candidate in _candidate_names(name):
+            row = conn.execute("SELECT digest FROM files WHERE name = ?", (candidate,)).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO files (name, digest, size, created) VALUES (?, ?, ?, ?)",
+                    (candidate, digest, size, time.time() if created is None else created),
+                )
+                break
+            if row[0] == digest:
+                break
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return candidate
+
+# --- Contenido ---
+# El digest se calcula a la vez que se copia el archivo a un temporal de
+# .blobs/. Después, os.link publica el temporal con su digest como nombre: si
+# ya existe ese contenido, link falla y el temporal se borra, así que el blob
+# nunca se escribe dos veces ni se reemplaza mientras alguien lo descarga.
+
+def add_file(path: str, digest: str, encoding: Optional[str] = None) -> bool:
+    """
+    Añade el archivo `path` (comprimido con `encoding`, si se indica), cuyo
+    contenido tiene el SHA-256 `digest`, al almacén con un enlace duro: no se
+    copian los datos (debe estar en el mismo sistema de archivos). `path` no
+    se borra. Devuelve False si ya había un blob con ese contenido.
+    """
+    if find_blob(digest) is not None:
+        return False
+    path_in_store = blob_path(digest, encoding)
+    os.makedirs(os.path.dirname(path_in_store), exist_ok=True)
+    try:
+        os.link(path, path_in_store)
+        return True
+    except FileExistsError:
+        return False
+
+def _hash_stream(source: BinaryIO) -> Tuple[str, int]:
+    hasher = hashlib.sha256()
+    size = 0
+    while block := source.read(UPLOAD_CHUNK_SIZE):
+        hasher.update(block)
+        size += len(block)
+    return hasher.hexdigest(), size
+
+def hash_file(path: str) -> Tuple[str, int]:
+    """(SHA-256, tamaño) de un archivo. Bloqueante."""
+    with open(path, "rb") as f:
+        return _hash_stream(f)
+
+def _copy(source: BinaryIO, temp_path: str, mode: str, encoding: Optional[str]) -> Tuple[str, int, int]:
+    """
+    Copia `source` en `temp_path` calculando su SHA-256 y, con `encoding`,
+    comprimiendo cada bloque a medida que se copia. Devuelve (digest, tamaño
+    original, tamaño escrito).
+    """
+    hasher = hashlib.sha256()
+    compressor = compressors.compressor(encoding) if encoding else None
+    size = 0
+    with open(temp_path, mode) as buffer:
+        while block := source.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(block)
+            size += len(block)
+            buffer.write(compressor.compress(block) if compressor else block)
+        if compressor:
+            buffer.write(compressor.flush())
+        return hasher.hexdigest(), size, buffer.tell()
+
+def store_stream(
+    source: BinaryIO,
+    expected_digest: Optional[str] = None,
+    encoding: Optional[str] = None,
+) -> Tuple[str, int, bool]:
+    """
+    Guarda el contenido de `source`, comprimido con `encoding` si se indica, y
+    devuelve (digest, tamaño, escrito). Con `expected_digest` (el que indica el
+    cliente) y un blob ya existente con ese digest, el contenido solo se lee
+    para comprobarlo: no se escribe nada. Lanza DigestMismatch si el contenido
+    no coincide. Bloqueante.
+    """
+    source.seek(0)
+    if expected_digest is not None and find_blob(expected_digest) is not None:
+        digest, size = _hash_stream(source)
+        if digest != expected_digest:
+            raise DigestMismatch(f"El SHA-256 del archivo es {digest}, no {expected_digest}.")
+        return digest, size, False
+    temp_path = os.path.join(BLOBS_DIRECTORY, f".{uuid.uuid4().hex}.part")
+    try:
+        # "x": el temporal es nuevo (nombre único) y recibe los permisos habituales
+        digest, size, stored = _copy(source, temp_path, "xb", encoding)
+        if expected_digest is not None and digest != expected_digest:
+            raise DigestMismatch(f"El SHA-256 del archivo es {digest}, no {expected_digest}.")
+        if encoding and stored > size * compressors.STORAGE_COMPRESSION_MAX_RATIO:
+            # Apenas se comprime (ya estaba comprimido, o son datos aleatorios): se guarda tal cual
+            source.seek(0)
+            _copy(source, temp_path, "wb", None)
+            encoding = None
+        return digest, size, add_file(temp_path, digest, encoding)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_path)
+
+def import_plain_files() -> List[str]:
+    """Incorpora al almacén los archivos sueltos de UPLOAD_DIRECTORY (de antes del almacén). Devuelve sus nombres."""
+    imported = []
+    for name in sorted(os.listdir(UPLOAD_DIRECTORY)):
+        path = os.path.join(UPLOAD_DIRECTORY, name)
+        if name.startswith(".") or not os.path.isfile(path):
+            continue
+        digest, size = hash_file(path)
+        add_file(path, digest)
+        imported.append(link_name(name, digest, size, created=os.path.getmtime(path)))
+        # El archivo suelto solo se borra cuando su nombre ya está en el índice
+        os.unlink(path)
+    return imported
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--import", dest="import_files", action="store_true", help="Incorpora los archivos sueltos de UPLOAD_DIR.")
+    args = parser.parse_args()
+    if args.import_files:
+        for name in import_plain_files():
+            print(f"Importado: {name}")
+    conn = index_connection()
+    files, logical = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+    blobs = [find_blob(row[0]) for row in conn.execute("SELECT DISTINCT digest FROM files")]
+    on_disk = sum(os.path.getsize(blob[0]) for blob in blobs if blob is not None)
+    print(f"{files} archivos ({logical} bytes) en {len(blobs)} blobs ({on_disk} bytes en disco)")
@@ -0,0 +1,170 @@
+"""
+Benchmarks del almacenamiento del CRUD.
+
+Uso:
+    python benchmark.py writes [--clients 128] [--writes 20] [--initial 10000]
+    python benchmark.py list [--items 1000000]
+
+`writes` compara escrituras/segundo con muchos clientes concurrentes entre
+el método anterior (leer y reescribir todo data.json en cada escritura)
+y el almacén con log de operaciones y group commit.
+
+`list` compara GET /items/ construyendo la lista completa de modelos Pydantic
+(como antes) con la serialización en streaming desde el almacén: tiempo hasta
+el primer byte, tiempo total y pico de RSS durante el listado.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from uuid import uuid4
+
+from storage import ItemStore, GroupCommitWriter, encode_records, write_items_file
+
+
+def _make_item(i: int) -> dict:
+    return {"name": f"Producto {i}", "description": "Benchmark", "price": 1.0 + i, "id": str(uuid4())}
+
+
+def _seed(path: str, count: int) -> None:
+    write_items_file(path, [_make_item(i) for i in range(count)])
+
+
+# --- Escrituras concurrentes ---
+
+async def _legacy_writes(path: str, clients: int, writes: int) -> int:
+    """Reproduce el comportamiento anterior: leer y reescribir todo el archivo."""
+    async def client():
+        for i in range(writes):
+            with open(path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+            items.append(_make_item(i))
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(items, f, indent=2, ensure_ascii=False)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    with open(path, "r", encoding="utf-8") as f:
+        return len(json.load(f))
+
+
+async def _group_commit_writes(path: str, clients: int, writes: int, window: float) -> int:
+    store = ItemStore(path, compact_every=10_000)
+    writer = GroupCommitWriter(store, window=window)
+
+    async def client():
+        for i in range(writes):
+            await writer.create(_make_item(i))
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    await writer.close()
+    store.close()
+    return len(ItemStore(path))
+
+
+def bench_writes(args) -> None:
+    total = args.clients * args.writes
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.json")
+        _seed(legacy_path, args.initial)
+        start = time.perf_counter()
+        legacy_count = asyncio.run(_legacy_writes(legacy_path, args.clients, args.writes))
+        legacy_time = time.perf_counter() - start
+
+        store_path = os.path.join(tmp, "store.json")
+        _seed(store_path, args.initial)
+        start = time.perf_counter()
+        store_count = asyncio.run(_group_commit_writes(store_path, args.clients, args.writes, args.window / 1000))
+        store_time = time.perf_counter() - start
+
+    print(f"Clientes concurrentes: {args.clients}, escrituras totales: {total}, artículos iniciales: {args.initial}")
+    print(f"  reescritura completa : {total / legacy_time:10.1f} escrituras/s ({legacy_count - args.initial} confirmadas)")
+    print(f"  log + group commit   : {total / store_time:10.1f} escrituras/s ({store_count - args.initial} confirmadas)")
+
+
+# --- Listado completo: Pydantic frente a streaming ---
+
+def _reset_peak_rss() -> bool:
+    """Reinicia el pico de RSS del proceso (solo Linux). Devuelve False si no es posible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mib() -> float:
+    """Pico de RSS del proceso en MiB (VmHWM en Linux, ru_maxrss en otros sistemas)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _list_worker(path: str, mode: str, queue) -> None:
+    store = ItemStore(path, compact_every=10_000_000)
+    exact_peak = _reset_peak_rss()
+    start = time.perf_counter()
+    if mode == "pydantic":
+        from models import ItemInDB
+        # Construcción de la lista, revalidación por response_model y serialización
+        items = [ItemInDB(**record) for record in store.values()]
+        validated = [ItemInDB.model_validate(item) for item in items]
+        body = json.dumps([item.model_dump() for item in validated], ensure_ascii=False).encode("utf-8")
+        first_byte = time.perf_counter() - start
+        size = len(body)
+    else:
+        chunks = encode_records(store.values())
+        size = len(next(chunks)) + len(next(chunks))
+        first_byte = time.perf_counter() - start
+        for chunk in chunks:
+            size += len(chunk)
+    total = time.perf_counter() - start
+    queue.put((first_byte, total, _peak_rss_mib(), exact_peak, size))
+
+
+def bench_list(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.json")
+        _seed(path, args.items)
+        print(f"Artículos: {args.items}")
+        for mode in ("pydantic", "streaming"):
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_list_worker, args=(path, mode, queue))
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                print(f"  {mode:10}: error (¿falta pydantic?)")
+                continue
+            first_byte, total, peak, exact_peak, size = queue.get()
+            peak_label = "pico RSS durante el listado" if exact_peak else "pico RSS del proceso"
+            print(f"  {mode:10}: primer byte {first_byte * 1000:9.1f} ms, total {total * 1000:9.1f} ms, "
+                  f"{peak_label} {peak:8.1f} MiB, {size / 2**20:.1f} MiB enviados")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    writes = subparsers.add_parser("writes", help="Escrituras/segundo con clientes concurrentes.")
+    writes.add_argument("--clients", type=int, default=128)
+    writes.add_argument("--writes", type=int, default=20, help="Escrituras por cliente.")
+    writes.add_argument("--initial", type=int, default=10_000, help="Artículos iniciales en data.json.")
+    writes.add_argument("--window", type=float, default=2.0, help="Ventana de group commit (ms).")
+    writes.set_defaults(func=bench_writes)
+
+    listing = subparsers.add_parser("list", help="Listado completo: Pydantic frente a streaming.")
+    listing.add_argument("--items", type=int, default=1_000_000)
+    listing.set_defaults(func=bench_list)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -1,33 +1,29 @@
-import json
 import os
-from typing import List
+from itertools import chain, islice
+from typing import List, Optional
 from uuid import uuid4
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 # Importamos los modelos desde el nuevo archivo models.py
 from models import ItemBase, ItemCreate, ItemUpdate, ItemInDB
+from storage import ItemStore, GroupCommitWriter, encode_records
 
-# Definición del archivo JSON donde se guardarán los datos
+# Definición del archivo JSON donde se guardarán los datos (checkpoint del almacén)
 DATA_FILE = "data.json"
 
-# --- Funciones para manejar el archivo JSON (se mantienen aquí) ---
-
-def read_items_from_json() -> List[ItemInDB]:
-    """Lee todos los artículos del archivo JSON."""
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        try:
-            items_data = json.load(f)
-            return [ItemInDB(**item) for item in items_data]
-        except json.JSONDecodeError:
-            # Si el archivo está vacío o corrupto, se inicializa con una lista vacía
-            return []
-
-def write_items_to_json(items: List[ItemInDB]):
-    """Escribe la lista de artículos al archivo JSON."""
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump([item.model_dump() for item in items], f, indent=2, ensure_ascii=False)
+# Número de operaciones en el log tras las que se compacta en data.json
+COMPACT_EVERY = int(os.getenv("CRUD_COMPACT_EVERY", "1000"))
+
+# Ventana (en milisegundos) durante la que se agrupan escrituras en un solo fsync
+COMMIT_WINDOW_MS = float(os.getenv("CRUD_COMMIT_WINDOW_MS", "2"))
+
+# --- Almacén de artículos (log de operaciones + índice en memoria) ---
+# El índice se construye una sola vez al importar el módulo.
+store = ItemStore(DATA_FILE, compact_every=COMPACT_EVERY)
+
+# Único escritor: serializa todas las mutaciones y las confirma por lotes
+writer = GroupCommitWriter(store, window=COMMIT_WINDOW_MS / 1000)
 
 # --- Creación del APIRouter ---
 router = APIRouter(
@@ -42,28 +38,77 @@ router = APIRouter(
 async def create_item(item: ItemCreate):
     """
     Crea un nuevo artículo.
-    Genera un ID único y lo guarda en el archivo JSON.
+    Genera un ID único y lo añade al log del almacén.
+    Responde cuando la escritura ya está en disco.
     """
-    items = read_items_from_json()
     new_id = str(uuid4())
     new_item = ItemInDB(id=new_id, **item.model_dump())
-    items.append(new_item)
-    write_items_to_json(items)
+    await writer.create(new_item.model_dump())
     return new_item
 
-@router.get("/", response_model=List[ItemInDB])
-async def read_all_items():
-    """Obtiene una lista de todos los artículos."""
-    return read_items_from_json()
+# La respuesta se genera en streaming y FastAPI no la valida: el esquema de
+# OpenAPI se declara a mano para los dos formatos y la cabecera del cursor
+@router.get(
+    "/",
+    responses={
+        200: {
+            "description": "Artículos en orden de inserción: un array JSON o, con `format=ndjson`, un artículo por línea.",
+            "model": List[ItemInDB],
+            "content": {
+                "application/x-ndjson": {"schema": {"$ref": "#/components/schemas/ItemInDB"}},
+            },
+            "headers": {
+                "X-Next-Cursor": {
+                    "description": "Con `limit`, si quedan más artículos: valor a enviar en `after` para pedir la página siguiente.",
+                    "schema": {"type": "string"},
+                },
+            },
+        },
+        400: {"description": "Cursor 'after' no válido"},
+    },
+)
+async def read_all_items(
+    after: Optional[str] = Query(None, description="Cursor: ID del último artículo recibido."),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="Número máximo de artículos a devolver."),
+    output_format: str = Query("json", alias="format", pattern="^(json|ndjson)$", description="'json' (array) o 'ndjson' (un artículo por línea)."),
+):
+    """
+    Obtiene la lista de artículos en streaming.
+
+    Los registros se serializan directamente desde el almacén, sin construir
+    un modelo Pydantic por fila, y se envían por bloques a medida que se generan.
+    Con `limit`, si quedan más artículos, la cabecera `X-Next-Cursor` contiene
+    el valor a enviar en `after` para pedir la página siguiente.
+    """
+    try:
+        records = store.iter_from(after)
+        # Valida el cursor antes de empezar a enviar la respuesta
+        first = next(records, None)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Cursor 'after' no válido")
+    records = records if first is None else chain([first], records)
+
+    headers = {}
+    if limit is not None:
+        page = list(islice(records, limit))
+        if page and next(records, None) is not None:
+            headers["X-Next-Cursor"] = page[-1]["id"]
+        records = iter(page)
+
+    ndjson = output_format == "ndjson"
+    return StreamingResponse(
+        encode_records(records, ndjson=ndjson),
+        media_type="application/x-ndjson" if ndjson else "application/json",
+        headers=headers,
+    )
 
 @router.get("/{item_id}", response_model=ItemInDB)
 async def read_item_by_id(item_id: str):
     """Obtiene un artículo por su ID."""
-    items = read_items_from_json()
-    for item in items:
-        if item.id == item_id:
-            return item
-    raise HTTPException(status_code=404, detail="Artículo no encontrado")
+    record = store.get(item_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Artículo no encontrado")
+    return ItemInDB(**record)
 
 @router.put("/{item_id}", response_model=ItemInDB)
 async def update_item(item_id: str, updated_item_data: ItemUpdate):
@@ -71,27 +116,21 @@ async def update_item(item_id: str, updated_item_data: ItemUpdate):
     Actualiza un artículo existente por su ID.
     Los campos no proporcionados en el cuerpo de la solicitud no se modificarán.
     """
-    items = read_items_from_json()
-    found = False
-    for i, item in enumerate(items):
-        if item.id == item_id:
-            # Actualiza solo los campos que se proporcionan en la solicitud
-            updated_data = updated_item_data.model_dump(exclude_unset=True)
-            for key, value in updated_data.items():
-                setattr(items[i], key, value)
-            write_items_to_json(items)
-            found = True
-            return items[i]
-    if not found:
+    # Actualiza solo los campos que se proporcionan en la solicitud.
+    # La fusión con el registro actual la hace el escritor, así dos
+    # actualizaciones concurrentes no se pisan.
+    updated_data = updated_item_data.model_dump(exclude_unset=True)
+    try:
+        record = await writer.update(item_id, updated_data)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Artículo no encontrado")
+    return ItemInDB(**record)
 
 @router.delete("/{item_id}", status_code=204)
 async def delete_item(item_id: str):
     """Elimina un artículo por su ID."""
-    items = read_items_from_json()
-    initial_len = len(items)
-    items = [item for item in items if item.id != item_id]
-    if len(items) == initial_len:
+    try:
+        await writer.delete(item_id)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Artículo no encontrado")
-    write_items_to_json(items)
     return {"message": "Artículo eliminado correctamente"}
\ No newline at end of file
@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from crud import router as crud_router # Importamos el router y le damos un alias
+from crud import store, writer
 
 app = FastAPI(
     title="API de Productos con CRUD Modular",
@@ -10,6 +11,16 @@ app = FastAPI(
 # --- Montar el router de CRUD ---
 app.include_router(crud_router)
 
+# --- Cierre ordenado del almacén ---
+@app.on_event("shutdown")
+async def close_store():
+    """
+    Confirma las escrituras pendientes y compacta el log de operaciones
+    en data.json al detener la aplicación.
+    """
+    await writer.close()
+    store.close()
+
 # Puedes añadir otros endpoints o routers aquí si tu aplicación crece
 @app.get("/")
 async def root():
@@ -0,0 +1,435 @@
+import asyncio
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# --- Motor de almacenamiento: log de operaciones + índice en memoria ---
+#
+# Cada escritura se añade como una línea JSON al final del log (`data.json.log`)
+# en lugar de reescribir todo `data.json`. El estado vivo se mantiene en un
+# diccionario id -> registro construido una sola vez al arrancar, por lo que
+# lecturas y escrituras de un único artículo son O(1).
+# Cada `compact_every` operaciones se escribe un checkpoint atómico en
+# `data.json` (mismo formato de siempre) y el log se vacía.
+#
+# Los endpoints no escriben directamente: envían sus operaciones a un
+# `GroupCommitWriter`, un único escritor que agrupa todas las mutaciones que
+# llegan dentro de una ventana corta y las lleva a disco con un solo fsync
+# (group commit), fuera del event loop.
+
+
+def _fsync_directory(path: str) -> None:
+    """
+    Sincroniza el directorio que contiene `path` para que un `os.replace`
+    sobreviva a una caída del sistema. En plataformas sin O_DIRECTORY no hace nada.
+    """
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_items_file(path: str) -> List[dict]:
+    """
+    Lee un archivo en el formato clásico de `data.json` (lista de objetos).
+    Si el archivo no existe, está vacío o corrupto, devuelve una lista vacía.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            return []
+    return data if isinstance(data, list) else []
+
+
+def write_items_file(path: str, items: List[dict]) -> None:
+    """
+    Escribe la lista de artículos en formato `data.json` de forma atómica:
+    archivo temporal + fsync + os.replace + fsync del directorio.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(items, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_directory(path)
+
+
+class ItemStore:
+    """
+    Almacén de artículos con log de solo-añadir, índice en memoria
+    y checkpoints atómicos en `data.json`.
+    """
+    def __init__(self, data_file: str, log_file: Optional[str] = None, compact_every: int = 1000):
+        self.data_file = data_file
+        self.log_file = log_file or f"{data_file}.log"
+        self.compact_every = max(1, compact_every)
+        self._index: Dict[str, dict] = {}
+        # Orden de inserción con posiciones, para poder reanudar un recorrido
+        # desde un ID (paginación por cursor) en O(1)
+        self._order: List[Optional[str]] = []
+        self._pos: Dict[str, int] = {}
+        # Lápidas de los IDs borrados: ID -> posición de `_order` desde la que
+        # seguir, para que un cursor que apunta a un artículo borrado siga
+        # siendo válido. Las del checkpoint anterior se conservan un checkpoint
+        # más y después se descartan, así que su número está acotado
+        self._tombstones: Dict[str, int] = {}
+        self._old_tombstones: Dict[str, int] = {}
+        self._log_ops = 0
+        self._lock = threading.Lock()
+        self._load()
+        self._log = open(self.log_file, "a", encoding="utf-8")
+
+    # --- Arranque ---
+
+    def _load(self) -> None:
+        """
+        Construye el índice a partir del último checkpoint y reaplica el log.
+        Una última línea incompleta (escritura interrumpida) se descarta.
+        """
+        for item in read_items_file(self.data_file):
+            self._apply({"op": "put", "item": item})
+        if not os.path.exists(self.log_file):
+            return
+        valid_bytes = 0
+        with open(self.log_file, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._apply(entry)
+                self._log_ops += 1
+                valid_bytes += len(line)
+        # Recorta la cola dañada para que las nuevas entradas no queden pegadas a ella
+        if valid_bytes < os.path.getsize(self.log_file):
+            with open(self.log_file, "r+b") as f:
+                f.truncate(valid_bytes)
+
+    def _apply(self, entry: dict) -> None:
+        """Aplica una entrada del log sobre el índice en memoria."""
+        if entry["op"] == "put":
+            item = entry["item"]
+            if item["id"] not in self._pos:
+                self._tombstones.pop(item["id"], None)
+                self._old_tombstones.pop(item["id"], None)
+                self._pos[item["id"]] = len(self._order)
+                self._order.append(item["id"])
+            self._index[item["id"]] = item
+        elif entry["op"] == "del":
+            if self._index.pop(entry["id"], None) is not None:
+                # Deja un hueco en el orden; se elimina en el siguiente checkpoint
+                position = self._pos.pop(entry["id"])
+                self._order[position] = None
+                self._tombstones[entry["id"]] = position + 1
+
+    def _rebuild_order(self) -> None:
+        """
+        Reconstruye el orden sin huecos a partir del índice. Las lápidas de los
+        borrados desde el último checkpoint pasan a la posición equivalente del
+        nuevo orden (los artículos vivos anteriores a la suya); las del
+        checkpoint anterior se descartan.
+        """
+        remapped: Dict[str, int] = {}
+        pending = sorted(self._tombstones.items(), key=lambda entry: entry[1])
+        live = 0
+        j = 0
+        for i, item_id in enumerate(self._order):
+            while j < len(pending) and pending[j][1] <= i:
+                remapped[pending[j][0]] = live
+                j += 1
+            if item_id is not None:
+                live += 1
+        for item_id, _ in pending[j:]:
+            remapped[item_id] = live
+        self._old_tombstones = remapped
+        self._tombstones = {}
+        self._order = list(self._index)
+        self._pos = {item_id: i for i, item_id in enumerate(self._order)}
+
+    # --- Lecturas ---
+
+    def get(self, item_id: str) -> Optional[dict]:
+        """Devuelve el registro con ese ID o None si no existe."""
+        return self._index.get(item_id)
+
+    def values(self) -> Iterator[dict]:
+        """Itera sobre todos los registros en orden de inserción."""
+        return self.iter_from()
+
+    def iter_from(self, after: Optional[str] = None) -> Iterator[dict]:
+        """
+        Itera perezosamente, en orden de inserción, sobre los registros
+        posteriores al ID `after` (o desde el principio si es None). `after`
+        puede ser un artículo ya borrado mientras su lápida se conserve.
+        Lanza KeyError si `after` no existe.
+        """
+        if after is None:
+            start = 0
+        elif after in self._pos:
+            start = self._pos[after] + 1
+        elif after in self._tombstones:
+            start = self._tombstones[after]
+        else:
+            start = self._old_tombstones[after]
+        order = self._order
+        index = self._index
+        for i in range(start, len(order)):
+            item_id = order[i]
+            if item_id is None:
+                continue
+            record = index.get(item_id)
+            if record is not None:
+                yield record
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    # --- Escrituras ---
+
+    def _write_entries(self, entries: List[dict]) -> None:
+        """
+        Añade varias entradas al log con un único fsync y, una vez en disco,
+        las aplica sobre el índice. Debe llamarse con el lock adquirido.
+        """
+        if not entries:
+            return
+        self._log.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        for entry in entries:
+            self._apply(entry)
+        self._log_ops += len(entries)
+        if self._log_ops >= self.compact_every:
+            self._checkpoint()
+
+    def put(self, item: dict) -> dict:
+        """Crea o reemplaza un registro completo."""
+        with self._lock:
+            self._write_entries([{"op": "put", "item": item}])
+        return item
+
+    def delete(self, item_id: str) -> bool:
+        """Elimina un registro. Devuelve False si no existía."""
+        with self._lock:
+            if item_id not in self._index:
+                return False
+            self._write_entries([{"op": "del", "id": item_id}])
+        return True
+
+    def commit_batch(self, operations: List[dict]) -> List[Any]:
+        """
+        Ejecuta un lote de operaciones (`create`, `update`, `delete`) como un único
+        commit. Devuelve, para cada operación y en el mismo orden, el registro
+        resultante o la excepción que debe recibir quien la envió.
+        Las operaciones del lote ven los efectos de las anteriores del mismo lote.
+        """
+        results: List[Any] = []
+        entries: List[dict] = []
+        with self._lock:
+            pending: Dict[str, Optional[dict]] = {}
+
+            def current(item_id: str) -> Optional[dict]:
+                return pending[item_id] if item_id in pending else self._index.get(item_id)
+
+            for op in operations:
+                kind = op["op"]
+                if kind == "create":
+                    item = op["item"]
+                    pending[item["id"]] = item
+                    entries.append({"op": "put", "item": item})
+                    results.append(item)
+                elif kind == "update":
+                    record = current(op["id"])
+                    if record is None:
+                        results.append(KeyError(op["id"]))
+                        continue
+                    item = {**record, **op["fields"]}
+                    pending[op["id"]] = item
+                    entries.append({"op": "put", "item": item})
+                    results.append(item)
+                elif kind == "delete":
+                    if current(op["id"]) is None:
+                        results.append(KeyError(op["id"]))
+                        continue
+                    pending[op["id"]] = None
+                    entries.append({"op": "del", "id": op["id"]})
+                    results.append(None)
+                else:
+                    results.append(ValueError(f"Operación desconocida: {kind}"))
+            try:
+                self._write_entries(entries)
+            except OSError as e:
+                # Si el lote no llega a disco, ninguna operación se confirma
+                return [e] * len(operations)
+        return results
+
+    # --- Checkpoints, importación y exportación ---
+
+    def _checkpoint(self) -> None:
+        """
+        Vuelca el índice a `data.json` de forma atómica y vacía el log.
+        Si el proceso cae entre ambos pasos, reaplicar el log es idempotente.
+        """
+        write_items_file(self.data_file, list(self._index.values()))
+        self._rebuild_order()
+        self._log.close()
+        self._log = open(self.log_file, "w", encoding="utf-8")
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._log_ops = 0
+
+    def checkpoint(self) -> None:
+        """Fuerza un checkpoint (compactación) inmediato."""
+        with self._lock:
+            self._checkpoint()
+
+    def export_json(self, path: str) -> None:
+        """Exporta el estado actual a un archivo en formato `data.json`."""
+        with self._lock:
+            write_items_file(path, list(self._index.values()))
+
+    def import_json(self, path: str) -> int:
+        """
+        Importa artículos desde un archivo en formato `data.json`.
+        Los IDs existentes se sobrescriben. Devuelve el número de artículos importados.
+        """
+        items = read_items_file(path)
+        with self._lock:
+            for item in items:
+                self._apply({"op": "put", "item": item})
+            self._checkpoint()
+        return len(items)
+
+    def close(self) -> None:
+        """Compacta el log en `data.json` y cierra el archivo de log."""
+        with self._lock:
+            self._checkpoint()
+            self._log.close()
+
+
+def encode_records(records: Iterable[dict], ndjson: bool = False, chunk_size: int = 256) -> Iterator[bytes]:
+    """
+    Serializa registros del almacén directamente a bytes, por bloques de
+    `chunk_size` filas, sin construir modelos Pydantic.
+    Con `ndjson=True` produce una línea JSON por registro; si no, un array JSON.
+    """
+    separator = "\n" if ndjson else ","
+    chunk: List[str] = []
+    first = True
+    if not ndjson:
+        yield b"["
+    for record in records:
+        chunk.append(json.dumps(record, ensure_ascii=False))
+        if len(chunk) >= chunk_size:
+            prefix = "" if ndjson or first else ","
+            yield (prefix + separator.join(chunk) + ("\n" if ndjson else "")).encode("utf-8")
+            chunk = []
+            first = False
+    if chunk:
+        prefix = "" if ndjson or first else ","
+        yield (prefix + separator.join(chunk) + ("\n" if ndjson else "")).encode("utf-8")
+    if not ndjson:
+        yield b"]"
+
+
+class GroupCommitWriter:
+    """
+    Escritor único para un ItemStore con group commit.
+
+    Las corrutinas envían operaciones con `submit` y esperan a que estén en disco.
+    El escritor recoge todo lo que llega durante `window` segundos (hasta
+    `max_batch` operaciones), lo ejecuta en un hilo con `ItemStore.commit_batch`
+    y resuelve el futuro de cada llamante con su resultado.
+    """
+    def __init__(self, store: ItemStore, window: float = 0.002, max_batch: int = 1000):
+        self.store = store
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self) -> None:
+        """Arranca la tarea del escritor en el event loop actual si no existe."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, operation: dict) -> Any:
+        """
+        Encola una operación y espera a que su lote se haya sincronizado en disco.
+        Lanza KeyError si la operación se refiere a un ID inexistente.
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, future))
+        return await future
+
+    async def create(self, item: dict) -> dict:
+        return await self.submit({"op": "create", "item": item})
+
+    async def update(self, item_id: str, fields: dict) -> dict:
+        return await self.submit({"op": "update", "id": item_id, "fields": fields})
+
+    async def delete(self, item_id: str) -> None:
+        await self.submit({"op": "delete", "id": item_id})
+
+    def _drain(self, batch: List[Tuple[dict, asyncio.Future]]) -> bool:
+        """
+        Mueve a `batch` lo que ya esté en la cola, sin esperar.
+        Devuelve True si encuentra la marca de cierre.
+        """
+        while len(batch) < self.max_batch:
+            try:
+                entry = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if entry is None:
+                return True
+            batch.append(entry)
+        return False
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            if self.window > 0:
+                # Ventana de agrupación: deja que lleguen más mutaciones
+                await asyncio.sleep(self.window)
+            stopping = self._drain(batch)
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        operations = [operation for operation, _ in batch]
+        try:
+            results = await asyncio.to_thread(self.store.commit_batch, operations)
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self) -> None:
+        """Confirma las operaciones pendientes y detiene el escritor."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
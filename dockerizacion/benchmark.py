@@ -0,0 +1,546 @@
+"""
+Benchmarks de la API dockerizada sobre una base de datos SQLite temporal.
+
+Uso:
+    python benchmark.py pagination [--items 200000] [--pages 50]
+    python benchmark.py load [--items 10000] [--concurrency 100] [--duration 10]
+    python benchmark.py profiles [--items 10000] [--writers 4] [--readers 16] [--duration 5] [--dir .]
+    python benchmark.py bulk [--items 100000] [--single 2000]
+    python benchmark.py queries [--repeat 500]
+    python benchmark.py cache [--items 10000] [--requests 20000] [--concurrency 50]
+    python benchmark.py metrics [--items 10000] [--repeat 5000]
+    python benchmark.py explain [--items 10000]
+
+`pagination` compara la latencia de páginas profundas con OFFSET
+(`crud.get_items`) frente a la paginación por cursor (`crud.get_items_after_cursor`).
+
+`load` levanta con uvicorn dos versiones de la API y mide peticiones/segundo y
+latencia p50/p99 con `--concurrency` clientes simultáneos: la ruta síncrona
+(rutas `def` y una `Session` por petición en el threadpool, como era antes)
+frente a la ruta asíncrona de `main.py` (aiosqlite y pool de conexiones).
+
+`profiles` ejecuta, con cada perfil de SQLite (`SQLITE_PROFILES`), escritores
+que crean ítems (un commit cada uno) en paralelo con lectores que usan el pool
+de solo lectura, y mide operaciones/segundo, p99 y errores de bloqueo.
+
+`bulk` compara el ritmo de importación con un `POST /items/` por ítem frente a
+`POST /items/bulk` con un flujo NDJSON, ambos a través de la aplicación ASGI.
+
+`queries` ejecuta cada ruta de mutación y de lectura y muestra las sentencias
+SQL por petición (cabecera `X-Query-Count`) y la latencia media.
+
+`cache` reproduce un tráfico de 95% `GET /items/{id}` (con ids repartidos según
+una ley de Zipf) y 5% `PUT /items/{id}`, sin caché y con cada backend de caché.
+
+`metrics` mide el coste de los listeners de `instrumentation.install_sql_metrics`:
+las mismas lecturas con un motor sin instrumentar y con otro instrumentado.
+
+`explain` muestra el EXPLAIN QUERY PLAN de `crud.items_query` con las
+combinaciones habituales de filtros y ordenación y termina con error si alguna
+recorre la tabla o un índice entero (SCAN) en lugar de buscar en un índice.
+
+DATABASE_URL se apunta a un archivo temporal antes de importar los módulos
+de la aplicación, así que la base de datos real no se modifica.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Los servidores lanzados por `load` heredan BENCHMARK_DB_PATH y usan la misma base de datos
+if "BENCHMARK_DB_PATH" not in os.environ:
+    _tmpdir = tempfile.TemporaryDirectory()
+    os.environ["BENCHMARK_DB_PATH"] = os.path.join(_tmpdir.name, "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.environ['BENCHMARK_DB_PATH']}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from typing import List
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import create_engine, insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+import crud
+import schemas
+from database import (
+    DATABASE_URL, SQLITE_PROFILE, SQLITE_PROFILES, AsyncSessionLocal, Base, SessionLocal,
+    apply_sqlite_pragmas, create_async_db_engine, engine, sqlite_pragmas, to_async_url,
+)
+from migrations import run_migrations
+from models import Item
+
+
+def seed_items(count: int, chunk_size: int = 10_000) -> None:
+    """Inserta `count` ítems sintéticos."""
+    run_migrations()
+    with SessionLocal() as db:
+        for start in range(0, count, chunk_size):
+            rows = [
+                {"name": f"item-{i:08d}", "description": None, "price": i % 1000, "is_active": i % 7 != 0}
+                for i in range(start, min(start + chunk_size, count))
+            ]
+            db.execute(insert(Item), rows)
+            db.commit()
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.99) - 1)]
+
+
+# --- OFFSET frente a keyset ---
+
+async def _bench_pagination(args) -> None:
+    seed_items(args.items)
+    limit = 100
+    print(f"Ítems: {args.items}, páginas de {limit}, ordenación por id")
+    async with AsyncSessionLocal() as db:
+        for depth in (0.0, 0.5, 0.99):
+            skip = int(args.items * depth)
+            cursor = crud.encode_cursor("id", skip, skip) if skip else None
+            offset_times, seek_times = [], []
+            for _ in range(args.pages):
+                start = time.perf_counter()
+                await crud.get_items(db, skip=skip, limit=limit)
+                offset_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                await crud.get_items_after_cursor(db, limit=limit, cursor=cursor, sort_by="id")
+                seek_times.append(time.perf_counter() - start)
+                db.expunge_all()
+            offset_p50, offset_p99 = _percentiles(offset_times)
+            seek_p50, seek_p99 = _percentiles(seek_times)
+            print(f"  profundidad {depth:4.0%} (skip={skip}):")
+            print(f"    OFFSET : p50 {offset_p50 * 1e3:8.3f} ms  p99 {offset_p99 * 1e3:8.3f} ms")
+            print(f"    keyset : p50 {seek_p50 * 1e3:8.3f} ms  p99 {seek_p99 * 1e3:8.3f} ms")
+
+
+def bench_pagination(args) -> None:
+    asyncio.run(_bench_pagination(args))
+
+
+# --- Síncrono frente a asíncrono bajo carga ---
+
+# Hilos del threadpool de Starlette (límite por defecto de anyio)
+THREADPOOL_SIZE = 40
+
+
+def build_sync_app() -> FastAPI:
+    """Las rutas de lectura como eran antes: `def` con una Session síncrona por petición."""
+    app = FastAPI()
+    # Con el pool por defecto (5 + 10 conexiones) y más de 15 peticiones simultáneas,
+    # los 40 hilos se quedan esperando una conexión mientras el cierre de las
+    # sesiones, que también necesita un hilo, no puede ejecutarse: la API se bloquea.
+    # Para poder medirla, la ruta síncrona tiene una conexión por hilo.
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        pool_size=THREADPOOL_SIZE,
+        max_overflow=0,
+    )
+    SyncSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_sync_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.get("/items/", response_model=List[schemas.Item])
+    def read_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_sync_db)):
+        return db.query(Item).offset(skip).limit(limit).all()
+
+    @app.get("/items/{item_id}", response_model=schemas.Item)
+    def read_item(item_id: int, db: Session = Depends(get_sync_db)):
+        db_item = db.query(Item).filter(Item.id == item_id).first()
+        if db_item is None:
+            raise HTTPException(status_code=404, detail="Ítem no encontrado.")
+        return db_item
+
+    return app
+
+
+sync_app = build_sync_app()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(target: str, port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/items/1", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"El servidor {target} no ha arrancado.")
+
+
+async def _run_load(base_url: str, items: int, concurrency: int, duration: float):
+    """Lanza `concurrency` clientes que piden un ítem o una página al azar hasta agotar `duration`."""
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker(seed: int) -> None:
+            nonlocal errors
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                if rng.random() < 0.8:
+                    url = f"/items/{rng.randint(1, items)}"
+                else:
+                    url = f"/items/?skip={rng.randint(0, max(0, items - 20))}&limit=20"
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def bench_load(args) -> None:
+    seed_items(args.items)
+    print(f"Ítems: {args.items}, {args.concurrency} clientes, {args.duration:.0f} s por ruta (80% GET /items/{{id}}, 20% GET /items/)")
+    for label, target in (("síncrona", "benchmark:sync_app"), ("asíncrona", "main:app")):
+        port = _free_port()
+        server = _start_server(target, port)
+        try:
+            latencies, errors, elapsed = asyncio.run(
+                _run_load(f"http://127.0.0.1:{port}", args.items, args.concurrency, args.duration)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+        p50, p99 = _percentiles(latencies)
+        print(
+            f"  {label:9}: {len(latencies) / elapsed:8.1f} req/s  "
+            f"p50 {p50 * 1e3:7.2f} ms  p99 {p99 * 1e3:7.2f} ms  errores {errors}"
+        )
+
+
+# --- Perfiles de SQLite: lecturas y escrituras concurrentes ---
+
+async def _run_profile(path: str, pragmas: dict, items: int, writers: int, readers: int, duration: float) -> dict:
+    url = f"sqlite+aiosqlite:///{path}"
+    setup_engine = create_engine(f"sqlite:///{path}")
+    apply_sqlite_pragmas(setup_engine, pragmas)
+    Base.metadata.create_all(bind=setup_engine)
+    with setup_engine.begin() as conn:
+        conn.execute(insert(Item), [{"name": f"item-{i:08d}", "price": i % 1000} for i in range(items)])
+    setup_engine.dispose()
+
+    write_engine = create_async_db_engine(url, pool_size=writers, pragmas=pragmas)
+    read_engine = create_async_db_engine(url, pool_size=readers, pragmas=pragmas, read_only=True)
+    WriteSession = async_sessionmaker(write_engine, expire_on_commit=False)
+    ReadSession = async_sessionmaker(read_engine, expire_on_commit=False)
+    stats = {"write": [], "read": [], "errors": 0}
+    deadline = time.perf_counter() + duration
+
+    async def writer(n: int) -> None:
+        sequence = 0
+        while time.perf_counter() < deadline:
+            sequence += 1
+            item = schemas.ItemCreate(name=f"w{n}-{sequence}", price=sequence % 1000)
+            start = time.perf_counter()
+            try:
+                async with WriteSession() as db:
+                    await crud.create_item(db, item)
+                stats["write"].append(time.perf_counter() - start)
+            except OperationalError: # database is locked
+                stats["errors"] += 1
+
+    async def reader(n: int) -> None:
+        rng = random.Random(n)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with ReadSession() as db:
+                    await crud.get_item(db, rng.randint(1, items))
+                stats["read"].append(time.perf_counter() - start)
+            except OperationalError:
+                stats["errors"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(i) for i in range(writers)), *(reader(i) for i in range(readers)))
+    stats["elapsed"] = time.perf_counter() - started
+    await write_engine.dispose()
+    await read_engine.dispose()
+    return stats
+
+
+def bench_profiles(args) -> None:
+    print(f"Ítems: {args.items}, {args.writers} escritores y {args.readers} lectores, {args.duration:.0f} s por perfil")
+    for profile in SQLITE_PROFILES:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            stats = asyncio.run(_run_profile(
+                os.path.join(tmp, "profile.db"), sqlite_pragmas(profile),
+                args.items, args.writers, args.readers, args.duration,
+            ))
+        line = f"  {profile:11}:"
+        for kind, label in (("write", "escrituras"), ("read", "lecturas")):
+            samples = stats[kind]
+            p99 = _percentiles(samples)[1] * 1e3 if samples else float("nan")
+            line += f"  {label} {len(samples) / stats['elapsed']:8.1f}/s (p99 {p99:7.2f} ms)"
+        print(f"{line}  errores {stats['errors']}")
+
+
+# --- Importación: un POST por ítem frente a /items/bulk ---
+
+async def _bench_bulk(args) -> None:
+    import main
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        for i in range(args.single):
+            response = await client.post("/items/", json={"name": f"single-{i:08d}", "price": i % 1000})
+            response.raise_for_status()
+        single_rate = args.single / (time.perf_counter() - start)
+        print(f"  un POST por ítem : {single_rate:10.1f} ítems/s ({args.single} ítems)")
+
+        body = "".join(json.dumps({"name": f"bulk-{i:08d}", "price": i % 1000}) + "\n" for i in range(args.items))
+        start = time.perf_counter()
+        response = await client.post("/items/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+        elapsed = time.perf_counter() - start
+        summary = response.json()
+        bulk_rate = summary["succeeded"] / elapsed
+        print(f"  /items/bulk      : {bulk_rate:10.1f} ítems/s ({summary['succeeded']} ítems, {summary['failed']} errores)")
+        print(f"  aceleración      : {bulk_rate / single_rate:10.1f}x")
+    await main.dispose_engines()
+
+
+def bench_bulk(args) -> None:
+    run_migrations()
+    print(f"Importación de ítems (BULK_CHUNK_SIZE={os.getenv('BULK_CHUNK_SIZE', '1000')})")
+    asyncio.run(_bench_bulk(args))
+
+
+# --- Sentencias SQL y latencia por ruta ---
+
+async def _bench_queries(args) -> None:
+    import main
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def create(i: int):
+            return await client.post("/items/", json={"name": f"query-{i:08d}", "price": i % 1000})
+
+        ids = [(await create(i)).json()["id"] for i in range(args.repeat)]
+        routes = [
+            ("POST /items/", lambda i: create(args.repeat + i)),
+            ("POST /items/ (duplicado)", lambda i: create(i)),
+            ("GET /items/{id}", lambda i: client.get(f"/items/{ids[i]}")),
+            ("PUT /items/{id}", lambda i: client.put(f"/items/{ids[i]}", json={"price": i})),
+            ("DELETE /items/{id}", lambda i: client.delete(f"/items/{ids[i]}")),
+        ]
+        for label, request in routes:
+            counts, times = set(), []
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                response = await request(i)
+                times.append(time.perf_counter() - start)
+                counts.add(response.headers["x-query-count"])
+            print(f"  {label:26}: sentencias {'/'.join(sorted(counts)):3}  media {statistics.mean(times) * 1e3:6.2f} ms")
+    await main.dispose_engines()
+
+
+def bench_queries(args) -> None:
+    run_migrations()
+    print(f"Sentencias SQL por petición ({args.repeat} peticiones por ruta)")
+    asyncio.run(_bench_queries(args))
+
+
+# --- Caché de lectura de GET /items/{id} ---
+
+async def _run_cache_mix(client, items: int, requests: int, concurrency: int, seed: int = 7):
+    latencies: List[float] = []
+    pending = iter(range(requests))
+
+    async def worker(n: int) -> None:
+        rng = random.Random(seed + n)
+        for _ in pending:
+            # Pocos ítems muy consultados y una cola larga (Zipf)
+            item_id = min(items, int(rng.paretovariate(1.2)))
+            start = time.perf_counter()
+            if rng.random() < 0.95:
+                response = await client.get(f"/items/{item_id}")
+            else:
+                response = await client.put(f"/items/{item_id}", json={"price": rng.randint(0, 999)})
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+async def _bench_cache(args) -> None:
+    import main
+    from cache import ItemCache, create_backend
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for backend in ("none", "local", "redis"):
+            crud.item_cache.__dict__.update(ItemCache(create_backend(backend, url="memory://")).__dict__)
+            latencies, elapsed = await _run_cache_mix(client, args.items, args.requests, args.concurrency)
+            p50, p99 = _percentiles(latencies)
+            stats = crud.item_cache.stats()
+            print(
+                f"  {backend:5}: {len(latencies) / elapsed:8.1f} req/s  p50 {p50 * 1e3:6.2f} ms  "
+                f"p99 {p99 * 1e3:6.2f} ms  aciertos {stats['hit_ratio']:6.1%}"
+            )
+    await main.dispose_engines()
+
+
+def bench_cache(args) -> None:
+    seed_items(args.items)
+    print(f"Ítems: {args.items}, {args.requests} peticiones (95% GET, 5% PUT), {args.concurrency} clientes")
+    asyncio.run(_bench_cache(args))
+
+
+
+# --- Coste de las métricas de SQL ---
+
+async def _bench_metrics(args) -> None:
+    from instrumentation import SQL_METRICS_ENABLED, install_sql_metrics
+    if not SQL_METRICS_ENABLED:
+        print("SQL_METRICS_ENABLED=false: no hay nada que medir.")
+        return
+    url = to_async_url(DATABASE_URL)
+    engines = {
+        "sin métricas": create_async_db_engine(url, pragmas=sqlite_pragmas(SQLITE_PROFILE), read_only=True),
+        "con métricas": create_async_db_engine(url, pragmas=sqlite_pragmas(SQLITE_PROFILE), read_only=True),
+    }
+    install_sql_metrics(engines["con métricas"], "benchmark")
+    times = {label: [] for label in engines}
+    rng = random.Random(7)
+    # Rondas alternas para repartir por igual el ruido de la máquina
+    for _ in range(10):
+        for label, engine in engines.items():
+            Session = async_sessionmaker(engine, expire_on_commit=False)
+            async with Session() as db:
+                for _ in range(args.repeat // 10):
+                    start = time.perf_counter()
+                    await crud.get_item(db, rng.randint(1, args.items))
+                    times[label].append(time.perf_counter() - start)
+    for label, samples in times.items():
+        p50, p99 = _percentiles(samples)
+        print(f"  {label}: media {statistics.mean(samples) * 1e6:7.1f} µs  p50 {p50 * 1e6:7.1f} µs  p99 {p99 * 1e6:7.1f} µs")
+    overhead = statistics.mean(times["con métricas"]) - statistics.mean(times["sin métricas"])
+    # crud.get_item ejecuta una sola sentencia
+    print(f"  coste por sentencia: {overhead * 1e6:+.1f} µs")
+    for engine in engines.values():
+        await engine.dispose()
+
+
+def bench_metrics(args) -> None:
+    seed_items(args.items)
+    print(f"Ítems: {args.items}, {args.repeat} lecturas de GET por motor")
+    asyncio.run(_bench_metrics(args))
+
+
+
+# --- Planes de consulta del listado con filtros ---
+
+EXPLAIN_CASES = [
+    ("is_active", {"is_active": True}),
+    ("is_active, orden por precio", {"is_active": True, "sort_by": "price"}),
+    ("is_active, orden por nombre desc", {"is_active": False, "sort_by": "name", "order": "desc"}),
+    ("rango de precio", {"min_price": 100, "max_price": 120}),
+    ("rango de precio, orden por precio", {"min_price": 100, "max_price": 120, "sort_by": "price"}),
+    ("is_active + rango de precio", {"is_active": True, "min_price": 100, "max_price": 120, "sort_by": "price"}),
+    ("prefijo de nombre", {"name_prefix": "item-00001"}),
+    ("prefijo de nombre, orden por nombre", {"name_prefix": "item-00001", "sort_by": "name"}),
+    ("is_active + prefijo de nombre", {"is_active": True, "name_prefix": "item-00001", "sort_by": "name"}),
+    ("prefijo + rango de precio", {"name_prefix": "item-00001", "min_price": 100, "max_price": 120}),
+]
+
+
+def bench_explain(args) -> None:
+    seed_items(args.items)
+    print(f"Ítems: {args.items}, EXPLAIN QUERY PLAN de GET /items/ con filtros")
+    failures = 0
+    with engine.connect() as conn:
+        for label, params in EXPLAIN_CASES:
+            query = crud.items_query(limit=100, **params)
+            sql = str(query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+            # SCAN recorre la tabla o un índice completo; SEARCH salta al rango por el índice
+            scans = [step for step in plan if step.startswith("SCAN")]
+            failures += bool(scans)
+            print(f"  {'SCAN' if scans else 'ok':4}  {label:36}: {'; '.join(plan)}")
+    if failures:
+        sys.exit(f"{failures} consultas recorren la tabla o un índice completo.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pagination = subparsers.add_parser("pagination", help="Páginas profundas: OFFSET frente a keyset.")
+    pagination.add_argument("--items", type=int, default=200_000)
+    pagination.add_argument("--pages", type=int, default=50, help="Repeticiones por profundidad.")
+    pagination.set_defaults(func=bench_pagination)
+
+    load = subparsers.add_parser("load", help="Peticiones/segundo y p99: ruta síncrona frente a asíncrona.")
+    load.add_argument("--items", type=int, default=10_000)
+    load.add_argument("--concurrency", type=int, default=100, help="Clientes simultáneos.")
+    load.add_argument("--duration", type=float, default=10.0, help="Segundos de carga por ruta.")
+    load.set_defaults(func=bench_load)
+
+    profiles = subparsers.add_parser("profiles", help="Lecturas y escrituras concurrentes con cada perfil de SQLite.")
+    profiles.add_argument("--items", type=int, default=10_000)
+    profiles.add_argument("--writers", type=int, default=4)
+    profiles.add_argument("--readers", type=int, default=16)
+    profiles.add_argument("--duration", type=float, default=5.0, help="Segundos por perfil.")
+    profiles.add_argument("--dir", default=None, help="Directorio de las bases de datos (en disco real si /tmp es tmpfs).")
+    profiles.set_defaults(func=bench_profiles)
+
+    bulk = subparsers.add_parser("bulk", help="Importación: un POST por ítem frente a /items/bulk.")
+    bulk.add_argument("--items", type=int, default=100_000, help="Ítems importados con /items/bulk.")
+    bulk.add_argument("--single", type=int, default=2_000, help="Ítems importados con un POST cada uno.")
+    bulk.set_defaults(func=bench_bulk)
+
+    queries = subparsers.add_parser("queries", help="Sentencias SQL y latencia media por ruta.")
+    queries.add_argument("--repeat", type=int, default=500)
+    queries.set_defaults(func=bench_queries)
+
+    cache = subparsers.add_parser("cache", help="GET /items/{id} sin caché y con cada backend.")
+    cache.add_argument("--items", type=int, default=10_000)
+    cache.add_argument("--requests", type=int, default=20_000)
+    cache.add_argument("--concurrency", type=int, default=50)
+    cache.set_defaults(func=bench_cache)
+
+    metrics = subparsers.add_parser("metrics", help="Coste de las métricas de SQL por sentencia.")
+    metrics.add_argument("--items", type=int, default=10_000)
+    metrics.add_argument("--repeat", type=int, default=5_000, help="Lecturas por motor.")
+    metrics.set_defaults(func=bench_metrics)
+
+    explain = subparsers.add_parser("explain", help="Comprueba que los filtros del listado usan índices (EXPLAIN).")
+    explain.add_argument("--items", type=int, default=10_000)
+    explain.set_defaults(func=bench_explain)
+
+    args = parser.parse_args()
+    args.func(args)
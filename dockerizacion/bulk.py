@@ -0,0 +1,90 @@
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple, Type
+from fastapi import Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from database import write_turn
+
+# Filas que se validan y se escriben juntas en una transacción
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+# Tipos de contenido que se leen como NDJSON (un objeto JSON por línea)
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+class BulkRequestError(ValueError):
+    """El cuerpo de la petición no es un array JSON ni un flujo NDJSON válido."""
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return ValueError("Línea NDJSON no válida.")
+
+async def iter_request_rows(request: Request) -> AsyncIterator[Any]:
+    """
+    Recorre las filas del cuerpo de la petición. Con NDJSON el cuerpo se
+    procesa a medida que llega, sin cargarlo entero en memoria; con un array
+    JSON se lee completo. Una línea NDJSON mal formada se devuelve como un
+    ValueError en su posición para que cuente como error de esa fila.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield _parse_line(line)
+        if pending.strip():
+            yield _parse_line(pending)
+        return
+    try:
+        rows = json.loads(await request.body())
+    except ValueError:
+        raise BulkRequestError("El cuerpo no es JSON válido.")
+    if not isinstance(rows, list):
+        raise BulkRequestError("Se esperaba un array JSON o un flujo NDJSON.")
+    for row in rows:
+        yield row
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc']) or 'fila'}: {e['msg']}" for e in error.errors())
+
+async def run_bulk(
+    db: AsyncSession,
+    rows: AsyncIterator[Any],
+    schema: Type[BaseModel],
+    operation: Callable[[AsyncSession, List[Tuple[int, Any]]], Awaitable[List[Dict[str, Any]]]],
+) -> Dict[str, Any]:
+    """
+    Valida cada fila con `schema` y aplica `operation` (una de las funciones
+    bulk_* de crud) por bloques de BULK_CHUNK_SIZE filas, cada bloque en su
+    propia transacción. El turno de escritura se toma por bloque, no mientras
+    se lee el cuerpo. Devuelve el resumen con un resultado por fila.
+    """
+    results: List[Dict[str, Any]] = []
+    batch: List[Tuple[int, Any]] = []
+    index = 0
+    async for row in rows:
+        if isinstance(row, ValueError):
+            results.append(crud.bulk_error(index, str(row)))
+        else:
+            try:
+                batch.append((index, schema.model_validate(row)))
+            except ValidationError as e:
+                results.append(crud.bulk_error(index, _validation_detail(e)))
+        index += 1
+        if len(batch) >= BULK_CHUNK_SIZE:
+            async with write_turn(db):
+                results.extend(await operation(db, batch))
+            batch = []
+    if batch:
+        async with write_turn(db):
+            results.extend(await operation(db, batch))
+    results.sort(key=lambda result: result["index"])
+    failed = sum(1 for result in results if result["status"] == "error")
+    return {"total": len(results), "succeeded": len(results) - failed, "failed": failed, "results": results}
@@ -0,0 +1,240 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+# --- Caché de lectura de ítems ---
+# GET /items/{id} consulta primero la caché; si el ítem no está, lo carga de la
+# base de datos una sola vez aunque lleguen varias peticiones a la vez
+# (singleflight) y guarda la respuesta ya serializada. crud invalida las
+# entradas al actualizar o borrar ítems.
+
+# Backend: local (LRU en el proceso), redis (compartido entre procesos) o none
+ITEM_CACHE_BACKEND = os.getenv("ITEM_CACHE_BACKEND", "local")
+# Entradas máximas del backend local
+ITEM_CACHE_SIZE = int(os.getenv("ITEM_CACHE_SIZE", "10000"))
+# Segundos que una entrada es válida
+ITEM_CACHE_TTL = float(os.getenv("ITEM_CACHE_TTL", "60"))
+# URL del backend compartido; memory:// usa el sustituto en memoria
+ITEM_CACHE_URL = os.getenv("ITEM_CACHE_URL", "redis://localhost:6379/0")
+
+
+class LocalLRUCache:
+    """Caché LRU con caducidad dentro del proceso."""
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class InMemorySharedCache:
+    """
+    Sustituto local del backend compartido, con la misma semántica que Redis
+    (valores en bytes, caducidad por clave, sin límite de entradas). Sirve para
+    desarrollo y pruebas sin un servidor Redis.
+    """
+    def __init__(self):
+        self._entries: Dict[str, tuple] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, bytes(value))
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisCache:
+    """Backend compartido entre procesos o réplicas sobre Redis (requiere el paquete `redis`)."""
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if keys:
+            await self._client.delete(*keys)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    def size(self) -> Optional[int]:
+        return None # Compartido: el número de entradas no es solo nuestro
+
+
+def create_backend(name: str, url: str = ITEM_CACHE_URL, max_entries: int = ITEM_CACHE_SIZE):
+    """Crea el backend indicado por ITEM_CACHE_BACKEND (None desactiva la caché)."""
+    if name == "none":
+        return None
+    if name == "local":
+        return LocalLRUCache(max_entries)
+    if name == "redis":
+        if url.startswith("memory://"):
+            return InMemorySharedCache()
+        try:
+            return RedisCache(url)
+        except ImportError:
+            print("El paquete 'redis' no está instalado; se usa el sustituto en memoria del backend compartido.")
+            return InMemorySharedCache()
+    raise ValueError(f"Backend de caché desconocido: {name!r} (opciones: local, redis, none)")
+
+
+class _Load:
+    """Carga en curso de una clave, compartida por las peticiones que la esperan."""
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.stale = False # Se ha invalidado la clave mientras se cargaba
+
+
+class ItemCache:
+    """Caché de lectura con protección frente a estampidas y contadores de uso."""
+    def __init__(self, backend, ttl_seconds: float = ITEM_CACHE_TTL):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._inflight: Dict[str, _Load] = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @staticmethod
+    def key(item_id: int) -> str:
+        return f"item:{item_id}"
+
+    async def get_or_load(self, item_id: int, loader: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        """
+        Devuelve el valor en caché o lo obtiene con `loader`. Si ya hay una carga
+        en curso para la misma clave, espera su resultado en lugar de repetirla.
+        Los valores None (ítem inexistente) no se guardan.
+        """
+        if self.backend is None:
+            return await loader()
+        key = self.key(item_id)
+        try:
+            cached = await self.backend.get(key)
+        except Exception:
+            # Un backend compartido caído no debe impedir servir la petición
+            self.errors += 1
+            cached = None
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending.future)
+
+        load = _Load(asyncio.get_running_loop().create_future())
+        self._inflight[key] = load
+        try:
+            self.loads += 1
+            value = await loader()
+            if value is not None and not load.stale:
+                try:
+                    await self.backend.set(key, value, self.ttl_seconds)
+                except Exception:
+                    self.errors += 1
+            load.future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            load.future.cancel()
+            raise
+        except Exception as e:
+            load.future.set_exception(e)
+            load.future.exception() # Marcada como consultada aunque nadie más la espere
+            raise
+        finally:
+            if self._inflight.get(key) is load:
+                del self._inflight[key]
+
+    async def invalidate(self, *item_ids: int) -> None:
+        """Elimina los ítems de la caché (después de confirmar su modificación)."""
+        if self.backend is None or not item_ids:
+            return
+        keys = [self.key(item_id) for item_id in item_ids]
+        for key in keys:
+            load = self._inflight.pop(key, None)
+            if load is not None:
+                # La carga en curso puede haber leído el valor anterior: no se guardará
+                load.stale = True
+        self.invalidations += len(keys)
+        try:
+            await self.backend.delete(keys)
+        except Exception:
+            self.errors += 1
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso de la caché."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "entries": self.backend.size() if self.backend is not None else 0,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+item_cache = ItemCache(create_backend(ITEM_CACHE_BACKEND), ITEM_CACHE_TTL)
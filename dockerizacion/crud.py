@@ -1,37 +1,301 @@
-from sqlalchemy.orm import Session
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import item_cache
+from database import write_turn
 from models import Item
-from schemas import ItemCreate, ItemUpdate
+from schemas import ItemBulkDelete, ItemBulkUpdate, ItemCreate, ItemUpdate
+import schemas
 
-def get_item(db: Session, item_id: int):
-    return db.query(Item).filter(Item.id == item_id).first()
+# Columnas por las que se puede ordenar el listado y la paginación por cursor
+SORT_COLUMNS = {"id": Item.id, "name": Item.name, "price": Item.price}
 
-def get_item_by_name(db: Session, name: str):
-    return db.query(Item).filter(Item.name == name).first()
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Menor cadena mayor que todas las que empiezan por `prefix` (None si no existe)."""
+    while prefix:
+        code = ord(prefix[-1]) + 1
+        if 0xD800 <= code <= 0xDFFF: # Los sustitutos UTF-16 no se pueden codificar
+            code = 0xE000
+        if code <= 0x10FFFF:
+            return prefix[:-1] + chr(code)
+        prefix = prefix[:-1]
+    return None
 
-def get_items(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(Item).offset(skip).limit(limit).all()
+def filter_items(
+    query,
+    is_active: Optional[bool] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+):
+    """
+    Añade a `query` los filtros del listado de ítems. El prefijo de nombre se
+    traduce en un rango (name >= prefijo AND name < siguiente) en lugar de
+    LIKE 'prefijo%': en SQLite LIKE no distingue mayúsculas y no usa el índice
+    de name, mientras que el rango sí (y distingue mayúsculas).
+    """
+    if is_active is not None:
+        query = query.where(Item.is_active == is_active)
+    if min_price is not None:
+        query = query.where(Item.price >= min_price)
+    if max_price is not None:
+        query = query.where(Item.price <= max_price)
+    if name_prefix:
+        query = query.where(Item.name >= name_prefix)
+        upper = _prefix_upper_bound(name_prefix)
+        if upper is not None:
+            query = query.where(Item.name < upper)
+    return query
 
-def create_item(db: Session, item: ItemCreate):
-    db_item = Item(name=item.name, description=item.description, price=item.price, is_active=item.is_active)
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+def encode_cursor(sort_by: str, key, item_id: int) -> str:
+    """Codifica la posición (sort_key, id) del último ítem como un cursor opaco."""
+    payload = json.dumps({"s": sort_by, "k": [key, item_id]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+class InvalidCursorError(ValueError):
+    """El cursor no se puede decodificar o no corresponde a la ordenación pedida."""
+
+def _int_key(key) -> int:
+    # SQLite solo admite enteros de 64 bits
+    value = int(key)
+    if not -2**63 <= value < 2**63:
+        raise OverflowError("Entero fuera de rango.")
+    return value
+
+def _name_key(key) -> str:
+    if not isinstance(key, str):
+        raise TypeError("La clave de name debe ser un texto.")
+    return key
+
+# Tipo de la clave de cada columna de ordenación: el cursor viene del cliente,
+# así que la clave se convierte antes de llegar a la consulta
+CURSOR_KEY_TYPES = {"id": _int_key, "name": _name_key, "price": _int_key}
+
+def decode_cursor(cursor: str, sort_by: str):
+    """Decodifica un cursor y devuelve (sort_key, id). Lanza InvalidCursorError si no es válido para esa ordenación."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        key, item_id = payload["k"]
+        if payload["s"] != sort_by:
+            raise InvalidCursorError("El cursor corresponde a otra ordenación.")
+        return CURSOR_KEY_TYPES[sort_by](key), _int_key(item_id)
+    except InvalidCursorError:
+        raise
+    except Exception:
+        # Incluye UnicodeDecodeError y binascii.Error: su mensaje no se devuelve al cliente
+        raise InvalidCursorError("Cursor no válido.")
+
+async def get_item(db: AsyncSession, item_id: int):
+    return await db.get(Item, item_id)
+
+async def get_item_cached(db: AsyncSession, item_id: int) -> Optional[bytes]:
+    """
+    Devuelve el ítem serializado como JSON (schemas.Item) pasando por la caché
+    de lectura, o None si no existe. Con la caché caliente no se abre conexión.
+    """
+    async def load() -> Optional[bytes]:
+        db_item = await get_item(db, item_id)
+        if db_item is None:
+            return None
+        return schemas.Item.model_validate(db_item).model_dump_json().encode("utf-8")
+    return await item_cache.get_or_load(item_id, load)
+
+async def get_item_by_name(db: AsyncSession, name: str):
+    result = await db.execute(select(Item).where(Item.name == name))
+    return result.scalars().first()
+
+def items_query(skip: int = 0, limit: int = 10, sort_by: str = "id", order: str = "asc", **filters):
+    """
+    Consulta del listado: filtros de filter_items, ordenación por (sort_by, id)
+    en el sentido `order` (asc o desc) y paginación con OFFSET.
+    """
+    column = SORT_COLUMNS[sort_by]
+    columns = (Item.id,) if sort_by == "id" else (column, Item.id)
+    ordering = [c.desc() if order == "desc" else c.asc() for c in columns]
+    return filter_items(select(Item), **filters).order_by(*ordering).offset(skip).limit(limit)
+
+async def get_items(db: AsyncSession, skip: int = 0, limit: int = 10, sort_by: str = "id", order: str = "asc", **filters):
+    result = await db.execute(items_query(skip, limit, sort_by, order, **filters))
+    return result.scalars().all()
+
+async def get_items_after_cursor(db: AsyncSession, limit: int = 10, cursor: Optional[str] = None, sort_by: str = "id", **filters):
+    """
+    Paginación por cursor (keyset) sobre (sort_by, id), con los mismos filtros
+    que get_items. En lugar de OFFSET, filtra por las filas posteriores al
+    último par (clave, id) recibido, de modo que SQLite salta directamente a
+    esa posición por el índice. Devuelve (ítems, next_cursor).
+    """
+    column = SORT_COLUMNS[sort_by]
+    query = filter_items(select(Item), **filters)
+    if cursor:
+        last_key, last_id = decode_cursor(cursor, sort_by)
+        if sort_by == "id":
+            query = query.where(Item.id > last_id)
+        else:
+            query = query.where(or_(column > last_key, and_(column == last_key, Item.id > last_id)))
+    order = (Item.id,) if sort_by == "id" else (column, Item.id)
+    # Pedimos una fila de más para saber si existe una página siguiente
+    result = await db.execute(query.order_by(*order).limit(limit + 1))
+    items = list(result.scalars().all())
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(sort_by, getattr(last, sort_by), last.id)
+    return items, next_cursor
+
+class DuplicateNameError(ValueError):
+    """Ya existe un ítem con ese nombre (restricción UNIQUE de Item.name)."""
+
+# Las mutaciones son una sola sentencia: la unicidad del nombre la garantiza la
+# restricción UNIQUE (IntegrityError) y RETURNING devuelve la fila resultante sin
+# un SELECT previo ni un refresh posterior. Cada una toma el turno de escritura
+# (database.write_turn) solo mientras dura su transacción.
+
+async def create_item(db: AsyncSession, item: ItemCreate):
+    async with write_turn(db):
+        try:
+            result = await db.execute(insert(Item).values(**item.model_dump()).returning(Item))
+            db_item = result.scalars().one()
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise DuplicateNameError("El nombre del ítem ya existe.")
     return db_item
 
-def update_item(db: Session, item_id: int, item_update: ItemUpdate):
-    db_item = db.query(Item).filter(Item.id == item_id).first()
-    if db_item:
-        update_data = item_update.model_dump(exclude_unset=True) # Solo actualiza los campos proporcionados
-        for key, value in update_data.items():
-            setattr(db_item, key, value)
-        db.add(db_item)
-        db.commit()
-        db.refresh(db_item)
+async def update_item(db: AsyncSession, item_id: int, item_update: ItemUpdate):
+    update_data = item_update.model_dump(exclude_unset=True) # Solo actualiza los campos proporcionados
+    if not update_data:
+        async with write_turn(db):
+            return await get_item(db, item_id)
+    statement = (
+        update(Item)
+        .where(Item.id == item_id)
+        .values(**update_data)
+        .returning(Item)
+        .execution_options(synchronize_session=False)
+    )
+    async with write_turn(db):
+        try:
+            result = await db.execute(statement)
+            db_item = result.scalars().first()
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise DuplicateNameError("El nombre del ítem ya existe.")
+    if db_item is not None:
+        await item_cache.invalidate(item_id)
     return db_item
 
-def delete_item(db: Session, item_id: int):
-    db_item = db.query(Item).filter(Item.id == item_id).first()
-    if db_item:
-        db.delete(db_item)
-        db.commit()
-    return db_item
\ No newline at end of file
+async def delete_item(db: AsyncSession, item_id: int):
+    """Elimina el ítem y devuelve su ID, o None si no existía."""
+    async with write_turn(db):
+        result = await db.execute(delete(Item).where(Item.id == item_id).returning(Item.id))
+        deleted_id = result.scalar_one_or_none()
+        await db.commit()
+    if deleted_id is not None:
+        await item_cache.invalidate(deleted_id)
+    return deleted_id
+
+# --- Operaciones en bloque ---
+# Cada función recibe un bloque de filas (índice en la petición, esquema validado),
+# lo resuelve con consultas por conjuntos (IN) en una sola transacción y devuelve
+# un resultado por fila. Los errores de una fila no afectan al resto del bloque.
+
+def bulk_error(index: int, detail: str, item_id: Optional[int] = None) -> Dict[str, Any]:
+    return {"index": index, "status": "error", "id": item_id, "detail": detail}
+
+async def bulk_create_items(db: AsyncSession, items: List[Tuple[int, ItemCreate]], retry: bool = True) -> List[Dict[str, Any]]:
+    """
+    Inserta un bloque de ítems con INSERT ... RETURNING en lote. Los nombres
+    se comprueban con una sola consulta; los que ya existen en la base de datos
+    o se repiten dentro del bloque se devuelven como error de esa fila.
+    """
+    names = [item.name for _, item in items]
+    result = await db.execute(select(Item.name).where(Item.name.in_(names)))
+    taken = set(result.scalars().all())
+    results, rows, row_indexes = [], [], []
+    for index, item in items:
+        if item.name in taken:
+            results.append(bulk_error(index, "El nombre del ítem ya existe."))
+            continue
+        taken.add(item.name)
+        rows.append(item.model_dump())
+        row_indexes.append(index)
+    if rows:
+        try:
+            # Los nombres son únicos, así que los IDs se asocian por nombre y
+            # SQLAlchemy puede agrupar las filas en INSERTs de muchos VALUES
+            inserted = await db.execute(insert(Item).returning(Item.id, Item.name), rows)
+            ids_by_name = {name: item_id for item_id, name in inserted.all()}
+            await db.commit()
+        except IntegrityError:
+            # Otra petición ha insertado alguno de los nombres entre la comprobación y el INSERT
+            await db.rollback()
+            if retry:
+                return await bulk_create_items(db, items, retry=False)
+            return [bulk_error(index, "Conflicto al insertar el bloque.") for index, _ in items]
+        results.extend(
+            {"index": index, "status": "created", "id": ids_by_name[row["name"]]}
+            for index, row in zip(row_indexes, rows)
+        )
+    return results
+
+async def bulk_update_items(db: AsyncSession, items: List[Tuple[int, ItemBulkUpdate]], retry: bool = True) -> List[Dict[str, Any]]:
+    """
+    Actualiza un bloque de ítems por clave primaria. Las filas que no existen o
+    cuyo nuevo nombre ya pertenece a otro ítem se devuelven como error.
+    """
+    ids = {item.id for _, item in items}
+    existing = set((await db.execute(select(Item.id).where(Item.id.in_(ids)))).scalars().all())
+    new_names = {item.name for _, item in items if item.name is not None}
+    owners = dict((await db.execute(select(Item.name, Item.id).where(Item.name.in_(new_names)))).all()) if new_names else {}
+    results, rows = [], []
+    for index, item in items:
+        if item.id not in existing:
+            results.append(bulk_error(index, "Ítem no encontrado.", item.id))
+            continue
+        values = item.model_dump(exclude_unset=True, exclude={"id"})
+        if "name" in values:
+            if owners.get(values["name"], item.id) != item.id:
+                results.append(bulk_error(index, "El nombre del ítem ya existe.", item.id))
+                continue
+            owners[values["name"]] = item.id
+        if values:
+            rows.append({"id": item.id, **values})
+        results.append({"index": index, "status": "updated", "id": item.id})
+    if rows:
+        try:
+            # UPDATE por clave primaria; SQLAlchemy agrupa las filas con las mismas columnas en un executemany
+            await db.execute(update(Item), rows)
+            await db.commit()
+        except IntegrityError:
+            # Otra petición ha tomado alguno de los nombres entre la comprobación y
+            # el UPDATE (sin el turno de escritura de SQLite, p.ej. en PostgreSQL)
+            await db.rollback()
+            if retry:
+                return await bulk_update_items(db, items, retry=False)
+            return [bulk_error(index, "Conflicto al actualizar el bloque.", item.id) for index, item in items]
+        await item_cache.invalidate(*(row["id"] for row in rows))
+    return results
+
+async def bulk_delete_items(db: AsyncSession, items: List[Tuple[int, ItemBulkDelete]]) -> List[Dict[str, Any]]:
+    """Elimina un bloque de ítems con un único DELETE ... WHERE id IN (...)."""
+    ids = {item.id for _, item in items}
+    existing = set((await db.execute(select(Item.id).where(Item.id.in_(ids)))).scalars().all())
+    results, deleted = [], set()
+    for index, item in items:
+        if item.id in existing and item.id not in deleted:
+            deleted.add(item.id)
+            results.append({"index": index, "status": "deleted", "id": item.id})
+        else:
+            results.append(bulk_error(index, "Ítem no encontrado.", item.id))
+    if deleted:
+        await db.execute(delete(Item).where(Item.id.in_(deleted)))
+        await db.commit()
+        await item_cache.invalidate(*deleted)
+    return results
\ No newline at end of file
@@ -1,6 +1,11 @@
+import asyncio
+import contextlib
 import os
-from sqlalchemy import create_engine
+from typing import Dict, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 from dotenv import load_dotenv
 
 # Carga las variables de entorno desde el archivo .env
@@ -9,33 +14,224 @@ load_dotenv()
 # Obtiene la URL de la base de datos desde las variables de entorno
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# --- Pool de conexiones (motor asíncrono) ---
+# Conexiones que se mantienen abiertas en el pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+# Conexiones adicionales permitidas por encima de DB_POOL_SIZE en picos de carga
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Segundos que una petición espera por una conexión libre antes de fallar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Comprueba cada conexión con un ping antes de entregarla (descarta las caídas)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Conexiones del pool de solo lectura que usan las rutas GET
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", str(DB_POOL_SIZE)))
+
+# --- Perfil de rendimiento de SQLite ---
+# PRAGMAs que se aplican a cada conexión nueva según el perfil elegido:
+#   default     -> valores de SQLite sin tocar (journal DELETE, synchronous FULL).
+#   performance -> WAL (los lectores no bloquean al escritor ni al revés),
+#                  synchronous=NORMAL (en WAL no hace fsync en cada commit, solo
+#                  en los checkpoints), mmap, caché de páginas de 64 MiB y espera
+#                  de 5 s ante bloqueos en lugar de fallar con "database is locked".
+#   durable     -> WAL con synchronous=FULL: cada commit sigue haciendo fsync.
+SQLITE_PROFILES: Dict[str, Dict[str, object]] = {
+    "default": {},
+    "performance": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024, # En KiB cuando es negativo
+        "temp_store": "MEMORY",
+    },
+    "durable": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+    },
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance")
+# Sentencias compiladas que el driver sqlite3 reutiliza por conexión
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+def sqlite_pragmas(profile: str) -> Dict[str, object]:
+    """
+    PRAGMAs del perfil indicado. SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE y
+    SQLITE_BUSY_TIMEOUT permiten ajustar valores concretos del perfil.
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Perfil de SQLite desconocido: {profile!r} (opciones: {', '.join(SQLITE_PROFILES)})")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for pragma, variable in (("mmap_size", "SQLITE_MMAP_SIZE"), ("cache_size", "SQLITE_CACHE_SIZE"), ("busy_timeout", "SQLITE_BUSY_TIMEOUT")):
+        if os.getenv(variable):
+            pragmas[pragma] = int(os.getenv(variable))
+    return pragmas
+
+def apply_sqlite_pragmas(engine, pragmas: Dict[str, object], read_only: bool = False) -> None:
+    """Registra un listener que aplica los PRAGMAs a cada conexión que abre el motor."""
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            # La conexión rechaza cualquier escritura
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+def use_immediate_transactions(engine) -> None:
+    """
+    Abre las transacciones con BEGIN IMMEDIATE, que toma el bloqueo de escritura
+    al empezar. Con BEGIN (diferido), una escritura que encuentra que otro
+    escritor ha confirmado desde que empezó su lectura falla al momento con
+    "database is locked" sin respetar busy_timeout; con IMMEDIATE los
+    escritores esperan su turno.
+    """
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+
+    @event.listens_for(sync_engine, "connect")
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        # El driver deja de emitir su propio BEGIN; lo hace el listener "begin"
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(sync_engine, "begin")
+    def begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+# Drivers asíncronos equivalentes a los síncronos de DATABASE_URL
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def to_async_url(url: str) -> str:
+    """Convierte una URL síncrona (p.ej. sqlite:///./sql_app.db) en su equivalente asíncrona."""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    if dialect in _ASYNC_DRIVERS and "+" not in scheme:
+        return f"{_ASYNC_DRIVERS[dialect]}{sep}{rest}"
+    return url
+
+def _is_sqlite_memory(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":"))
+
+# Se puede indicar explícitamente; por defecto se deriva de DATABASE_URL
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+def create_async_db_engine(
+    url: str,
+    pool_size: int = DB_POOL_SIZE,
+    pragmas: Optional[Dict[str, object]] = None,
+    read_only: bool = False,
+) -> AsyncEngine:
+    """Crea un motor asíncrono con el pool configurado y, para SQLite, los PRAGMAs del perfil."""
+    if _is_sqlite_memory(url):
+        # Una base de datos en memoria solo existe dentro de su conexión
+        options = {"poolclass": StaticPool}
+    else:
+        options = {
+            "pool_size": pool_size,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"cached_statements": SQLITE_STATEMENT_CACHE}
+        if "poolclass" not in options:
+            # Para SQLite el pool por defecto no reutiliza conexiones entre peticiones
+            options["poolclass"] = AsyncAdaptedQueuePool
+    async_db_engine = create_async_engine(url, **options)
+    if url.startswith("sqlite") and (pragmas or read_only):
+        apply_sqlite_pragmas(async_db_engine, pragmas or {}, read_only=read_only)
+    if url.startswith("sqlite") and not read_only and not _is_sqlite_memory(url):
+        use_immediate_transactions(async_db_engine)
+    return async_db_engine
+
+_pragmas = sqlite_pragmas(SQLITE_PROFILE) if DATABASE_URL.startswith("sqlite") else {}
+
 # Crea el motor de la base de datos
 # connect_args={"check_same_thread": False} es necesario para SQLite con FastAPI
 # porque SQLAlchemy espera que cada hilo use su propia conexión,
 # pero SQLite no permite esto por defecto. Para una DB multi-hilo real, esto no sería necesario.
+# El motor síncrono se usa en las migraciones y en scripts; la API usa el asíncrono.
 engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "cached_statements": SQLITE_STATEMENT_CACHE} if "sqlite" in DATABASE_URL else {},
 )
+if _pragmas:
+    apply_sqlite_pragmas(engine, _pragmas)
 
 # Crea una clase SessionLocal. Cada instancia de SessionLocal será una sesión de base de datos.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor asíncrono: las peticiones esperan a la base de datos sin ocupar un hilo del threadpool
+async_engine = create_async_db_engine(ASYNC_DATABASE_URL, pragmas=_pragmas)
+
+# Pool de solo lectura para las rutas GET: con WAL, sus conexiones leen en
+# paralelo con el escritor sin competir por las conexiones de escritura.
+# Con SQLite en memoria no hay un archivo que compartir y se usa el mismo motor.
+if _is_sqlite_memory(ASYNC_DATABASE_URL):
+    read_async_engine = async_engine
+else:
+    read_async_engine = create_async_db_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=DB_READ_POOL_SIZE,
+        pragmas=_pragmas,
+        read_only=ASYNC_DATABASE_URL.startswith("sqlite"),
+    )
+
+# expire_on_commit=False: los objetos siguen siendo legibles tras el commit sin otra consulta
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(read_async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Base para los modelos declarativos de SQLAlchemy
 Base = declarative_base()
 
-def get_db():
+# SQLite admite un solo escritor. Las transacciones de escritura del proceso
+# esperan su turno en este cerrojo (en orden de llegada) en lugar de competir
+# sondeando el bloqueo con busy_timeout, donde algunas podían esperar más de 5 s
+# y fallar con "database is locked". Entre procesos sigue actuando busy_timeout.
+_sqlite_write_lock = asyncio.Lock() if ASYNC_DATABASE_URL.startswith("sqlite") else None
+
+@contextlib.asynccontextmanager
+async def write_turn(db: AsyncSession):
     """
-    Dependencia para obtener una sesión de base de datos.
-    Cierra la sesión después de que la solicitud haya terminado.
+    Turno de escritura para una transacción de `db`. Solo debe envolver la
+    transacción (de la primera sentencia al commit): no la lectura del cuerpo
+    de la petición, para que un cliente lento no retrase las escrituras de los
+    demás. Si al salir la transacción sigue abierta (p.ej. solo hubo lecturas),
+    se cierra para no retener el bloqueo de SQLite fuera del turno: con commit
+    (que no expira los objetos leídos) o, si hubo un error, con rollback.
     """
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    lock = _sqlite_write_lock or contextlib.nullcontext()
+    async with lock:
+        try:
+            yield
+        except BaseException:
+            if db.in_transaction():
+                await db.rollback()
+            raise
+        if db.in_transaction():
+            await db.commit()
 
-def create_db_tables():
+async def get_db():
     """
-    Crea las tablas de la base de datos.
+    Dependencia para obtener una sesión asíncrona de base de datos.
+    Cierra la sesión (y devuelve su conexión al pool) cuando termina la solicitud.
     """
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db():
+    """Dependencia para las rutas de solo lectura: sesión del pool de lectura."""
+    async with ReadSessionLocal() as db:
+        yield db
+
+async def dispose_engines():
+    """Cierra las conexiones de los pools asíncronos."""
+    await async_engine.dispose()
+    if read_async_engine is not async_engine:
+        await read_async_engine.dispose()
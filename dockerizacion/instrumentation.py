@@ -0,0 +1,217 @@
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+
+# --- Recuento de consultas por petición ---
+# Cada petición HTTP recibe su propio contador en una ContextVar. Un listener
+# de SQLAlchemy lo incrementa en cada sentencia que llega al driver, y el
+# middleware lo devuelve en la cabecera X-Query-Count de la respuesta.
+
+QUERY_COUNT_HEADER = b"x-query-count"
+
+# Lista de un elemento: las tareas y greenlets de la petición comparten el mismo objeto
+_query_count: ContextVar[Optional[List[int]]] = ContextVar("query_count", default=None)
+
+def install_query_counter(*engines) -> None:
+    """Registra el contador en los motores indicados (síncronos o asíncronos)."""
+    for engine in engines:
+        sync_engine = getattr(engine, "sync_engine", engine)
+        if not event.contains(sync_engine, "before_cursor_execute", _count_query):
+            event.listen(sync_engine, "before_cursor_execute", _count_query)
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_count.get()
+    # BEGIN es control de transacción, no una consulta
+    if counter is not None and not statement.startswith("BEGIN"):
+        counter[0] += 1
+
+def current_query_count() -> int:
+    """Sentencias ejecutadas hasta ahora en la petición actual."""
+    counter = _query_count.get()
+    return counter[0] if counter is not None else 0
+
+class QueryCountMiddleware:
+    """Middleware ASGI que añade X-Query-Count con las sentencias SQL de cada petición."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        counter = [0]
+        token = _query_count.set(counter)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((QUERY_COUNT_HEADER, str(counter[0]).encode("ascii")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _query_count.reset(token)
+            if SQL_METRICS_ENABLED and scope["path"] != METRICS_PATH:
+                request_queries.observe(counter[0], scope["method"])
+
+
+# --- Métricas de sentencias SQL ---
+# Listeners before/after_cursor_execute que miden cada sentencia enviada al
+# driver: histogramas de latencia por motor y tipo de sentencia, sentencias por
+# petición, errores y un registro de consultas lentas con su plan opcional.
+# Se exponen en /metrics con el formato de texto de Prometheus. Con
+# SQL_METRICS_ENABLED=false no se registra ningún listener.
+
+SQL_METRICS_ENABLED = os.getenv("SQL_METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Milisegundos a partir de los que una sentencia se registra como lenta (0 desactiva)
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "100"))
+# Añade al registro de consultas lentas su EXPLAIN QUERY PLAN (solo SQLite)
+SQL_EXPLAIN_SLOW = os.getenv("SQL_EXPLAIN_SLOW", "false").lower() in ("1", "true", "yes")
+
+METRICS_PATH = "/metrics"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+slow_query_log = logging.getLogger("sql.slow")
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Contador de Prometheus con etiquetas."""
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+class Histogram:
+    """Histograma de Prometheus con etiquetas y buckets fijos."""
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = tuple(label_names)
+        # Por combinación de etiquetas: [observaciones por bucket (+Inf al final), suma]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+statement_seconds = Histogram(
+    "sql_statement_duration_seconds",
+    "Latencia de cada sentencia SQL enviada al driver.",
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    ("engine", "operation"),
+)
+statement_errors = Counter("sql_statement_errors_total", "Sentencias SQL que terminaron con error.", ("engine", "operation"))
+slow_statements = Counter("sql_slow_statements_total", "Sentencias SQL por encima de SQL_SLOW_QUERY_MS.", ("engine", "operation"))
+request_queries = Histogram(
+    "http_request_sql_statements",
+    "Sentencias SQL ejecutadas por petición HTTP.",
+    (0, 1, 2, 3, 5, 10, 25, 50, 100),
+    ("method",),
+)
+METRICS = (statement_seconds, statement_errors, slow_statements, request_queries)
+
+_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA")
+
+def _operation(statement: str) -> str:
+    keyword = statement.lstrip()[:8].split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in _OPERATIONS else "OTHER"
+
+def _explain(conn, statement: str, parameters) -> str:
+    """Plan de la sentencia con EXPLAIN QUERY PLAN, usando el cursor del driver (sin eventos)."""
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return "; ".join(str(row[-1]) for row in cursor.fetchall())
+    except Exception as e:
+        return f"(sin plan: {e})"
+    finally:
+        cursor.close()
+
+_instrumented_engines: Dict[int, str] = {}
+
+def install_sql_metrics(engine, engine_name: str) -> None:
+    """
+    Registra en el motor los listeners que miden sus sentencias, identificadas
+    en las métricas con la etiqueta engine=`engine_name`. No hace nada si
+    SQL_METRICS_ENABLED es false.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not SQL_METRICS_ENABLED or id(sync_engine) in _instrumented_engines:
+        return
+    _instrumented_engines[id(sync_engine)] = engine_name
+    explain = SQL_EXPLAIN_SLOW and sync_engine.dialect.name == "sqlite"
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        operation = _operation(statement)
+        statement_seconds.observe(elapsed, engine_name, operation)
+        if SQL_SLOW_QUERY_MS and elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+            slow_statements.inc(engine_name, operation)
+            plan = ""
+            if explain and not executemany and operation in ("SELECT", "UPDATE", "DELETE"):
+                plan = f" | plan: {_explain(conn, statement, parameters)}"
+            slow_query_log.warning(
+                "%.1f ms [%s] %s | parámetros: %.200r%s",
+                elapsed * 1000, engine_name, " ".join(statement.split()), parameters, plan,
+            )
+
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+        statement = exception_context.statement
+        statement_errors.inc(engine_name, _operation(statement) if statement else "OTHER")
+
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(sync_engine, "handle_error", handle_error)
+
+def render_metrics() -> str:
+    """Todas las métricas en el formato de texto de Prometheus."""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
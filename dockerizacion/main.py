@@ -1,13 +1,15 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 import models, schemas, crud
-from database import SessionLocal, engine, create_db_tables, get_db
-
-# Crea las tablas de la base de datos al inicio de la aplicación
-# Esto se ejecuta cuando el contenedor Docker arranca la aplicación.
-create_db_tables()
+from bulk import BulkRequestError, iter_request_rows, run_bulk
+from cache import item_cache
+from database import async_engine, dispose_engines, get_db, get_read_db, read_async_engine
+from instrumentation import (
+    METRICS_PATH, PROMETHEUS_CONTENT_TYPE, QueryCountMiddleware, install_query_counter, install_sql_metrics, render_metrics,
+)
+from migrations import run_migrations
 
 app = FastAPI(
     title="API Dockerizada de Items (SQLite)",
@@ -15,37 +17,136 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Cabecera X-Query-Count con las sentencias SQL ejecutadas en cada petición
+install_query_counter(async_engine, read_async_engine)
+app.add_middleware(QueryCountMiddleware)
+# Latencia de las sentencias y consultas lentas (SQL_METRICS_ENABLED)
+install_sql_metrics(async_engine, "write")
+if read_async_engine is not async_engine:
+    install_sql_metrics(read_async_engine, "read")
+
+@app.on_event("startup")
+def startup_event():
+    # Crea o actualiza el esquema (tablas e índices) cuando el contenedor arranca la aplicación
+    run_migrations()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Cierra las conexiones de los pools asíncronos y la caché
+    await dispose_engines()
+    await item_cache.close()
+
 # --- Endpoints CRUD ---
 
 @app.post("/items/", response_model=schemas.Item, status_code=status.HTTP_201_CREATED)
-def create_item(item: schemas.ItemCreate, db: Session = Depends(get_db)):
-    db_item = crud.get_item_by_name(db, name=item.name)
-    if db_item:
-        raise HTTPException(status_code=400, detail="El nombre del ítem ya existe.")
-    return crud.create_item(db=db, item=item)
+async def create_item(item: schemas.ItemCreate, db: AsyncSession = Depends(get_db)):
+    try:
+        return await crud.create_item(db=db, item=item)
+    except crud.DuplicateNameError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# --- Endpoints en bloque ---
+# Aceptan un array JSON o un flujo NDJSON (Content-Type: application/x-ndjson).
+# Se declaran antes de /items/{item_id} para que "bulk" no se tome como un ID.
+
+async def _bulk(request: Request, db: AsyncSession, schema, operation, rows=None):
+    try:
+        return await run_bulk(db, rows or iter_request_rows(request), schema, operation)
+    except BulkRequestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/items/bulk", response_model=schemas.BulkResult)
+async def create_items_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    """Crea varios ítems. Cada fila tiene el formato de `POST /items/`."""
+    return await _bulk(request, db, schemas.ItemCreate, crud.bulk_create_items)
+
+@app.put("/items/bulk", response_model=schemas.BulkResult)
+async def update_items_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    """Actualiza varios ítems. Cada fila lleva el `id` y los campos a modificar."""
+    return await _bulk(request, db, schemas.ItemBulkUpdate, crud.bulk_update_items)
+
+@app.delete("/items/bulk", response_model=schemas.BulkResult)
+async def delete_items_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    """Elimina varios ítems. Cada fila es un ID o un objeto `{"id": ...}`."""
+    async def rows():
+        async for row in iter_request_rows(request):
+            yield {"id": row} if isinstance(row, int) and not isinstance(row, bool) else row
+    return await _bulk(request, db, schemas.ItemBulkDelete, crud.bulk_delete_items, rows())
+
+# --- Listado con filtros ---
+# Los filtros se apoyan en los índices compuestos de models.Item
+
+def item_filters(
+    is_active: Optional[bool] = None,
+    min_price: Optional[int] = Query(None, ge=0),
+    max_price: Optional[int] = Query(None, ge=0),
+    name_prefix: Optional[str] = Query(None, min_length=1, max_length=50),
+) -> dict:
+    """Filtros comunes de GET /items/ y GET /items/seek/."""
+    return {"is_active": is_active, "min_price": min_price, "max_price": max_price, "name_prefix": name_prefix}
 
 @app.get("/items/", response_model=List[schemas.Item])
-def read_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    items = crud.get_items(db, skip=skip, limit=limit)
+async def read_items(
+    skip: int = 0,
+    limit: int = 100,
+    sort_by: str = Query("id", pattern="^(id|name|price)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    filters: dict = Depends(item_filters),
+    db: AsyncSession = Depends(get_read_db),
+):
+    items = await crud.get_items(db, skip=skip, limit=limit, sort_by=sort_by, order=order, **filters)
     return items
 
+@app.get("/items/seek/", response_model=schemas.ItemCursorPage)
+async def read_items_after_cursor(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort_by: str = Query("id", pattern="^(id|name|price)$"),
+    filters: dict = Depends(item_filters),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Paginación por cursor: devuelve los ítems siguientes a `cursor` ordenados
+    por (`sort_by`, `id`) y el `next_cursor` para pedir la página siguiente.
+    Los filtros deben ser los mismos en todas las páginas.
+    """
+    try:
+        items, next_cursor = await crud.get_items_after_cursor(db, limit=limit, cursor=cursor, sort_by=sort_by, **filters)
+    except crud.InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/items/cache/stats/")
+async def read_item_cache_stats():
+    """Contadores de la caché de GET /items/{item_id}."""
+    return item_cache.stats()
+
+@app.get(METRICS_PATH, include_in_schema=False)
+async def metrics():
+    """Métricas de SQL en el formato de texto de Prometheus."""
+    return Response(content=render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/items/{item_id}", response_model=schemas.Item)
-def read_item(item_id: int, db: Session = Depends(get_db)):
-    db_item = crud.get_item(db, item_id=item_id)
-    if db_item is None:
+async def read_item(item_id: int, db: AsyncSession = Depends(get_read_db)):
+    # La caché guarda la respuesta ya serializada: se devuelve tal cual
+    data = await crud.get_item_cached(db, item_id=item_id)
+    if data is None:
         raise HTTPException(status_code=404, detail="Ítem no encontrado.")
-    return db_item
+    return Response(content=data, media_type="application/json")
 
 @app.put("/items/{item_id}", response_model=schemas.Item)
-def update_item(item_id: int, item: schemas.ItemUpdate, db: Session = Depends(get_db)):
-    db_item = crud.update_item(db, item_id=item_id, item_update=item)
+async def update_item(item_id: int, item: schemas.ItemUpdate, db: AsyncSession = Depends(get_db)):
+    try:
+        db_item = await crud.update_item(db, item_id=item_id, item_update=item)
+    except crud.DuplicateNameError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_item is None:
         raise HTTPException(status_code=404, detail="Ítem no encontrado.")
     return db_item
 
 @app.delete("/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_item(item_id: int, db: Session = Depends(get_db)):
-    db_item = crud.delete_item(db, item_id=item_id)
-    if db_item is None:
+async def delete_item(item_id: int, db: AsyncSession = Depends(get_db)):
+    deleted_id = await crud.delete_item(db, item_id=item_id)
+    if deleted_id is None:
         raise HTTPException(status_code=404, detail="Ítem no encontrado.")
     return {"message": "Ítem eliminado correctamente."}
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+Migraciones del esquema de la base de datos.
+
+Cada migración tiene un número de versión y se aplica una sola vez. La versión
+aplicada se guarda en la propia base de datos: en SQLite en `PRAGMA
+user_version` (sin tablas extra) y en otros motores en la tabla
+`schema_version`. main.py las aplica al arrancar; también se pueden aplicar
+antes de desplegar:
+
+    python migrations.py           # aplica las migraciones pendientes
+    python migrations.py --status  # muestra la versión actual
+"""
+import argparse
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, Integer, MetaData, Table, select
+from sqlalchemy.engine import Connection, Engine
+
+from database import engine
+from models import Item
+
+_version_metadata = MetaData()
+schema_version = Table("schema_version", _version_metadata, Column("version", Integer, nullable=False))
+
+def get_schema_version(conn: Connection) -> int:
+    """Versión del esquema aplicada (0 en una base de datos nueva)."""
+    if conn.dialect.name == "sqlite":
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+    schema_version.create(conn, checkfirst=True)
+    return conn.execute(select(schema_version.c.version)).scalar() or 0
+
+def set_schema_version(conn: Connection, version: int) -> None:
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+        return
+    conn.execute(schema_version.delete())
+    conn.execute(schema_version.insert().values(version=version))
+
+# --- Migraciones ---
+# Son idempotentes (checkfirst): una base de datos creada antes de que hubiera
+# migraciones, con la tabla ya existente, se pone al día sin errores.
+
+def _create_items_table(conn: Connection) -> None:
+    Item.__table__.create(conn, checkfirst=True)
+
+def _create_listing_indexes(conn: Connection) -> None:
+    names = ("ix_items_price", "ix_items_is_active", "ix_items_active_price", "ix_items_active_name")
+    for index in Item.__table__.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Tabla items", _create_items_table),
+    (2, "Índices de filtros y ordenación de GET /items/", _create_listing_indexes),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def run_migrations(bind: Engine = engine) -> int:
+    """Aplica las migraciones pendientes, cada una en su transacción. Devuelve la versión final."""
+    with bind.connect() as conn:
+        version = get_schema_version(conn)
+    for target, description, migrate in MIGRATIONS:
+        if target <= version:
+            continue
+        with bind.begin() as conn:
+            migrate(conn)
+            set_schema_version(conn, target)
+        print(f"Migración {target} aplicada: {description}")
+        version = target
+    return version
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="Muestra la versión sin aplicar nada.")
+    args = parser.parse_args()
+    if args.status:
+        with engine.connect() as conn:
+            print(f"Versión del esquema: {get_schema_version(conn)} (última: {LATEST_VERSION})")
+    else:
+        print(f"Versión del esquema: {run_migrations()} (última: {LATEST_VERSION})")
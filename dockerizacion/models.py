@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, Index
 from database import Base
 
 class Item(Base):
@@ -8,4 +8,14 @@ class Item(Base):
     name = Column(String, unique=True, index=True)
     description = Column(String, nullable=True)
     price = Column(Integer) # Usamos Integer para simplificar, idealmente usaríamos Numeric
-    is_active = Column(Boolean, default=True)
\ No newline at end of file
+    is_active = Column(Boolean, default=True)
+
+    # Índices de los filtros y ordenaciones de GET /items/. Cada entrada de un
+    # índice de SQLite termina en el rowid (id), así que (price) sirve también
+    # para ORDER BY price, id. Se crean en una migración (migrations.py).
+    __table_args__ = (
+        Index("ix_items_price", "price"),
+        Index("ix_items_is_active", "is_active"),
+        Index("ix_items_active_price", "is_active", "price"),
+        Index("ix_items_active_name", "is_active", "name"),
+    )
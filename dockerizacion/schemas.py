@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 class ItemBase(BaseModel):
     name: str = Field(..., min_length=3, max_length=50)
@@ -20,4 +20,33 @@ class Item(ItemBase):
     id: int
 
     class Config:
-        from_attributes = True # Equivalente a orm_mode = True en Pydantic v1.x
\ No newline at end of file
+        from_attributes = True # Equivalente a orm_mode = True en Pydantic v1.x
+
+
+class ItemCursorPage(BaseModel):
+    items: List[Item]
+    next_cursor: Optional[str] = None # None cuando no quedan más páginas
+
+
+# --- Operaciones en bloque ---
+
+class ItemBulkUpdate(ItemUpdate):
+    id: int
+
+
+class ItemBulkDelete(BaseModel):
+    id: int
+
+
+class BulkItemResult(BaseModel):
+    index: int # Posición de la fila en el cuerpo de la petición
+    status: str # created | updated | deleted | error
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BulkResult(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
\ No newline at end of file
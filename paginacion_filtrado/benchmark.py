@@ -0,0 +1,213 @@
+"""
+Benchmarks de paginacion_filtrado sobre un catálogo sintético.
+
+Uso:
+    python benchmark.py pagination [--items 1000000] [--pages 200]
+    python benchmark.py startup [--items 1000000]
+    python benchmark.py memory [--items 1000000]
+
+`pagination` compara la latencia de páginas profundas con offset (`skip`/`limit`)
+frente a la paginación por cursor (keyset) de `/items/seek/`, con la caché de
+resultados vacía en cada petición (cada una filtra de nuevo, como una consulta
+que no se repite) y con la caché caliente. Como referencia, también mide el
+offset original: filtrar una `List[Item]` completa en cada petición.
+
+`startup` mide el tiempo y el pico de memoria de la carga inicial: `json.load`
+completo, parser incremental e instantánea binaria con memoria mapeada.
+
+`memory` mide los bytes por fila del catálogo en memoria: una `List[Item]` de
+modelos Pydantic frente al almacenamiento columnar (`ItemColumns`).
+
+El catálogo se genera en un archivo temporal y se carga a través de
+ITEMS_DATA_PATH, igual que en la aplicación.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+CATEGORIES = ["Electronics", "Books", "Wearables", "Home", "Garden", "Toys", "Sports", "Music"]
+STATUSES = ["available", "low_stock", "out_of_stock"]
+
+
+def generate_items_file(path: str, count: int, seed: int = 42) -> None:
+    """Escribe un items.json sintético con `count` ítems."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(count):
+            item = {
+                "id": i + 1,
+                "name": f"Item {i + 1}",
+                "category": rng.choice(CATEGORIES),
+                "status": rng.choice(STATUSES),
+                "price": round(rng.uniform(1, 2000), 2),
+            }
+            f.write(("," if i else "") + json.dumps(item))
+        f.write("]")
+
+
+def load_data_manager(path: str):
+    """Importa data_manager cargando el catálogo indicado."""
+    os.environ["ITEMS_DATA_PATH"] = path
+    import data_manager
+    data_manager.load_items_data()
+    return data_manager
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+# --- Offset frente a keyset ---
+
+def _legacy_page(items, skip: int, limit: int, category: str):
+    """Página con la lógica original de data_manager: recorre toda la lista en cada petición."""
+    filtered = [item for item in items if item.category.lower() == category.lower()]
+    return filtered[skip : skip + limit]
+
+
+def bench_pagination(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "items.json")
+        generate_items_file(path, args.items)
+        dm = load_data_manager(path)
+
+    limit = 100
+    print(f"Ítems: {args.items}, páginas de {limit}, filtro category=Books")
+    total = dm.get_total_items_count(category="Books")
+    # El catálogo completo como List[Item], igual que lo guardaba la versión original
+    legacy_items = dm.get_filtered_and_paginated_items(skip=0, limit=args.items)
+    for depth in (0.0, 0.5, 0.99):
+        skip = int(total * depth)
+        # Cursor situado en la misma profundidad que `skip`
+        page = dm.get_filtered_and_paginated_items(skip=max(0, skip - 1), limit=1, category="Books")
+        cursor = dm.encode_cursor("id", page[0].id, page[0].id) if skip and page else None
+
+        print(f"  profundidad {depth:4.0%} (skip={skip}):")
+        legacy_times = []
+        for _ in range(args.pages):
+            start = time.perf_counter()
+            _legacy_page(legacy_items, skip, limit, "Books")
+            legacy_times.append(time.perf_counter() - start)
+        legacy_p50, legacy_p99 = _percentiles(legacy_times)
+        print(f"    offset (List[Item]    ): p50 {legacy_p50 * 1e3:7.3f} ms  p99 {legacy_p99 * 1e3:7.3f} ms")
+        for cached in (False, True):
+            offset_times, seek_times = [], []
+            for _ in range(args.pages):
+                if not cached:
+                    dm.invalidate_query_cache()
+                start = time.perf_counter()
+                dm.get_filtered_and_paginated_items(skip=skip, limit=limit, category="Books")
+                offset_times.append(time.perf_counter() - start)
+                if not cached:
+                    dm.invalidate_query_cache()
+                start = time.perf_counter()
+                dm.get_items_after_cursor(limit=limit, cursor=cursor, sort_by="id", category="Books")
+                seek_times.append(time.perf_counter() - start)
+            offset_p50, offset_p99 = _percentiles(offset_times)
+            seek_p50, seek_p99 = _percentiles(seek_times)
+            label = "caché caliente" if cached else "sin caché"
+            print(f"    offset ({label:14}): p50 {offset_p50 * 1e3:7.3f} ms  p99 {offset_p99 * 1e3:7.3f} ms")
+            print(f"    keyset ({label:14}): p50 {seek_p50 * 1e3:7.3f} ms  p99 {seek_p99 * 1e3:7.3f} ms")
+
+
+# --- Arranque: JSON completo, parser incremental e instantánea ---
+
+def _peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _startup_worker(path: str, snapshot_dir: str, mode: str, queue) -> None:
+    from columns import ItemColumns
+    import loader
+    signature = (os.stat(path).st_mtime_ns, os.stat(path).st_size)
+    start = time.perf_counter()
+    if mode == "json.load":
+        with open(path, "r", encoding="utf-8") as f:
+            dataset = ItemColumns.from_records(json.load(f))
+    elif mode == "streaming":
+        dataset = loader.build_from_json(path)
+    else:
+        dataset = loader.read_snapshot(snapshot_dir, signature)
+    queue.put((time.perf_counter() - start, _peak_rss_mib(), len(dataset)))
+
+
+def bench_startup(args) -> None:
+    import loader
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "items.json")
+        snapshot_dir = os.path.join(tmp, "snapshot")
+        generate_items_file(path, args.items)
+        st = os.stat(path)
+        loader.load_dataset(path, (st.st_mtime_ns, st.st_size), snapshot_dir)
+        print(f"Ítems: {args.items}, archivo JSON de {st.st_size / 2**20:.1f} MiB")
+        for mode in ("json.load", "streaming", "snapshot"):
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_startup_worker, args=(path, snapshot_dir, mode, queue))
+            process.start()
+            process.join()
+            elapsed, peak, rows = queue.get()
+            print(f"  {mode:10}: {elapsed * 1000:9.1f} ms, pico RSS {peak:8.1f} MiB ({rows} filas)")
+
+
+# --- Memoria por fila: List[Item] frente a columnas ---
+
+def _memory_worker(path: str, mode: str, queue) -> None:
+    from columns import ItemColumns
+    from data_manager import Item
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    gc.collect()
+    tracemalloc.start()
+    if mode == "List[Item]":
+        catalog = [Item(**record) for record in records]
+    else:
+        catalog = ItemColumns.from_records(records)
+    # Solo cuenta lo que sigue vivo una vez construido el catálogo
+    del records
+    gc.collect()
+    queue.put((tracemalloc.get_traced_memory()[0], len(catalog)))
+
+
+def bench_memory(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "items.json")
+        generate_items_file(path, args.items)
+        print(f"Ítems: {args.items}")
+        for mode in ("List[Item]", "ItemColumns"):
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_memory_worker, args=(path, mode, queue))
+            process.start()
+            allocated, rows = queue.get()
+            process.join()
+            print(f"  {mode:12}: {allocated / 2**20:8.1f} MiB, {allocated / rows:7.1f} bytes/fila")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pagination = subparsers.add_parser("pagination", help="Páginas profundas: offset frente a keyset.")
+    pagination.add_argument("--items", type=int, default=1_000_000)
+    pagination.add_argument("--pages", type=int, default=200, help="Repeticiones por profundidad.")
+    pagination.set_defaults(func=bench_pagination)
+
+    startup = subparsers.add_parser("startup", help="Carga inicial: JSON completo, streaming e instantánea.")
+    startup.add_argument("--items", type=int, default=1_000_000)
+    startup.set_defaults(func=bench_startup)
+
+    memory = subparsers.add_parser("memory", help="Bytes por fila: List[Item] frente a columnas.")
+    memory.add_argument("--items", type=int, default=1_000_000)
+    memory.set_defaults(func=bench_memory)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,217 @@
+from array import array
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+
+# --- Almacenamiento columnar ---
+# En lugar de mantener una lista de objetos Item, el catálogo se guarda en
+# columnas de NumPy. Categoría y estado se codifican como diccionario: cada
+# valor distinto se guarda una sola vez y cada fila solo almacena su código.
+
+# Arrays que forman el catálogo (columnas + índices), tal como se guardan en una instantánea
+ARRAY_NAMES = (
+    "ids", "name_data", "name_offsets", "category_codes", "status_codes", "prices",
+    "category_order", "category_bounds", "status_order", "status_bounds",
+    "price_order", "sorted_prices",
+)
+
+class StringColumn:
+    """
+    Columna de textos sin un objeto `str` por fila: los valores se guardan
+    concatenados en UTF-8 en un único array de bytes, y `offsets[i]:offsets[i + 1]`
+    delimita el valor de la fila `i`. El texto solo se decodifica al leerlo.
+    """
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_buffers(cls, data: bytearray, offsets: array) -> "StringColumn":
+        """Envuelve los buffers de un ColumnBuilder sin copiarlos."""
+        return cls(np.frombuffer(data, dtype=np.uint8), np.frombuffer(offsets, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+
+class ItemColumns:
+    """
+    Catálogo de ítems en formato columnar, con sus índices secundarios.
+    Los arrays pueden estar en memoria o mapeados desde una instantánea en disco.
+    """
+    def __init__(self, arrays: Dict[str, np.ndarray], categories: List[str], statuses: List[str]):
+        self.arrays = arrays
+        self.ids = arrays["ids"]
+        self.names = StringColumn(arrays["name_data"], arrays["name_offsets"])
+        self.category_codes = arrays["category_codes"]
+        self.categories = categories
+        self.status_codes = arrays["status_codes"]
+        self.statuses = statuses
+        self.prices = arrays["prices"]
+        # Número de versión del catálogo; se incrementa en cada recarga
+        self.generation = 0
+        # Firma (mtime, tamaño, inode) del archivo del que se cargó
+        self.source_signature: Optional[tuple] = None
+        # Códigos por valor en minúsculas (varios valores pueden diferir solo en mayúsculas)
+        self._category_lookup = self._build_lookup(categories)
+        self._status_lookup = self._build_lookup(statuses)
+        # --- Índices secundarios ---
+        # Hash: valor en minúsculas -> array ordenado de filas
+        self.category_index = self._hash_index(arrays["category_order"], arrays["category_bounds"], self._category_lookup)
+        self.status_index = self._hash_index(arrays["status_order"], arrays["status_bounds"], self._status_lookup)
+        # Permutación ordenada por precio para búsquedas de rango por bisección
+        self.price_order = arrays["price_order"]
+        self.sorted_prices = arrays["sorted_prices"]
+
+    @staticmethod
+    def _build_lookup(vocabulary: List[str]) -> Dict[str, np.ndarray]:
+        lookup: Dict[str, List[int]] = {}
+        for code, value in enumerate(vocabulary):
+            lookup.setdefault(value.lower(), []).append(code)
+        return {value: np.array(codes, dtype=np.int32) for value, codes in lookup.items()}
+
+    @staticmethod
+    def _hash_index(order: np.ndarray, bounds: np.ndarray, lookup: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Construye el índice valor -> filas a partir de las filas agrupadas por código.
+        Cada entrada es una vista sobre `order`, sin copiar datos.
+        """
+        index = {}
+        for value, value_codes in lookup.items():
+            rows = [order[bounds[code]:bounds[code + 1]] for code in value_codes]
+            index[value] = rows[0] if len(rows) == 1 else np.sort(np.concatenate(rows))
+        return index
+
+    @staticmethod
+    def _group_by_code(codes: np.ndarray, vocabulary_size: int) -> tuple:
+        """Filas ordenadas por código (estable) y límites de cada grupo."""
+        order = np.argsort(codes, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=vocabulary_size)))).astype(np.int64)
+        return order, bounds
+
+    @classmethod
+    def from_columns(
+        cls,
+        ids: np.ndarray,
+        names: StringColumn,
+        category_codes: np.ndarray,
+        categories: List[str],
+        status_codes: np.ndarray,
+        statuses: List[str],
+        prices: np.ndarray,
+    ) -> "ItemColumns":
+        """Construye el catálogo calculando los índices secundarios."""
+        category_order, category_bounds = cls._group_by_code(category_codes, len(categories))
+        status_order, status_bounds = cls._group_by_code(status_codes, len(statuses))
+        price_order = np.argsort(prices, kind="stable")
+        arrays = {
+            "ids": ids,
+            "name_data": names.data,
+            "name_offsets": names.offsets,
+            "category_codes": category_codes,
+            "status_codes": status_codes,
+            "prices": prices,
+            "category_order": category_order,
+            "category_bounds": category_bounds,
+            "status_order": status_order,
+            "status_bounds": status_bounds,
+            "price_order": price_order,
+            "sorted_prices": prices[price_order],
+        }
+        return cls(arrays, categories, statuses)
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "ItemColumns":
+        """Construye las columnas a partir de una lista de diccionarios."""
+        builder = ColumnBuilder()
+        for record in records:
+            builder.add(record)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes ocupados por columnas e índices (sin contar los vocabularios)."""
+        return sum(values.nbytes for values in self.arrays.values())
+
+    def category_codes_for(self, category: str) -> np.ndarray:
+        return self._category_lookup.get(category.lower(), np.empty(0, dtype=np.int32))
+
+    def status_codes_for(self, status: str) -> np.ndarray:
+        return self._status_lookup.get(status.lower(), np.empty(0, dtype=np.int32))
+
+    def price_range(self, min_price: Optional[float], max_price: Optional[float]) -> tuple:
+        """Posiciones [inicio, fin) del rango de precios en `sorted_prices`."""
+        start = 0 if min_price is None else int(np.searchsorted(self.sorted_prices, min_price, side="left"))
+        end = len(self) if max_price is None else int(np.searchsorted(self.sorted_prices, max_price, side="right"))
+        return start, max(start, end)
+
+    def rows(self, rows: np.ndarray) -> Iterator[tuple]:
+        """Devuelve las filas indicadas como tuplas (id, name, category, status, price)."""
+        for row in rows:
+            yield (
+                int(self.ids[row]),
+                self.names[row],
+                self.categories[self.category_codes[row]],
+                self.statuses[self.status_codes[row]],
+                float(self.prices[row]),
+            )
+
+
+class ColumnBuilder:
+    """
+    Acumula registros fila a fila por columna, sin crear un objeto por ítem.
+    Nombres y códigos van directamente a buffers compactos (`bytearray` y
+    `array`); la validación de tipos de id y precio se hace en bloque en `build`.
+    """
+    def __init__(self):
+        self.ids: List[Any] = []
+        self.name_data = bytearray()
+        self.name_offsets = array("q", [0])
+        self.category_codes = array("i")
+        self.status_codes = array("i")
+        self.prices: List[Any] = []
+        self.categories: Dict[str, int] = {}
+        self.statuses: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        try:
+            item_id, name, price = record["id"], record["name"], record["price"]
+            category, status = str(record["category"]), str(record["status"])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Registro de ítem no válido (fila {len(self.ids)}): {e}")
+        self.ids.append(item_id)
+        self.name_data += str(name).encode("utf-8")
+        self.name_offsets.append(len(self.name_data))
+        self.prices.append(price)
+        self.category_codes.append(self.categories.setdefault(category, len(self.categories)))
+        self.status_codes.append(self.statuses.setdefault(status, len(self.statuses)))
+
+    def build(self) -> ItemColumns:
+        """Valida las columnas en bloque y construye el catálogo con sus índices."""
+        ids = np.array(self.ids)
+        prices = np.array(self.prices)
+        if len(ids) and (ids.dtype.kind not in "iu"):
+            raise ValueError("Registro de ítem no válido: todos los 'id' deben ser enteros.")
+        if len(prices) and (prices.dtype.kind not in "iuf"):
+            raise ValueError("Registro de ítem no válido: todos los 'price' deben ser numéricos.")
+        return ItemColumns.from_columns(
+            ids=ids.astype(np.int64),
+            names=StringColumn.from_buffers(self.name_data, self.name_offsets),
+            category_codes=np.frombuffer(self.category_codes, dtype=np.int32),
+            categories=list(self.categories),
+            status_codes=np.frombuffer(self.status_codes, dtype=np.int32),
+            statuses=list(self.statuses),
+            prices=prices.astype(np.float64),
+        )
@@ -1,9 +1,16 @@
+import asyncio
+import base64
 import json
 import os
 from typing import List, Dict, Optional, Any
+import numpy as np
 from dotenv import load_dotenv
 from pydantic import BaseModel
 
+from columns import ItemColumns
+from loader import LoadProgress, load_dataset
+from query_cache import QueryCache
+
 # Carga las variables de entorno
 load_dotenv()
 
@@ -11,6 +18,16 @@ load_dotenv()
 # Usamos un valor por defecto para que sea más robusto si la variable no existe
 ITEMS_DATA_PATH = os.getenv("ITEMS_DATA_PATH", "./data/items.json")
 
+# Tamaño máximo y caducidad (en segundos) de la caché de resultados de filtros
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))
+
+# Directorio opcional para la instantánea binaria (memoria mapeada) del catálogo
+ITEMS_SNAPSHOT_DIR = os.getenv("ITEMS_SNAPSHOT_DIR", "")
+
+# Cada cuántos segundos se comprueba si el archivo de datos ha cambiado (0 desactiva la recarga)
+RELOAD_INTERVAL = float(os.getenv("RELOAD_INTERVAL", "5"))
+
 # Definición del modelo Pydantic para un Item
 class Item(BaseModel):
     id: int
@@ -19,60 +36,304 @@ class Item(BaseModel):
     status: str
     price: float
 
-_all_items: List[Item] = [] # Almacenará los ítems cargados una vez
+# Respuesta combinada: una página y el total de ítems que cumplen los filtros
+class ItemPage(BaseModel):
+    items: List[Item]
+    total_items: int
+
+# Respuesta de la paginación por cursor (keyset)
+class ItemCursorPage(BaseModel):
+    items: List[Item]
+    next_cursor: Optional[str] = None
+
+class InvalidCursorError(ValueError):
+    """El cursor recibido no es válido o no corresponde a la ordenación pedida."""
+
+class DatasetNotReadyError(Exception):
+    """El catálogo todavía se está cargando (o su carga falló)."""
+
+def _to_items(ds: ItemColumns, rows: np.ndarray) -> List[Item]:
+    """Convierte las filas indicadas en objetos Item (solo las que se devuelven)."""
+    return [
+        Item(id=item_id, name=name, category=category, status=status, price=price)
+        for item_id, name, category, status, price in ds.rows(rows)
+    ]
+
+_dataset: Optional[ItemColumns] = None # Almacenará el catálogo cargado una vez
+
+# Caché de filas coincidentes por combinación normalizada de filtros
+_query_cache = QueryCache(max_entries=QUERY_CACHE_SIZE, ttl_seconds=QUERY_CACHE_TTL)
+
+def invalidate_query_cache() -> None:
+    """
+    Descarta los resultados cacheados. Debe llamarse cada vez que cambie el catálogo.
+    """
+    _query_cache.invalidate()
+
+def get_query_cache_stats() -> Dict[str, Any]:
+    """Contadores de aciertos, fallos y expulsiones de la caché de consultas."""
+    return _query_cache.stats()
+
+def _file_signature(path: str) -> tuple:
+    """Firma del archivo para detectar cambios sin leerlo."""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+# Progreso de la carga, consultado por /health/ready
+_load_progress = LoadProgress()
+
+def _build_dataset(path: str, progress: Optional[LoadProgress] = None) -> ItemColumns:
+    """
+    Lee el archivo de datos (o su instantánea) y construye el catálogo con sus índices.
+    No modifica el catálogo publicado, así que puede ejecutarse en otro hilo.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"El archivo de datos no se encontró en: {path}")
+    try:
+        signature = _file_signature(path)
+        dataset = load_dataset(path, signature, ITEMS_SNAPSHOT_DIR or None, progress)
+        dataset.source_signature = signature
+        return dataset
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Error al decodificar JSON en {path}: {e}")
+    except ValueError:
+        raise
+    except Exception as e:
+        raise Exception(f"Error inesperado al cargar datos: {e}")
+
+def _swap_dataset(dataset: ItemColumns) -> None:
+    """
+    Publica un catálogo nuevo con el siguiente número de generación.
+    Es una única asignación: las peticiones en curso conservan su referencia
+    al catálogo anterior y terminan sobre él.
+    """
+    global _dataset
+    dataset.generation = 0 if _dataset is None else _dataset.generation + 1
+    _dataset = dataset
+    invalidate_query_cache()
 
 def load_items_data() -> None:
     """
-    Carga los ítems desde el archivo JSON especificado.
-    Solo se carga una vez para evitar lecturas repetidas.
+    Carga los ítems desde el archivo JSON especificado (o su instantánea).
+    Solo se carga una vez para evitar lecturas repetidas. Es bloqueante:
+    la aplicación la ejecuta en un hilo al arrancar.
     """
-    global _all_items
-    if not _all_items: # Si la lista está vacía, cargar los datos
-        if not os.path.exists(ITEMS_DATA_PATH):
-            raise FileNotFoundError(f"El archivo de datos no se encontró en: {ITEMS_DATA_PATH}")
-        
+    if _dataset is None: # Si aún no hay datos, cargarlos
         try:
-            with open(ITEMS_DATA_PATH, 'r', encoding='utf-8') as f:
-                raw_data = json.load(f)
-                _all_items = [Item(**item_data) for item_data in raw_data]
-            print(f"Datos cargados desde {ITEMS_DATA_PATH}. Total de ítems: {len(_all_items)}")
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Error al decodificar JSON en {ITEMS_DATA_PATH}: {e}")
+            _swap_dataset(_build_dataset(ITEMS_DATA_PATH, _load_progress))
         except Exception as e:
-            raise Exception(f"Error inesperado al cargar datos: {e}")
+            _load_progress.state = "error"
+            _load_progress.error = str(e)
+            raise
+        _load_progress.state = "ready"
+        print(f"Datos cargados desde {ITEMS_DATA_PATH} ({_load_progress.source}). Total de ítems: {len(_dataset)}")
 
-# Aseguramos que los datos se carguen cuando el módulo se importa
-load_items_data()
+def ensure_dataset_ready() -> None:
+    """Lanza DatasetNotReadyError si el catálogo aún no está disponible."""
+    if _dataset is None:
+        raise DatasetNotReadyError("El catálogo se está cargando.")
 
-def get_filtered_and_paginated_items(
-    skip: int = 0,
-    limit: int = 10,
+def get_load_status() -> Dict[str, Any]:
+    """Estado de la carga inicial y generación del catálogo publicado."""
+    status = _load_progress.as_dict()
+    status["ready"] = _dataset is not None
+    status["generation"] = None if _dataset is None else _dataset.generation
+    status["total_items"] = None if _dataset is None else len(_dataset)
+    return status
+
+# --- Recarga en caliente ---
+# Una tarea en segundo plano vigila el mtime/tamaño del archivo de datos.
+# Cuando cambia, construye el nuevo catálogo y sus índices en un hilo (sin
+# bloquear el event loop) y lo publica de forma atómica con `_swap_dataset`.
+
+_failed_signature: Optional[tuple] = None # Última versión del archivo que no se pudo cargar
+
+async def reload_items_data_if_changed() -> bool:
+    """
+    Recarga el catálogo si el archivo ha cambiado. Devuelve True si se recargó.
+    Si la nueva versión no es válida, se mantiene el catálogo actual.
+    """
+    global _failed_signature
+    try:
+        signature = _file_signature(ITEMS_DATA_PATH)
+    except OSError:
+        return False
+    if _dataset is None or signature in (_dataset.source_signature, _failed_signature):
+        return False
+    try:
+        dataset = await asyncio.to_thread(_build_dataset, ITEMS_DATA_PATH)
+    except Exception as e:
+        _failed_signature = signature
+        print(f"No se pudo recargar {ITEMS_DATA_PATH}, se mantiene la generación {_dataset.generation}: {e}")
+        return False
+    _swap_dataset(dataset)
+    print(f"Datos recargados desde {ITEMS_DATA_PATH}. Generación {_dataset.generation}, total de ítems: {len(_dataset)}")
+    return True
+
+async def watch_items_file(interval: float = RELOAD_INTERVAL) -> None:
+    """Comprueba periódicamente el archivo de datos y lo recarga si cambia."""
+    while interval > 0:
+        await asyncio.sleep(interval)
+        await reload_items_data_if_changed()
+
+# --- Planificador de consultas ---
+# Cada filtro activo tiene un índice con el que estimar su selectividad sin
+# recorrer los datos: el tamaño de la lista del índice hash, o la anchura del
+# rango de precios obtenida por bisección. El plan parte del índice más
+# selectivo y, para el resto de filtros, intersecta con su índice si es de
+# tamaño comparable o comprueba la columna solo sobre las filas candidatas.
+
+# Si el índice de otro filtro tiene más de este múltiplo de filas que los
+# candidatos actuales, resulta más barato comprobar la columna que intersectar.
+INTERSECT_RATIO = 4
+
+def _execute_query(
+    ds: ItemColumns,
     category: Optional[str] = None,
     status: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None
-) -> List[Item]:
+) -> tuple:
     """
-    Filtra y pagina la lista de ítems.
+    Ejecuta los filtros usando los índices secundarios.
+    Devuelve (filas ordenadas o None si no hay filtros, pasos del plan).
     """
-    filtered_items = _all_items
-
-    # Aplicar filtros
+    predicates = []
     if category:
-        filtered_items = [item for item in filtered_items if item.category.lower() == category.lower()]
+        rows = ds.category_index.get(category.lower(), np.empty(0, dtype=np.int64))
+        codes = ds.category_codes_for(category)
+        predicates.append((
+            len(rows), f"category={category.lower()}",
+            lambda rows=rows: rows,
+            lambda cand, codes=codes: np.isin(ds.category_codes[cand], codes),
+        ))
     if status:
-        filtered_items = [item for item in filtered_items if item.status.lower() == status.lower()]
-    if min_price is not None:
-        filtered_items = [item for item in filtered_items if item.price >= min_price]
-    if max_price is not None:
-        filtered_items = [item for item in filtered_items if item.price <= max_price]
+        rows = ds.status_index.get(status.lower(), np.empty(0, dtype=np.int64))
+        codes = ds.status_codes_for(status)
+        predicates.append((
+            len(rows), f"status={status.lower()}",
+            lambda rows=rows: rows,
+            lambda cand, codes=codes: np.isin(ds.status_codes[cand], codes),
+        ))
+    if min_price is not None or max_price is not None:
+        start, end = ds.price_range(min_price, max_price)
+        low = -np.inf if min_price is None else min_price
+        high = np.inf if max_price is None else max_price
+        predicates.append((
+            end - start, f"price[{low}, {high}]",
+            lambda start=start, end=end: np.sort(ds.price_order[start:end]),
+            lambda cand, low=low, high=high: (ds.prices[cand] >= low) & (ds.prices[cand] <= high),
+        ))
+
+    if not predicates:
+        return None, [f"scan: {len(ds)} filas (sin filtros)"]
+
+    predicates.sort(key=lambda predicate: predicate[0])
+    estimate, label, fetch, _ = predicates[0]
+    rows = fetch()
+    plan = [f"index {label}: {estimate} filas"]
+    for estimate, label, fetch, probe in predicates[1:]:
+        if len(rows) == 0:
+            break
+        if estimate <= INTERSECT_RATIO * len(rows):
+            rows = np.intersect1d(rows, fetch(), assume_unique=True)
+            plan.append(f"intersect {label} ({estimate} filas): {len(rows)} filas")
+        else:
+            rows = rows[probe(rows)]
+            plan.append(f"probe {label}: {len(rows)} filas")
+    return rows, plan
+
+def _matching_rows(
+    ds: ItemColumns,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> tuple:
+    """
+    Devuelve (filas, plan) para los filtros dados, usando la caché de resultados.
+    La clave es la tupla normalizada de filtros, así `Books` y `books` comparten entrada.
+    """
+    key = (
+        ds.generation,
+        category.lower() if category else None,
+        status.lower() if status else None,
+        None if min_price is None else float(min_price),
+        None if max_price is None else float(max_price),
+    )
+    if key[1:] == (None, None, None, None):
+        return _execute_query(ds)
+    cached = _query_cache.get(key)
+    if cached is not None:
+        rows, plan = cached
+        return rows, [f"cache hit: {len(rows)} filas"] + plan
+    rows, plan = _execute_query(ds, category, status, min_price, max_price)
+    # Las filas cacheadas se comparten entre peticiones: que nadie las modifique
+    rows.setflags(write=False)
+    _query_cache.put(key, (rows, plan))
+    return rows, plan
 
-    # Aplicar paginación
+def _page(ds: ItemColumns, rows: Optional[np.ndarray], skip: int, limit: int) -> np.ndarray:
+    """Aplica skip/limit sobre las filas resultantes."""
     # Asegúrate de que skip y limit sean no negativos
     _skip = max(0, skip)
     _limit = max(0, limit)
+    if rows is None:
+        return np.arange(_skip, min(_skip + _limit, len(ds)))
+    return rows[_skip : _skip + _limit]
+
+def _total(ds: ItemColumns, rows: Optional[np.ndarray]) -> int:
+    return len(ds) if rows is None else len(rows)
+
+def get_filtered_and_paginated_items(
+    skip: int = 0,
+    limit: int = 10,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> List[Item]:
+    """
+    Filtra y pagina la lista de ítems.
+    """
+    ds = _dataset # Toda la petición se resuelve sobre la misma generación
+    rows, _ = _matching_rows(ds, category, status, min_price, max_price)
+    return _to_items(ds, _page(ds, rows, skip, limit))
+
+def get_items_page(
+    skip: int = 0,
+    limit: int = 10,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> ItemPage:
+    """
+    Devuelve la página solicitada y el total de ítems filtrados en una sola pasada.
+    """
+    ds = _dataset
+    rows, _ = _matching_rows(ds, category, status, min_price, max_price)
+    return ItemPage(items=_to_items(ds, _page(ds, rows, skip, limit)), total_items=_total(ds, rows))
 
-    return filtered_items[_skip : _skip + _limit]
+def explain_query(
+    skip: int = 0,
+    limit: int = 10,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Ejecuta la consulta y devuelve, junto a los ítems, el plan elegido.
+    """
+    ds = _dataset
+    rows, plan = _matching_rows(ds, category, status, min_price, max_price)
+    return {
+        "plan": plan,
+        "generation": ds.generation,
+        "total_items": _total(ds, rows),
+        "items": _to_items(ds, _page(ds, rows, skip, limit)),
+    }
 
 def get_total_items_count(
     category: Optional[str] = None,
@@ -84,15 +345,106 @@ def get_total_items_count(
     Devuelve el número total de ítems después de aplicar los filtros (sin paginación).
     Útil para calcular el número total de páginas.
     """
-    filtered_items = _all_items
+    ds = _dataset
+    rows, _ = _matching_rows(ds, category, status, min_price, max_price)
+    return _total(ds, rows)
 
-    if category:
-        filtered_items = [item for item in filtered_items if item.category.lower() == category.lower()]
-    if status:
-        filtered_items = [item for item in filtered_items if item.status.lower() == status.lower()]
-    if min_price is not None:
-        filtered_items = [item for item in filtered_items if item.price >= min_price]
-    if max_price is not None:
-        filtered_items = [item for item in filtered_items if item.price <= max_price]
-        
-    return len(filtered_items)
\ No newline at end of file
+# --- Paginación por cursor (keyset) ---
+# En lugar de saltar `skip` filas, el cliente envía un cursor opaco con la clave
+# de ordenación y el ID del último ítem recibido, y la página siguiente empieza
+# justo después de ese par (sort_key, id). Así el resultado es estable aunque
+# cambie el catálogo entre página y página, y el salto se resuelve por bisección.
+
+SORT_KEYS = ("id", "price")
+
+def encode_cursor(sort_by: str, key: Any, item_id: int) -> str:
+    """Codifica la posición (sort_key, id) como un cursor opaco."""
+    payload = json.dumps({"s": sort_by, "k": [key, item_id]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, sort_by: str) -> tuple:
+    """Decodifica un cursor y devuelve (sort_key, id)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        key, item_id = payload["k"]
+        if payload["s"] != sort_by:
+            raise InvalidCursorError("El cursor corresponde a otra ordenación.")
+        return float(key) if sort_by == "price" else int(key), int(item_id)
+    except InvalidCursorError:
+        raise
+    except Exception:
+        raise InvalidCursorError("Cursor no válido.")
+
+def _sorted_matches(
+    ds: ItemColumns,
+    sort_by: str,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> tuple:
+    """
+    Devuelve (filas, claves, ids) de los ítems filtrados ordenados por (sort_by, id).
+    El resultado se guarda en la caché de consultas para las páginas siguientes.
+    """
+    key = (
+        ds.generation,
+        "seek",
+        sort_by,
+        category.lower() if category else None,
+        status.lower() if status else None,
+        None if min_price is None else float(min_price),
+        None if max_price is None else float(max_price),
+    )
+    cached = _query_cache.get(key)
+    if cached is not None:
+        return cached
+    rows, _ = _matching_rows(ds, category, status, min_price, max_price)
+    if rows is None:
+        rows = np.arange(len(ds))
+    ids = ds.ids[rows]
+    if sort_by == "price":
+        keys = ds.prices[rows]
+        order = np.lexsort((ids, keys))
+    else:
+        keys = ids
+        order = np.argsort(ids, kind="stable")
+    result = (rows[order], keys[order], ids[order])
+    for array in result:
+        array.setflags(write=False)
+    _query_cache.put(key, result)
+    return result
+
+def get_items_after_cursor(
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    sort_by: str = "id",
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> ItemCursorPage:
+    """
+    Devuelve los `limit` ítems siguientes al cursor, ordenados por (sort_by, id),
+    y el cursor de la página siguiente (None si no hay más).
+    """
+    if sort_by not in SORT_KEYS:
+        raise InvalidCursorError(f"Ordenación no soportada: {sort_by}")
+    ds = _dataset
+    rows, keys, ids = _sorted_matches(ds, sort_by, category, status, min_price, max_price)
+    start = 0
+    if cursor:
+        last_key, last_id = decode_cursor(cursor, sort_by)
+        # Primera posición con (clave, id) > (last_key, last_id)
+        low = int(np.searchsorted(keys, last_key, side="left"))
+        high = int(np.searchsorted(keys, last_key, side="right"))
+        start = low + int(np.searchsorted(ids[low:high], last_id, side="right"))
+    end = start + max(0, limit)
+    page_rows = rows[start:end]
+    next_cursor = None
+    if end < len(rows) and len(page_rows) > 0:
+        last = end - 1
+        last_key = float(keys[last]) if sort_by == "price" else int(keys[last])
+        next_cursor = encode_cursor(sort_by, last_key, int(ids[last]))
+    return ItemCursorPage(items=_to_items(ds, page_rows), next_cursor=next_cursor)
\ No newline at end of file
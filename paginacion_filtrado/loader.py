@@ -0,0 +1,193 @@
+import codecs
+import json
+import os
+import re
+import shutil
+from typing import Any, Dict, Iterator, Optional
+import numpy as np
+
+from columns import ARRAY_NAMES, ColumnBuilder, ItemColumns
+
+# --- Carga del catálogo ---
+# Dos caminos para construir un ItemColumns:
+#   1. Parser JSON incremental: lee el archivo por bloques y va añadiendo cada
+#      objeto del array a un ColumnBuilder, sin tener el JSON completo (ni una
+#      lista de diccionarios) en memoria.
+#   2. Instantánea binaria: un directorio con un .npy por columna/índice que se
+#      abre con memoria mapeada, así que arrancar cuesta casi lo mismo sea cual
+#      sea el tamaño del catálogo. Se regenera cuando cambia el archivo JSON.
+
+SNAPSHOT_VERSION = 2
+READ_CHUNK_SIZE = 1024 * 1024
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+class LoadProgress:
+    """Estado de la carga en curso, consultable desde otro hilo."""
+    def __init__(self):
+        self.state = "pending" # pending | loading | ready | error
+        self.source: Optional[str] = None # json | snapshot
+        self.bytes_total = 0
+        self.bytes_read = 0
+        self.rows_loaded = 0
+        self.error: Optional[str] = None
+
+    def start(self, source: str, bytes_total: int) -> None:
+        self.state = "loading"
+        self.source = source
+        self.bytes_total = bytes_total
+        self.bytes_read = 0
+        self.rows_loaded = 0
+        self.error = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        if self.state == "ready":
+            fraction = 1.0
+        else:
+            fraction = self.bytes_read / self.bytes_total if self.bytes_total else 0.0
+        return {
+            "state": self.state,
+            "source": self.source,
+            "bytes_read": self.bytes_read,
+            "bytes_total": self.bytes_total,
+            "progress": round(min(1.0, fraction), 4),
+            "rows_loaded": self.rows_loaded,
+            "error": self.error,
+        }
+
+
+def iter_json_array(path: str, progress: Optional[LoadProgress] = None) -> Iterator[Any]:
+    """
+    Recorre los elementos de un array JSON de nivel superior leyendo el archivo
+    por bloques. Cada elemento se decodifica con el decodificador en C de la
+    librería estándar (`raw_decode`); solo se mantiene en memoria el bloque actual.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    started = False
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            if progress is not None:
+                progress.bytes_read += len(chunk)
+            buffer = buffer[pos:] + utf8.decode(chunk, final=eof)
+            pos = 0
+            while True:
+                pos = _SEPARATORS.match(buffer, pos).end()
+                if pos >= len(buffer):
+                    break
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError("El archivo de datos debe contener un array JSON.")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                try:
+                    value, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    break # El elemento continúa en el siguiente bloque
+                yield value
+            if eof:
+                raise ValueError("El array JSON está incompleto.")
+
+
+def build_from_json(path: str, progress: Optional[LoadProgress] = None) -> ItemColumns:
+    """Construye el catálogo con el parser incremental."""
+    builder = ColumnBuilder()
+    for record in iter_json_array(path, progress):
+        builder.add(record)
+        if progress is not None and len(builder) % 65536 == 0:
+            progress.rows_loaded = len(builder)
+    dataset = builder.build()
+    if progress is not None:
+        progress.rows_loaded = len(dataset)
+    return dataset
+
+
+# --- Instantánea binaria ---
+
+def _source_key(signature: tuple) -> list:
+    """Parte de la firma del JSON que identifica su contenido (mtime, tamaño)."""
+    return [signature[0], signature[1]]
+
+
+def write_snapshot(dataset: ItemColumns, snapshot_dir: str, signature: tuple) -> None:
+    """
+    Guarda el catálogo y sus índices en `snapshot_dir`. Se escribe en un
+    directorio temporal que después sustituye al anterior; `meta.json` se
+    escribe el último, así una instantánea a medias nunca se considera válida.
+    """
+    tmp_dir = f"{snapshot_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), dataset.arrays[name])
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "source": _source_key(signature),
+        "rows": len(dataset),
+        "categories": dataset.categories,
+        "statuses": dataset.statuses,
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.replace(tmp_dir, snapshot_dir)
+
+
+def read_snapshot(snapshot_dir: str, signature: tuple) -> Optional[ItemColumns]:
+    """
+    Abre la instantánea con memoria mapeada si existe y corresponde a la versión
+    actual del JSON. Devuelve None en caso contrario.
+    """
+    meta_path = os.path.join(snapshot_dir, "meta.json")
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if meta.get("version") != SNAPSHOT_VERSION or meta.get("source") != _source_key(signature):
+        return None
+    try:
+        arrays = {
+            name: np.load(os.path.join(snapshot_dir, f"{name}.npy"), mmap_mode="r")
+            for name in ARRAY_NAMES
+        }
+    except (OSError, ValueError):
+        return None
+    return ItemColumns(arrays, meta["categories"], meta["statuses"])
+
+
+def load_dataset(
+    path: str,
+    signature: tuple,
+    snapshot_dir: Optional[str] = None,
+    progress: Optional[LoadProgress] = None,
+) -> ItemColumns:
+    """
+    Carga el catálogo desde la instantánea si es válida; si no, con el parser
+    incremental, y en ese caso (si hay `snapshot_dir`) guarda una instantánea
+    nueva para el siguiente arranque.
+    """
+    progress = progress or LoadProgress()
+    if snapshot_dir:
+        progress.start("snapshot", 0)
+        dataset = read_snapshot(snapshot_dir, signature)
+        if dataset is not None:
+            progress.rows_loaded = len(dataset)
+            return dataset
+    progress.start("json", signature[1])
+    dataset = build_from_json(path, progress)
+    if snapshot_dir:
+        try:
+            write_snapshot(dataset, snapshot_dir, signature)
+        except OSError as e:
+            print(f"No se pudo escribir la instantánea en {snapshot_dir}: {e}")
+    return dataset
@@ -1,17 +1,64 @@
+import asyncio
 from fastapi import FastAPI, Query, HTTPException, Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from typing import List, Optional
 
 # Importamos las funciones y modelos de nuestro módulo de lógica de datos
 import data_manager
-from data_manager import Item
+from data_manager import Item, ItemPage, ItemCursorPage, InvalidCursorError, DatasetNotReadyError
 
 app = FastAPI(
     title="API de Items con Paginación y Filtrado",
     description="Ejemplo sencillo de cómo implementar paginación y filtrado en FastAPI."
 )
 
+# --- Carga del catálogo y recarga en caliente ---
+_loader_task: Optional[asyncio.Task] = None
+
+async def _load_and_watch():
+    """
+    Carga el catálogo en un hilo (la aplicación ya responde a /health/ready
+    mientras tanto) y después vigila el archivo para recargarlo si cambia.
+    """
+    try:
+        await asyncio.to_thread(data_manager.load_items_data)
+    except Exception as e:
+        print(f"Error al cargar los datos: {e}")
+        return
+    await data_manager.watch_items_file()
+
+@app.on_event("startup")
+async def start_data_loader():
+    """Arranca la carga del catálogo sin bloquear el arranque del servidor."""
+    global _loader_task
+    _loader_task = asyncio.create_task(_load_and_watch())
+
+@app.on_event("shutdown")
+async def stop_data_loader():
+    """Detiene la tarea de carga/recarga."""
+    if _loader_task is not None:
+        _loader_task.cancel()
+
+def require_dataset():
+    """Dependencia: responde 503 mientras el catálogo no esté cargado."""
+    try:
+        data_manager.ensure_dataset_ready()
+    except DatasetNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+# Endpoint de disponibilidad (readiness) con el progreso de la carga
+@app.get("/health/ready")
+async def health_ready():
+    """
+    Devuelve 200 cuando el catálogo está cargado y 503 mientras se carga,
+    con el progreso (bytes leídos, filas cargadas, origen JSON o instantánea).
+    """
+    load_status = data_manager.get_load_status()
+    return JSONResponse(status_code=200 if load_status["ready"] else 503, content=load_status)
+
 # Endpoint principal para obtener ítems con paginación y filtrado
-@app.get("/items/", response_model=List[Item])
+@app.get("/items/", response_model=List[Item], dependencies=[Depends(require_dataset)])
 async def read_items(
     # Parámetros de paginación
     skip: int = Query(0, ge=0, description="Número de ítems a omitir (offset)."),
@@ -21,7 +68,10 @@ async def read_items(
     category: Optional[str] = Query(None, description="Filtrar por categoría (ej. 'Electronics', 'Books')."),
     status: Optional[str] = Query(None, description="Filtrar por estado (ej. 'available', 'low_stock', 'out_of_stock')."),
     min_price: Optional[float] = Query(None, ge=0, description="Filtrar por precio mínimo."),
-    max_price: Optional[float] = Query(None, ge=0, description="Filtrar por precio máximo.")
+    max_price: Optional[float] = Query(None, ge=0, description="Filtrar por precio máximo."),
+
+    # Diagnóstico
+    explain: bool = Query(False, description="Incluir en la respuesta el plan de consulta elegido.")
 ):
     """
     Obtiene una lista de ítems con opciones de paginación y filtrado.
@@ -33,9 +83,20 @@ async def read_items(
     - `status`: Filtra los ítems por su estado.
     - `min_price`: Filtra los ítems con un precio igual o superior a este valor.
     - `max_price`: Filtra los ítems con un precio igual o inferior a este valor.
+    - `explain`: Si es `true`, la respuesta es un objeto con `plan`, `total_items` e `items`.
     """
     
     try:
+        if explain:
+            result = data_manager.explain_query(
+                skip=skip,
+                limit=limit,
+                category=category,
+                status=status,
+                min_price=min_price,
+                max_price=max_price
+            )
+            return JSONResponse(content=jsonable_encoder(result))
         items = data_manager.get_filtered_and_paginated_items(
             skip=skip,
             limit=limit,
@@ -53,7 +114,7 @@ async def read_items(
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {e}")  
 
 # Opcional: Endpoint para obtener el total de ítems filtrados (sin paginación)
-@app.get("/items/count/", response_model=dict[str, int])
+@app.get("/items/count/", response_model=dict[str, int], dependencies=[Depends(require_dataset)])
 async def get_items_count(
     category: Optional[str] = Query(None, description="Filtrar por categoría (ej. 'Electronics', 'Books')."),
     status: Optional[str] = Query(None, description="Filtrar por estado (ej. 'available', 'low_stock', 'out_of_stock')."),
@@ -77,4 +138,78 @@ async def get_items_count(
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {e}")
+
+# Endpoint combinado: página y total en una sola consulta
+@app.get("/items/page/", response_model=ItemPage, dependencies=[Depends(require_dataset)])
+async def read_items_page(
+    skip: int = Query(0, ge=0, description="Número de ítems a omitir (offset)."),
+    limit: int = Query(10, ge=1, le=100, description="Número máximo de ítems a devolver."),
+    category: Optional[str] = Query(None, description="Filtrar por categoría (ej. 'Electronics', 'Books')."),
+    status: Optional[str] = Query(None, description="Filtrar por estado (ej. 'available', 'low_stock', 'out_of_stock')."),
+    min_price: Optional[float] = Query(None, ge=0, description="Filtrar por precio mínimo."),
+    max_price: Optional[float] = Query(None, ge=0, description="Filtrar por precio máximo.")
+):
+    """
+    Devuelve la página de ítems y el total filtrado en una única pasada,
+    evitando la pareja de llamadas a `/items/` y `/items/count/`.
+    """
+    try:
+        return data_manager.get_items_page(
+            skip=skip,
+            limit=limit,
+            category=category,
+            status=status,
+            min_price=min_price,
+            max_price=max_price
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {e}")
+
+# Paginación por cursor (keyset)
+@app.get("/items/seek/", response_model=ItemCursorPage, dependencies=[Depends(require_dataset)])
+async def read_items_after_cursor(
+    limit: int = Query(10, ge=1, le=100, description="Número máximo de ítems a devolver."),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devuelto en `next_cursor` por la página anterior."),
+    sort_by: str = Query("id", pattern="^(id|price)$", description="Clave de ordenación: 'id' o 'price' (desempate por id)."),
+    category: Optional[str] = Query(None, description="Filtrar por categoría (ej. 'Electronics', 'Books')."),
+    status: Optional[str] = Query(None, description="Filtrar por estado (ej. 'available', 'low_stock', 'out_of_stock')."),
+    min_price: Optional[float] = Query(None, ge=0, description="Filtrar por precio mínimo."),
+    max_price: Optional[float] = Query(None, ge=0, description="Filtrar por precio máximo.")
+):
+    """
+    Obtiene ítems paginados por cursor, ordenados por (`sort_by`, `id`).
+    El coste de cada página no depende de su profundidad y los resultados
+    siguen siendo coherentes aunque el catálogo cambie entre páginas.
+    """
+    try:
+        return data_manager.get_items_after_cursor(
+            limit=limit,
+            cursor=cursor,
+            sort_by=sort_by,
+            category=category,
+            status=status,
+            min_price=min_price,
+            max_price=max_price
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {e}")
+
+# Estadísticas de la caché de resultados de filtros
+@app.get("/items/cache/stats/")
+async def get_cache_stats():
+    """
+    Devuelve los contadores de aciertos, fallos, expulsiones e invalidaciones
+    de la caché de consultas.
+    """
+    return data_manager.get_query_cache_stats()
\ No newline at end of file
@@ -0,0 +1,309 @@
+"""
+Benchmarks del envío de mensajes por WebSocket.
+
+Uso:
+    python benchmark.py broadcast [--clients 10000] [--messages 30] [--interval-ms 100]
+                                  [--slow 2] [--slow-ms 500] [--queue-size 8] [--shards 1]
+    python benchmark.py codec [--repeat 100000] [--size 200]
+    python benchmark.py frames [--clients 100] [--messages 1000] [--size 200] [--rounds 3] [--deflate]
+
+`broadcast` conecta `--clients` WebSockets simulados (en memoria, sin red) al
+gestor de conexiones y envía `--messages` mensajes a todos, uno cada
+`--interval-ms` ms. `--slow` de los clientes tardan `--slow-ms` ms en cada
+envío, como un cliente con la red saturada. Mide la latencia de entrega (desde
+que se llama a broadcast() hasta que el mensaje llega a send_text() de cada
+cliente rápido, p50 y p99) y lo que tarda la propia llamada, con la versión
+anterior (send_text() en cada conexión, una detrás de otra) y con las colas
+por conexión de websocket_manager.py con cada política de desbordamiento.
+
+`codec` mide el coste por mensaje de chat de decodificar el JSON recibido y
+codificar el que se reenvía: antes (json.loads y json.dumps) y con cada codec
+de codec.py que esté instalado.
+
+`frames` levanta main:app con uvicorn, conecta `--clients` clientes reales
+(paquete websockets) y envía `--messages` mensajes de chat de `--size`
+caracteres, que el servidor reenvía a todos. Mide el tiempo de CPU del proceso
+del servidor por mensaje y por frame enviado con cada codec y cada formato de
+frame (WS_JSON_CODEC, WS_FRAME_FORMAT), la mejor de `--rounds` rondas. Sin `--deflate` los clientes no
+negocian permessage-deflate, que comprimiría cada frame en cada conexión.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import codec
+from websocket_manager import OVERFLOW_POLICIES, ConnectionManager
+
+
+# --- Versión anterior: send_text() en cada conexión, una detrás de otra ---
+
+class LegacyConnectionManager:
+    """El gestor de conexiones tal como era antes de las colas por conexión."""
+    def __init__(self):
+        self.active_connections = []
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        self.active_connections.append(websocket)
+
+    def disconnect(self, websocket):
+        self.active_connections.remove(websocket)
+
+    async def broadcast(self, message: str):
+        for connection in self.active_connections:
+            try:
+                await connection.send_text(message)
+            except RuntimeError:
+                pass
+
+
+# --- Clientes simulados ---
+
+class Recorder:
+    """Momento de cada broadcast y latencias de entrega a los clientes rápidos."""
+    def __init__(self):
+        self.sent_at: Dict[str, float] = {}
+        self.latencies: List[float] = []
+
+
+class SimulatedWebSocket:
+    def __init__(self, recorder: Recorder, delay: float = 0.0):
+        self.recorder = recorder
+        self.delay = delay
+        self.received = 0
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            self.recorder.latencies.append(time.perf_counter() - self.recorder.sent_at[message])
+        self.received += 1
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+
+async def _run_broadcast(manager, args) -> None:
+    recorder = Recorder()
+    fast = [SimulatedWebSocket(recorder) for _ in range(args.clients - args.slow)]
+    slow = [SimulatedWebSocket(recorder, args.slow_ms / 1000) for _ in range(args.slow)]
+    # Los lentos repartidos entre los rápidos
+    sockets = fast + slow
+    random.Random(0).shuffle(sockets)
+    # Sin los mensajes de "Conexión WebSocket establecida" de cada cliente
+    with contextlib.redirect_stdout(io.StringIO()):
+        for websocket in sockets:
+            await manager.connect(websocket)
+
+    calls = []
+    start = time.perf_counter()
+    for seq in range(args.messages):
+        message = str(seq)
+        recorder.sent_at[message] = time.perf_counter()
+        await manager.broadcast(message)
+        calls.append(time.perf_counter() - recorder.sent_at[message])
+        await asyncio.sleep(args.interval_ms / 1000)
+    expected = len(fast) * args.messages
+    deadline = time.perf_counter() + 120
+    while len(recorder.latencies) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for websocket in list(manager.active_connections):
+            manager.disconnect(websocket)
+    await asyncio.sleep(0)
+
+    latencies = sorted(recorder.latencies)
+    calls.sort()
+    slow_received = sum(w.received for w in slow)
+    slow_closed = sum(w.closed for w in slow)
+    print(
+        f"    entrega p50 {statistics.median(latencies) * 1e3:8.2f} ms  p99 {_percentile(latencies, 0.99) * 1e3:8.2f} ms"
+        f"  | broadcast() p50 {statistics.median(calls) * 1e3:8.3f} ms  p99 {_percentile(calls, 0.99) * 1e3:8.3f} ms"
+        f"  | {elapsed:6.2f} s en total"
+    )
+    if slow:
+        print(
+            f"    clientes lentos: {slow_received / len(slow):.0f} de {args.messages} mensajes recibidos"
+            f"{f', {slow_closed} desconectados' if slow_closed else ''}"
+        )
+
+
+def bench_broadcast(args) -> None:
+    print(
+        f"{args.clients} clientes ({args.slow} lentos, {args.slow_ms} ms por envío), "
+        f"{args.messages} mensajes cada {args.interval_ms} ms"
+    )
+    managers = [("anterior (send_text uno a uno)", LegacyConnectionManager)]
+    for policy in OVERFLOW_POLICIES:
+        managers.append((
+            f"colas de {args.queue_size}, {args.shards} shards, {policy}",
+            lambda policy=policy: ConnectionManager(args.queue_size, policy, args.shards),
+        ))
+    for label, factory in managers:
+        print(f"  {label}")
+        asyncio.run(_run_broadcast(factory(), args))
+
+
+# --- Codec JSON ---
+
+def _chat_message(size: int) -> str:
+    return json.dumps({"type": "chat", "sender": "benchmark", "message": "¡Hola! " * (size // 7)})
+
+
+def bench_codec(args) -> None:
+    data = _chat_message(args.size)
+    print(f"Mensaje de chat de {len(data)} caracteres, {args.repeat} repeticiones")
+    codecs = [("anterior (json.loads/json.dumps)", json.loads, json.dumps)]
+    for name in ("json", "orjson", "msgspec"):
+        selected, dumps, loads = codec.select_codec(name)
+        if selected == name:
+            codecs.append((f"codec.py, {name}", loads, dumps))
+        else:
+            print(f"  {name}: no está instalado")
+    for label, loads, dumps in codecs:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            message = loads(data)
+            dumps({"type": "chat", "sender": message["sender"], "message": message["message"]})
+        elapsed = time.perf_counter() - start
+        print(f"  {label:34}: {elapsed / args.repeat * 1e6:6.2f} µs por mensaje")
+
+
+# --- Frames con un servidor real ---
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _cpu_seconds(pid: int) -> float:
+    """Tiempo de CPU (usuario + sistema) de un proceso, de /proc/<pid>/stat."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _start_server(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("El servidor no ha arrancado.")
+
+
+async def _run_frames(port: int, pid: int, args) -> float:
+    """Envía los mensajes y devuelve el tiempo de CPU que ha gastado el servidor en reenviarlos."""
+    from websockets.asyncio.client import connect
+
+    compression = "deflate" if args.deflate else None
+    # max_queue=None: al cerrar, cada cliente recibe el aviso de desconexión de
+    # los demás; con la cola llena dejaría de leer y el cierre esperaría al timeout
+    clients = [
+        await connect(f"ws://127.0.0.1:{port}/ws/cliente-{i}", compression=compression, max_size=None, max_queue=None)
+        for i in range(args.clients)
+    ]
+
+    async def receive_all(client) -> None:
+        for _ in range(args.messages):
+            await client.recv()
+
+    data = _chat_message(args.size)
+    start = _cpu_seconds(pid)
+    receivers = [asyncio.create_task(receive_all(client)) for client in clients]
+    for _ in range(args.messages):
+        await clients[0].send(data)
+    await asyncio.gather(*receivers)
+    cpu = _cpu_seconds(pid) - start
+    for client in clients:
+        await client.close()
+    return cpu
+
+
+def bench_frames(args) -> None:
+    print(
+        f"{args.clients} clientes, {args.messages} mensajes de chat de {len(_chat_message(args.size))} caracteres"
+        f"{' (permessage-deflate)' if args.deflate else ''}"
+    )
+    frames = args.clients * args.messages
+    for codec_name, frame_format in (
+        ("json", "text"), ("json", "binary"), ("orjson", "text"), ("orjson", "binary"), ("msgspec", "binary"),
+    ):
+        if codec.select_codec(codec_name)[0] != codec_name:
+            print(f"  {codec_name}: no está instalado")
+            continue
+        # Colas de sobra: no se descarta ningún mensaje aunque los clientes se retrasen
+        env = {"WS_JSON_CODEC": codec_name, "WS_FRAME_FORMAT": frame_format, "WS_QUEUE_SIZE": str(args.messages + 16)}
+        port = _free_port()
+        server = _start_server(port, env)
+        try:
+            # Los clientes comparten la CPU con el servidor: la mejor ronda es la más estable
+            cpu = min(asyncio.run(_run_frames(port, server.pid, args)) for _ in range(args.rounds))
+        finally:
+            server.terminate()
+            server.wait()
+        print(
+            f"  {codec_name + ', ' + frame_format:16}: CPU del servidor {cpu / args.messages * 1e6:8.0f} µs por mensaje,"
+            f" {cpu / frames * 1e6:6.1f} µs por frame"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    broadcast = subparsers.add_parser("broadcast", help="Latencia de broadcast con miles de clientes simulados.")
+    broadcast.add_argument("--clients", type=int, default=10000)
+    broadcast.add_argument("--messages", type=int, default=30)
+    broadcast.add_argument("--interval-ms", type=float, default=100, help="Pausa entre dos mensajes.")
+    broadcast.add_argument("--slow", type=int, default=2, help="Clientes lentos.")
+    broadcast.add_argument("--slow-ms", type=float, default=500, help="Lo que tarda cada envío a un cliente lento.")
+    broadcast.add_argument("--queue-size", type=int, default=8, help="WS_QUEUE_SIZE.")
+    broadcast.add_argument("--shards", type=int, default=1, help="WS_SHARDS.")
+    broadcast.set_defaults(func=bench_broadcast)
+
+    codec_parser = subparsers.add_parser("codec", help="Coste de decodificar y codificar un mensaje con cada codec.")
+    codec_parser.add_argument("--repeat", type=int, default=100000)
+    codec_parser.add_argument("--size", type=int, default=200, help="Longitud aproximada del texto del mensaje.")
+    codec_parser.set_defaults(func=bench_codec)
+
+    frames = subparsers.add_parser("frames", help="CPU del servidor por mensaje con cada codec y formato de frame.")
+    frames.add_argument("--clients", type=int, default=100)
+    frames.add_argument("--messages", type=int, default=1000)
+    frames.add_argument("--size", type=int, default=200, help="Longitud aproximada del texto del mensaje.")
+    frames.add_argument("--rounds", type=int, default=3)
+    frames.add_argument("--deflate", action="store_true", help="Negocia permessage-deflate.")
+    frames.set_defaults(func=bench_frames)
+
+    args = parser.parse_args()
+    args.func(args)
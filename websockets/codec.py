@@ -0,0 +1,77 @@
+import json
+import os
+from typing import Any, Callable, Tuple, Union
+
+# --- Codificación de los mensajes ---
+# Todos los mensajes son JSON. orjson y msgspec codifican y decodifican varias
+# veces más rápido que el módulo json de la biblioteca estándar y producen
+# bytes UTF-8 directamente; son opcionales y, si no están instalados, se usa json.
+
+# Codec JSON: auto (orjson, msgspec o json, el primero que esté instalado), orjson, msgspec o json
+WS_JSON_CODEC = os.getenv("WS_JSON_CODEC", "auto")
+
+# Formato de los mensajes que envía el servidor:
+#   text: frames de texto, como hasta ahora; el servidor vuelve a codificar el
+#     str a UTF-8 en cada conexión al enviarlo
+#   binary: frames binarios con el JSON en UTF-8; el servidor envía los mismos
+#     bytes a todas las conexiones, sin volver a codificarlos para cada una
+WS_FRAME_FORMAT = os.getenv("WS_FRAME_FORMAT", "text")
+
+CODECS = ("auto", "orjson", "msgspec", "json")
+FRAME_FORMATS = ("text", "binary")
+
+try:
+    import orjson
+except ImportError: # Dependencia opcional
+    orjson = None
+
+try:
+    import msgspec
+except ImportError: # Dependencia opcional
+    msgspec = None
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    # Con las opciones por defecto json.dumps reutiliza su codificador; con
+    # separators o ensure_ascii crearía uno nuevo en cada llamada
+    return json.dumps(obj).encode("utf-8")
+
+def select_codec(name: str) -> Tuple[str, Callable[[Any], bytes], Callable[[Union[str, bytes]], Any]]:
+    """
+    (nombre, dumps, loads) del codec `name`. Si el paquete que se pide no está
+    instalado se usa json. Lanza ValueError si el nombre no es válido.
+    """
+    if name not in CODECS:
+        raise ValueError(f"WS_JSON_CODEC debe ser uno de {', '.join(CODECS)}, no {name!r}")
+    if name in ("auto", "orjson") and orjson is not None:
+        return "orjson", orjson.dumps, orjson.loads
+    if name in ("auto", "msgspec") and msgspec is not None:
+        encoder, decoder = msgspec.json.Encoder(), msgspec.json.Decoder()
+        return "msgspec", encoder.encode, decoder.decode
+    if name not in ("auto", "json"):
+        print(f"El paquete '{name}' no está instalado; los mensajes se codifican con json.")
+    return "json", _stdlib_dumps, json.loads
+
+if WS_FRAME_FORMAT not in FRAME_FORMATS:
+    raise ValueError(f"WS_FRAME_FORMAT debe ser uno de {', '.join(FRAME_FORMATS)}, no {WS_FRAME_FORMAT!r}")
+
+CODEC, dumps, loads = select_codec(WS_JSON_CODEC)
+
+def _text_frame(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+if WS_FRAME_FORMAT == "binary":
+    _encode = dumps
+elif CODEC == "json":
+    # json.dumps ya devuelve el str del frame: no hace falta pasar por bytes
+    _encode = json.dumps
+else:
+    _encode = _text_frame
+
+def encode_frame(obj: Any) -> Union[str, bytes]:
+    """
+    Codifica un mensaje en el formato de WS_FRAME_FORMAT: bytes para un frame
+    binario o str para uno de texto. El resultado se puede encolar para
+    cualquier número de conexiones. Solo los bytes se envían tal cual a todas:
+    un str se vuelve a codificar a UTF-8 en cada conexión.
+    """
+    return _encode(obj)
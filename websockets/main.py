@@ -1,8 +1,10 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
-import json
+from typing import Union
 
+# Codec JSON (orjson, msgspec o json) y formato de los frames
+import codec
 # Importamos el gestor de conexiones WebSocket
 from websocket_manager import manager
 
@@ -23,6 +25,15 @@ async def get():
         html_content = f.read()
     return HTMLResponse(content=html_content, status_code=200)
 
+async def receive_frame(websocket: WebSocket) -> Union[str, bytes]:
+    """
+    Recibe un frame de texto o binario (el cliente puede enviar el JSON de las dos formas).
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    return message["text"] if message.get("text") is not None else message["bytes"]
+
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
     """
@@ -31,8 +42,8 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
     await manager.connect(websocket)
     try:
         while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            data = await receive_frame(websocket)
+            message_data = codec.loads(data)
 
             message_type = message_data.get("type")
 
@@ -41,33 +52,34 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
                 sender = message_data.get("sender", "Anónimo")
                 message = message_data.get("message", "")
                 full_message = {"type": "chat", "sender": sender, "message": message}
-                await manager.broadcast(json.dumps(full_message))
+                # Se codifica una sola vez para todas las conexiones
+                await manager.broadcast(codec.encode_frame(full_message))
                 print(f"Chat de '{sender}': {message}")
 
             elif message_type == "notification":
                 # Notificación personal: Enviar solo a este cliente
                 notification_message = message_data.get("message", "Notificación personal.")
                 personal_notification = {"type": "notification", "message": notification_message}
-                await manager.send_personal_message(json.dumps(personal_notification), websocket)
+                await manager.send_personal_message(codec.encode_frame(personal_notification), websocket)
                 print(f"Notificación personal enviada a '{client_id}': {notification_message}")
 
             elif message_type == "broadcast_notification":
                 # Notificación de broadcast: Enviar a todos los clientes
                 broadcast_message = message_data.get("message", "Notificación de broadcast.")
                 full_notification = {"type": "notification", "message": broadcast_message}
-                await manager.broadcast(json.dumps(full_notification))
+                await manager.broadcast(codec.encode_frame(full_notification))
                 print(f"Notificación de broadcast enviada: {broadcast_message}")
 
             else:
                 print(f"Tipo de mensaje desconocido: {message_type}")
-                await manager.send_personal_message(json.dumps({"type": "error", "message": "Tipo de mensaje no reconocido."}), websocket)
+                await manager.send_personal_message(codec.encode_frame({"type": "error", "message": "Tipo de mensaje no reconocido."}), websocket)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
         # Opcional: Notificar a todos que un cliente se ha desconectado
-        await manager.broadcast(json.dumps({"type": "chat", "sender": "Sistema", "message": f"Cliente '{client_id}' se ha desconectado."}))
+        await manager.broadcast(codec.encode_frame({"type": "chat", "sender": "Sistema", "message": f"Cliente '{client_id}' se ha desconectado."}))
         print(f"Cliente '{client_id}' desconectado.")
     except Exception as e:
         print(f"Error inesperado en WebSocket para {client_id}: {e}")
         manager.disconnect(websocket)
-        # await manager.send_personal_message(json.dumps({"type": "error", "message": f"Error interno: {e}"}), websocket)
\ No newline at end of file
+        # await manager.send_personal_message(codec.encode_frame({"type": "error", "message": f"Error interno: {e}"}), websocket)
\ No newline at end of file
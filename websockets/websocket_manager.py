@@ -1,46 +1,199 @@
-from typing import List
+import asyncio
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional, Union
 from fastapi import WebSocket, WebSocketDisconnect
 
+# --- Envío con una cola por conexión ---
+# Antes, broadcast() esperaba a send_text() en cada conexión, una detrás de
+# otra: un cliente lento (red mala, búfer TCP lleno) retrasaba a todos los
+# demás, y la latencia crecía con el número de conexiones. Ahora cada conexión
+# tiene una cola de salida acotada que vacía su propia tarea, y broadcast()
+# solo deja el mensaje en la bandeja de cada shard: la tarea del shard lo
+# reparte a las colas de sus conexiones sin esperar a ningún envío.
+#
+# Los mensajes llegan ya codificados (codec.encode_frame): todas las colas
+# comparten el mismo str o los mismos bytes, y los bytes se envían como frame
+# binario y los str como frame de texto.
+
+# Un mensaje codificado: str para un frame de texto, bytes para uno binario
+Frame = Union[str, bytes]
+
+# Mensajes pendientes como máximo en la cola de cada conexión
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+
+# Qué hacer cuando la cola de una conexión está llena:
+#   drop_oldest: se descarta el mensaje pendiente más antiguo
+#   disconnect: se cierra la conexión (código 1013, "Try Again Later")
+#   coalesce: se descartan todos los pendientes y solo queda el último, así
+#     que el cliente lento salta directamente al estado más reciente
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")
+
+# Grupos de conexiones, cada uno con su propia bandeja y su tarea de reparto.
+# En un solo proceso todos comparten el bucle de eventos, así que más shards no
+# reparten antes (ver benchmark.py); 1 es lo más rápido con una sola CPU
+WS_SHARDS = int(os.getenv("WS_SHARDS", "1"))
+
+OVERFLOW_POLICIES = ("drop_oldest", "disconnect", "coalesce")
+
+# Código de cierre para los clientes que no dan abasto con la política disconnect
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+class ClientQueue:
+    """
+    Cola de salida de una conexión y la tarea que la vacía.
+    """
+    def __init__(self, websocket: WebSocket, size: int, overflow_policy: str):
+        self.websocket = websocket
+        self.size = size
+        self.overflow_policy = overflow_policy
+        self.pending: Deque[Frame] = deque()
+        self.dropped = 0
+        self.closing = False
+        # Future que espera la tarea cuando la cola está vacía: más barato que un asyncio.Event
+        self._waiter: Optional[asyncio.Future] = None
+        self.task = asyncio.create_task(self._run())
+
+    def put(self, message: Frame) -> None:
+        """
+        Encola un mensaje sin esperar. Si la cola está llena aplica la política de desbordamiento.
+        """
+        if self.closing:
+            return
+        if len(self.pending) >= self.size:
+            if self.overflow_policy == "disconnect":
+                self.dropped += len(self.pending) + 1
+                self.pending.clear()
+                self.closing = True
+                self._wake()
+                return
+            if self.overflow_policy == "coalesce":
+                self.dropped += len(self.pending)
+                self.pending.clear()
+            else:
+                self.pending.popleft()
+                self.dropped += 1
+        self.pending.append(message)
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if not self.pending and not self.closing:
+                    self._waiter = loop.create_future()
+                    await self._waiter
+                    self._waiter = None
+                while self.pending:
+                    message = self.pending.popleft()
+                    if isinstance(message, bytes):
+                        await self.websocket.send_bytes(message)
+                    else:
+                        await self.websocket.send_text(message)
+                if self.closing:
+                    await self.websocket.close(code=SLOW_CLIENT_CLOSE_CODE)
+                    print(f"Conexión WebSocket cerrada por no dar abasto ({self.dropped} mensajes descartados).")
+                    return
+        except (RuntimeError, WebSocketDisconnect) as e:
+            # Esto puede ocurrir si el socket se cierra inesperadamente; main.py llamará a disconnect()
+            print(f"Error al enviar mensaje a un cliente (posiblemente desconectado): {e}")
+            self.closing = True
+            self.pending.clear()
+
+class _Shard:
+    """
+    Grupo de conexiones con una bandeja de mensajes y la tarea que los reparte a sus colas.
+    """
+    def __init__(self):
+        self.clients: Dict[WebSocket, ClientQueue] = {}
+        # Sin límite: la tarea del shard nunca espera a un envío, solo usa CPU
+        self.inbox: Deque[Frame] = deque()
+        self._ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def post(self, message: Frame) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        self.inbox.append(message)
+        self._ready.set()
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self.inbox:
+                message = self.inbox.popleft()
+                # put() no espera ni modifica self.clients: se puede recorrer sin copiarlo
+                for client in self.clients.values():
+                    client.put(message)
+                # Deja enviar a las colas antes de repartir el siguiente mensaje
+                await asyncio.sleep(0)
+
 class ConnectionManager:
     """
     Gestiona las conexiones activas de WebSocket.
     """
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(
+        self,
+        queue_size: int = WS_QUEUE_SIZE,
+        overflow_policy: str = WS_OVERFLOW_POLICY,
+        shards: int = WS_SHARDS,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"WS_OVERFLOW_POLICY debe ser una de {', '.join(OVERFLOW_POLICIES)}, no {overflow_policy!r}")
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.shards = [_Shard() for _ in range(max(1, shards))]
+        self.clients: Dict[WebSocket, ClientQueue] = {}
+        self._shard_of: Dict[WebSocket, _Shard] = {}
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
 
     async def connect(self, websocket: WebSocket):
         """
-        Añade una nueva conexión WebSocket activa.
+        Acepta la conexión y la asigna al shard con menos conexiones.
         """
         await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"Conexión WebSocket establecida. Clientes activos: {len(self.active_connections)}")
+        shard = min(self.shards, key=lambda s: len(s.clients))
+        client = ClientQueue(websocket, self.queue_size, self.overflow_policy)
+        shard.clients[websocket] = client
+        self.clients[websocket] = client
+        self._shard_of[websocket] = shard
+        print(f"Conexión WebSocket establecida. Clientes activos: {len(self.clients)}")
 
     def disconnect(self, websocket: WebSocket):
         """
-        Elimina una conexión WebSocket de la lista de activas.
+        Elimina una conexión WebSocket de las activas y detiene su cola. Se puede llamar más de una vez.
         """
-        self.active_connections.remove(websocket)
-        print(f"Conexión WebSocket cerrada. Clientes activos: {len(self.active_connections)}")
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        del self._shard_of.pop(websocket).clients[websocket]
+        client.task.cancel()
+        print(f"Conexión WebSocket cerrada. Clientes activos: {len(self.clients)}")
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+    async def send_personal_message(self, message: Frame, websocket: WebSocket):
         """
-        Envía un mensaje a un cliente WebSocket específico.
+        Encola un mensaje para un cliente WebSocket específico.
         """
-        await websocket.send_text(message)
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.put(message)
 
-    async def broadcast(self, message: str):
+    async def broadcast(self, message: Frame):
         """
-        Envía un mensaje a todos los clientes WebSocket activos.
+        Encola un mensaje para todos los clientes WebSocket activos: solo lo
+        deja en la bandeja de cada shard, sin esperar a ningún envío.
         """
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except RuntimeError as e:
-                # Esto puede ocurrir si el socket se cierra inesperadamente
-                print(f"Error al enviar mensaje a un cliente (posiblemente desconectado): {e}")
-                # Opcional: desconectar si hay un error persistente, aunque el disconnect se encargue
-                # self.disconnect(connection) # Esto podría modificar la lista mientras se itera, mejor evitar aquí
+        for shard in self.shards:
+            if shard.clients:
+                shard.post(message)
 
 # Instancia global del gestor de conexiones
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()